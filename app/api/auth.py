@@ -1,11 +1,15 @@
 """
 Authentication API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from supabase import Client
 from app.db.supabase_client import get_supabase
 from app.services.auth_service import AuthService
 from app.schemas.auth import UserCreate, UserLogin, TokenResponse, UserResponse
+from app.services.predictor_service import PredictorService, PREDICTOR_AVAILABLE
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -18,11 +22,16 @@ def get_auth_service(supabase: Client = Depends(get_supabase)) -> AuthService:
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def register(
     user_data: UserCreate,
-    service: AuthService = Depends(get_auth_service)
+    background_tasks: BackgroundTasks,
+    service: AuthService = Depends(get_auth_service),
+    supabase: Client = Depends(get_supabase)
 ):
     """Register a new user"""
     try:
         user = service.create_user(user_data)
+        # Create the predictor profile after responding, so the user's first event finds it ready
+        if PREDICTOR_AVAILABLE:
+            background_tasks.add_task(_prewarm_predictor, supabase, str(user.user_id))
         return user
     except HTTPException:
         raise
@@ -33,6 +42,14 @@ def register(
         )
 
 
+def _prewarm_predictor(supabase: Client, user_id: str) -> None:
+    """Background task: prewarm the new user's predictor profile and states"""
+    try:
+        PredictorService(supabase).prewarm_user(user_id)
+    except Exception:
+        logger.exception("Error prewarming predictor for user %s", user_id)
+
+
 @router.post("/login", response_model=UserResponse)
 def login(
     credentials: UserLogin,
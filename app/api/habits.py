@@ -114,8 +114,11 @@ def delete_habit(
     """Delete a habit and refresh predictions for affected products"""
     import logging
     
+    uid = str(user_id)
+    hid = str(habit_id)
+    
     # Get the habit first to retrieve its effects before deletion
-    habit = service.get_habit(str(habit_id), str(user_id))
+    habit = service.get_habit(hid, uid)
     if not habit:
         raise HTTPException(status_code=404, detail="Habit not found")
     
@@ -126,10 +129,10 @@ def delete_habit(
     logging.info(f"Deleting habit {habit_id} (status: {habit_status}, has_effects: {bool(habit_effects)})")
     
     # Delete the habit
-    success = service.delete_habit(str(habit_id), str(user_id))
+    success = service.delete_habit(hid, uid)
     if not success:
         # Verify if it still exists
-        still_exists = service.get_habit(str(habit_id), str(user_id))
+        still_exists = service.get_habit(hid, uid)
         if still_exists:
             logging.error(f"Failed to delete habit {habit_id} - habit still exists in database with status: {still_exists.get('status')}")
             raise HTTPException(status_code=500, detail="Failed to delete habit. The habit may be referenced by other records.")
@@ -148,7 +151,7 @@ def delete_habit(
             
             logging.info(f"Refreshing predictions for products affected by deleted habit {habit_id}")
             predictor_service.refresh_products_affected_by_habit(
-                str(user_id),
+                uid,
                 habit_effects,
                 is_deletion=True
             )
@@ -215,24 +218,36 @@ def chat_with_llm(
         )
     
     chat_service = HabitChatService(openai_api_key)
+    uid = str(user_id)
     
     # Conversation history disabled - each message is processed independently
     conversation_history = []
     
     # Get current user preferences
     try:
-        user_preferences = service.get_user_preferences(str(user_id))
+        user_preferences = service.get_user_preferences(uid)
     except Exception:
         user_preferences = {}
     
+    # Fetch all categories once per request - used both as GPT context and to
+    # resolve category names in suggested habits without a query per name
+    try:
+        all_categories_result = supabase.table("product_categories").select(
+            "category_id, category_name"
+        ).order("category_name").execute()
+        category_rows = all_categories_result.data or []
+    except Exception:
+        category_rows = None
+    
     # Get inventory summary for context
     try:
         inventory_service = InventoryService(supabase)
         inventory = inventory_service.get_inventory(user_id)
         
         # Get all available categories (not just user's inventory)
-        all_categories_result = supabase.table("product_categories").select("category_name").order("category_name").execute()
-        all_categories = [cat["category_name"] for cat in (all_categories_result.data or [])]
+        if category_rows is None:
+            raise ValueError("Categories unavailable")
+        all_categories = [cat["category_name"] for cat in category_rows]
         
         # Get product names from user's inventory
         product_names = []
@@ -289,7 +304,7 @@ def chat_with_llm(
     )
     
     try:
-        service.create_habit_input(str(user_id), habit_input)
+        service.create_habit_input(uid, habit_input)
     except Exception as e:
         pass  # Log error but don't fail the request
     
@@ -332,13 +347,21 @@ def chat_with_llm(
                 converted_product_multipliers_from_category = {}  # For fallback
                 
                 for category_name, multiplier in category_multipliers.items():
-                    # First try to find as category
-                    categories_result = supabase.table("product_categories").select("category_id").ilike(
-                        "category_name", f"%{category_name}%"
-                    ).limit(1).execute()
+                    # First try to find as category (case-insensitive substring match)
+                    if category_rows is not None:
+                        needle = category_name.lower()
+                        category_id = next(
+                            (cat["category_id"] for cat in category_rows
+                             if needle in (cat.get("category_name") or "").lower()),
+                            None
+                        )
+                    else:
+                        categories_result = supabase.table("product_categories").select("category_id").ilike(
+                            "category_name", f"%{category_name}%"
+                        ).limit(1).execute()
+                        category_id = categories_result.data[0]["category_id"] if categories_result.data else None
                     
-                    if categories_result.data:
-                        category_id = categories_result.data[0]["category_id"]
+                    if category_id:
                         converted_category_multipliers[str(category_id)] = multiplier
                     else:
                         # Fallback: try to find as product
@@ -382,14 +405,14 @@ def chat_with_llm(
                 effects=converted_effects,  # Use converted effects
                 params={}
             )
-            created_habit = service.create_habit(str(user_id), habit_create)
+            created_habit = service.create_habit(uid, habit_create)
             created_habits.append(created_habit)
             
             # Refresh predictions for products affected by this habit
             if habit_create.effects:
                 try:
                     predictor_service.refresh_products_affected_by_habit(
-                        str(user_id),
+                        uid,
                         habit_create.effects,
                         is_deletion=False
                     )
@@ -37,17 +37,24 @@ def get_inventory(
     category_id: Optional[UUID] = None,
     state: Optional[str] = None,
     search: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
     service: InventoryService = Depends(get_inventory_service)
 ):
     """
-    Get all inventory items for a user with optional filtering.
+    Get inventory items for a user with optional filtering.
     Returns raw dicts to preserve nested products structure.
     
     - category_id: Filter by product category
     - state: Filter by inventory state (FULL, MEDIUM, LOW, EMPTY, UNKNOWN)
     - search: Search by product name (case-insensitive)
+    - offset / limit: Page through the results (server-side range); without a limit
+      every matching item is returned, in the default order
     """
-    items = service.get_inventory(user_id, category_id=category_id, state=state, search=search)
+    items = service.get_inventory(
+        user_id, category_id=category_id, state=state, search=search,
+        offset=offset, limit=limit
+    )
     # Return raw dicts to preserve nested products structure
     # The InventoryResponse schema doesn't handle nested products well
     return items
@@ -205,12 +212,14 @@ def provide_feedback(
     now = datetime.now(timezone.utc)
     
     try:
+        uid = str(user_id)
+        pid = str(product_id)
+        
         # Get current state to calculate new days_left
-        predictor_profile_id, cfg = predictor_service._load_cfg_and_profile(str(user_id))
-        products = dict(predictor_service.repo.get_user_inventory_products(str(user_id)))
-        category_id = products.get(str(product_id))
+        predictor_profile_id, cfg = predictor_service._load_cfg_and_profile(uid)
+        category_id = predictor_service.repo.get_product_category(pid)
         state = predictor_service._load_or_init_state(
-            str(user_id), str(product_id), predictor_profile_id, cfg, category_id, now
+            uid, pid, predictor_profile_id, cfg, category_id, now
         )
         
         # Get current days_left from inventory (if user has updated it)
@@ -223,7 +232,7 @@ def provide_feedback(
                 inventory_days_left = None
         
         from ema_cycle_predictor import compute_days_left, predict, derive_state
-        mult = predictor_service.repo.get_active_habit_multiplier(str(user_id), str(product_id), category_id, now)
+        mult = predictor_service.repo.get_active_habit_multiplier(uid, pid, category_id, now)
         # Use inventory_days_left if available, otherwise calculate from cycle_mean_days
         current_days_left = compute_days_left(state, now, mult, cfg, inventory_days_left=inventory_days_left)
         
@@ -271,34 +280,28 @@ def provide_feedback(
         from ema_cycle_predictor import compute_confidence
         confidence = compute_confidence(state, now, cfg)
         
-        # Update product_predictor_state with updated state
+        # Update product_predictor_state and inventory with new days_left in one call
+        # (but keep cycle_mean_days unchanged)
         params_json = state.to_params_json()
-        params_json = predictor_service._make_json_serializable(params_json)
-        predictor_service.repo.upsert_predictor_state(
-            user_id=str(user_id),
-            product_id=str(product_id),
-            predictor_profile_id=predictor_profile_id,
-            params=params_json,
-            confidence=confidence,
-            updated_at=now,
+        logger.debug(
+            "[provide_feedback] Updating inventory: user_id=%s, product_id=%s, new_days_left=%s, new_state=%s, confidence=%s",
+            user_id, product_id, new_days_left, new_state.value, confidence
         )
-        
-        # Update inventory with new days_left (but keep cycle_mean_days unchanged)
-        print(f"[DEBUG provide_feedback] Updating inventory: user_id={user_id}, product_id={product_id}, new_days_left={new_days_left}, new_state={new_state.value}, confidence={confidence}")
         try:
-            predictor_service.repo.upsert_inventory_days_estimate(
-                user_id=str(user_id),
-                product_id=str(product_id),
+            predictor_service.repo.update_state_and_estimate(
+                user_id=uid,
+                product_id=pid,
+                predictor_profile_id=predictor_profile_id,
+                params=params_json,
+                confidence=confidence,
                 days_left=new_days_left,
                 state=InventoryState(new_state.value),
-                confidence=confidence,
+                updated_at=now,
                 source=InventorySource.MANUAL,
             )
-            print(f"[DEBUG provide_feedback] Successfully updated inventory")
-        except Exception as e:
-            print(f"[ERROR provide_feedback] Failed to update inventory: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.debug("[provide_feedback] Successfully updated inventory")
+        except Exception:
+            logger.exception("[provide_feedback] Failed to update inventory")
         
     except Exception as e:
         print(f"Warning: Could not update days_left: {e}")
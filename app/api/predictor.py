@@ -139,8 +139,7 @@ def learn_from_shopping_feedback(
         # Get current state to calculate new days_left
         try:
             predictor_profile_id, cfg = service._load_cfg_and_profile(str(user_id))
-            products = dict(service.repo.get_user_inventory_products(str(user_id)))
-            category_id = products.get(str(product_id))
+            category_id = service.repo.get_product_category(str(product_id))
             state = service._load_or_init_state(
                 str(user_id), str(product_id), predictor_profile_id, cfg, category_id, now
             )
@@ -206,27 +205,20 @@ def learn_from_shopping_feedback(
             from ema_cycle_predictor import compute_confidence
             confidence = compute_confidence(state, now, cfg)
             
-            # Update product_predictor_state with updated state
+            # Update product_predictor_state and inventory with new days_left in one call
+            # (but keep cycle_mean_days unchanged)
             params_json = state.to_params_json()
-            params_json = service._make_json_serializable(params_json)
-            service.repo.upsert_predictor_state(
-                user_id=str(user_id),
-                product_id=str(product_id),
-                predictor_profile_id=predictor_profile_id,
-                params=params_json,
-                confidence=confidence,
-                updated_at=now,
-            )
-            
-            # Update inventory with new days_left (but keep cycle_mean_days unchanged)
             print(f"[DEBUG learn_from_shopping_feedback] Updating inventory: user_id={user_id}, product_id={product_id}, new_days_left={new_days_left}, new_state={new_state.value}, confidence={confidence}")
             try:
-                service.repo.upsert_inventory_days_estimate(
+                service.repo.update_state_and_estimate(
                     user_id=str(user_id),
                     product_id=str(product_id),
+                    predictor_profile_id=predictor_profile_id,
+                    params=params_json,
+                    confidence=confidence,
                     days_left=new_days_left,
                     state=InventoryState(new_state.value),
-                    confidence=confidence,
+                    updated_at=now,
                     source=InventorySource.SHOPPING_LIST,
                 )
                 print(f"[DEBUG learn_from_shopping_feedback] Successfully updated inventory")
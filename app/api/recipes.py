@@ -141,6 +141,8 @@ def recipe_step_complete(
         
         # Process each ingredient used
         log_ids = []
+        pending_logs = []
+        pending_updates = []
         
         if request.ingredients_used:
             for ingredient_usage in request.ingredients_used:
@@ -178,7 +180,7 @@ def recipe_step_complete(
                 else:
                     new_state = InventoryState.FULL
                 
-                # Create inventory log entry for consumption
+                # Create inventory log entry for consumption (inserted in bulk below)
                 log_create = InventoryLogCreate(
                     product_id=UUID(product_id),
                     action=InventoryAction.ADJUST,
@@ -187,29 +189,37 @@ def recipe_step_complete(
                     source=InventorySource.RECIPE,
                     note=f"Recipe step {request.step_index + 1}: Used {ingredient_name}"
                 )
-                
+                pending_logs.append(log_create)
+                pending_updates.append((ingredient_name, product_id, new_qty, new_state))
+        
+        if pending_logs:
+            try:
+                log_entries = inventory_service.create_inventory_logs_bulk(user_id, pending_logs)
+            except Exception as e:
+                print(f"Error creating inventory logs for recipe step: {e}")
+                log_entries = []
+            
+            from app.schemas.inventory import InventoryUpdate
+            for log_entry, (ingredient_name, product_id, new_qty, new_state) in zip(log_entries, pending_updates):
                 try:
-                    log_entry = inventory_service.create_inventory_log(user_id, log_create)
-                    
-                    if log_entry:
-                        log_id = log_entry.get("log_id")
-                        if log_id:
-                            log_ids.append(str(log_id))
-                            
-                            # Update inventory quantity
-                            from app.schemas.inventory import InventoryUpdate
-                            inventory_update = InventoryUpdate(
-                                estimated_qty=new_qty,
-                                state=new_state,
-                                last_source=InventorySource.RECIPE
-                            )
-                            inventory_service.update_inventory(user_id, UUID(product_id), inventory_update, log_change=False)
-                            
-                            # Process log to update predictor model
-                            background_tasks.add_task(
-                                predictor_service.process_inventory_log,
-                                log_id=str(log_id)
-                            )
+                    log_id = log_entry.get("log_id")
+                    if log_id:
+                        log_ids.append(str(log_id))
+                        
+                        # Update inventory quantity
+                        inventory_update = InventoryUpdate(
+                            estimated_qty=new_qty,
+                            state=new_state,
+                            last_source=InventorySource.RECIPE
+                        )
+                        inventory_service.update_inventory(user_id, UUID(product_id), inventory_update, log_change=False)
+                        
+                        # Process log to update predictor model
+                        background_tasks.add_task(
+                            predictor_service.process_inventory_log,
+                            log_id=str(log_id),
+                            log_row=log_entry
+                        )
                 except Exception as e:
                     print(f"Error processing ingredient {ingredient_name}: {e}")
         
@@ -166,18 +166,17 @@ def complete_shopping_list(
         # Get states before purchase (if available)
         log_states = result.get("log_states", {})
         
-        # Update predictor model for each product in background
-        for log_id in result.get("log_ids", []):
+        # Update predictor model for all purchased products in one background task
+        log_ids = [str(log_id) for log_id in result.get("log_ids", [])]
+        if log_ids:
             try:
-                # Get state before purchase for this log_id (if available)
-                state_before = log_states.get(log_id)
                 background_tasks.add_task(
-                    predictor_service.process_inventory_log,
-                    log_id=str(log_id),
-                    state_before_purchase=state_before
+                    predictor_service.process_inventory_logs,
+                    log_ids=log_ids,
+                    states_before_purchase={str(log_id): state for log_id, state in log_states.items()}
                 )
             except Exception as e:
-                print(f"Error scheduling predictor update for log_id {log_id}: {e}")
+                print(f"Error scheduling predictor update for log_ids {log_ids}: {e}")
         
         return result
         
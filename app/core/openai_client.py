@@ -0,0 +1,29 @@
+"""
+Shared OpenAI client
+"""
+from typing import Any, Dict
+import threading
+import httpx
+from openai import OpenAI
+
+# Services are created per request; handing them one client per API key keeps
+# its HTTP connection pool (and the TLS sessions in it) alive across requests
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+_clients: Dict[str, OpenAI] = {}
+_clients_lock = threading.Lock()
+
+
+def get_openai_client(api_key: str, **options: Any) -> OpenAI:
+    """
+    Return the process-wide OpenAI client for api_key, creating it if needed.
+    Per-service settings (e.g. max_retries, timeout) are applied with with_options(),
+    which returns a copy that shares the same connection pool.
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(api_key)
+            if client is None:
+                client = OpenAI(api_key=api_key, http_client=httpx.Client(limits=HTTP_LIMITS))
+                _clients[api_key] = client
+    return client.with_options(**options) if options else client
@@ -2,14 +2,47 @@
 Supabase client configuration
 """
 from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
 from app.core.config import settings
 from typing import Optional
+import threading
+import httpx
+
+# Connection pool shared by the anon and admin clients. Keep-alive connections
+# are reused across requests, so bursts of PostgREST calls (e.g. predictor
+# refresh loops) skip the TCP/TLS handshake; connect failures are retried.
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=64, keepalive_expiry=60.0)
+HTTP_TIMEOUT = httpx.Timeout(120.0)
+HTTP_CONNECT_RETRIES = 2
+
+
+def _create_http_client() -> httpx.Client:
+    """Build the pooled HTTP client handed to supabase-py"""
+    return httpx.Client(
+        transport=httpx.HTTPTransport(retries=HTTP_CONNECT_RETRIES, limits=HTTP_LIMITS),
+        timeout=HTTP_TIMEOUT,
+        follow_redirects=True,
+    )
 
 
 class SupabaseClient:
-    """Singleton Supabase client"""
+    """
+    Singleton Supabase client.
+    One client (and therefore one pooled HTTP connection set) is shared by the
+    whole process; the lock keeps concurrent first requests - sync routes run in
+    FastAPI's threadpool - from each building their own client.
+    """
     _client: Optional[Client] = None
     _admin_client: Optional[Client] = None
+    _http_client: Optional[httpx.Client] = None
+    _lock = threading.Lock()
+    
+    @classmethod
+    def _options(cls) -> SyncClientOptions:
+        """Client options using the shared HTTP client (call with _lock held)"""
+        if cls._http_client is None:
+            cls._http_client = _create_http_client()
+        return SyncClientOptions(httpx_client=cls._http_client)
     
     @classmethod
     def get_client(cls, use_admin: bool = False) -> Client:
@@ -19,16 +52,25 @@ class SupabaseClient:
             use_admin: If True, use service_role_key (bypasses RLS). If False, use anon_key (respects RLS)
         """
         if use_admin:
-            if cls._admin_client is None:
+            if cls._admin_client is not None:
+                return cls._admin_client
+            with cls._lock:
+                if cls._admin_client is not None:
+                    return cls._admin_client
                 if not settings.supabase_url or not settings.supabase_service_role_key:
                     raise ValueError("Supabase URL and service_role_key must be set for admin client")
                 cls._admin_client = create_client(
                     settings.supabase_url,
-                    settings.supabase_service_role_key
+                    settings.supabase_service_role_key,
+                    options=cls._options(),
                 )
-            return cls._admin_client
+                return cls._admin_client
         else:
-            if cls._client is None:
+            if cls._client is not None:
+                return cls._client
+            with cls._lock:
+                if cls._client is not None:
+                    return cls._client
                 if not settings.supabase_url or not settings.supabase_anon_key:
                     raise ValueError(
                         "Supabase URL and anon_key must be set. "
@@ -36,9 +78,10 @@ class SupabaseClient:
                     )
                 cls._client = create_client(
                     settings.supabase_url,
-                    settings.supabase_anon_key
+                    settings.supabase_anon_key,
+                    options=cls._options(),
                 )
-            return cls._client
+                return cls._client
 
 
 def get_supabase(use_admin: bool = False) -> Client:
@@ -12,6 +12,9 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 
+# How many users the daily state update processes at the same time
+DAILY_UPDATE_CONCURRENCY = 8
+
 logger.info("Starting application...")
 logger.info(f"Supabase URL: {settings.supabase_url}")
 
@@ -29,7 +32,7 @@ async def run_daily_weekly_updates():
     if a week has passed since their creation (based on first inventory_log entry).
     Checks once per day (not every minute).
     """
-    from app.services.predictor_service import PredictorService
+    from app.services.predictor_service import PredictorService, WEEKLY_MODEL_UPDATE_ENABLED
     from app.db.supabase_client import get_supabase
     
     # Wait 5 seconds after startup before first run
@@ -43,7 +46,11 @@ async def run_daily_weekly_updates():
             current_minute = now.minute
             
             # Run at 00:00 every day
-            if current_hour == 0 and current_minute == 0:
+            if current_hour == 0 and current_minute == 0 and not WEEKLY_MODEL_UPDATE_ENABLED:
+                # weekly_model_update is a no-op while disabled - don't scan every user's logs for it
+                logger.info("[WEEKLY UPDATE] Weekly model update is disabled, skipping")
+                await asyncio.sleep(24 * 60 * 60)
+            elif current_hour == 0 and current_minute == 0:
                 logger.info(f"[WEEKLY UPDATE] Running daily weekly update check for weekday {current_weekday} ({['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'][current_weekday]})")
                 
                 supabase = get_supabase()
@@ -165,20 +172,20 @@ async def run_daily_state_updates():
                     await asyncio.sleep(24 * 60 * 60)
                     continue
                 
-                total_updated = 0
+                # Users are independent, so run their (blocking) updates in worker threads,
+                # a bounded number at a time, instead of one after another on the event loop
+                semaphore = asyncio.Semaphore(DAILY_UPDATE_CONCURRENCY)
                 
-                for user_row in users_result.data:
-                    user_id = user_row["user_id"]
-                    try:
-                        service.daily_state_update_all_products(str(user_id))
-                        # Count products for this user
-                        products = service.repo.get_user_inventory_products(str(user_id))
-                        total_updated += len(list(products))
-                    except Exception as e:
-                        logger.error(f"[DAILY STATE UPDATE] Error processing user {user_id}: {e}")
-                        import traceback
-                        traceback.print_exc()
-                        continue
+                async def update_user(user_id) -> int:
+                    async with semaphore:
+                        try:
+                            return await asyncio.to_thread(service.daily_state_update_all_products, str(user_id))
+                        except Exception:
+                            logger.exception("[DAILY STATE UPDATE] Error processing user %s", user_id)
+                            return 0
+                
+                counts = await asyncio.gather(*(update_user(user_row["user_id"]) for user_row in users_result.data))
+                total_updated = sum(counts)
                 
                 logger.info(f"[DAILY STATE UPDATE] Completed: {total_updated} products updated across all users")
                 
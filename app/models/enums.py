@@ -70,3 +70,15 @@ class PredictorMethod(str, Enum):
     EMA = "EMA"
     BAYES_FILTER = "BAYES_FILTER"
 
+
+
+# Precomputed member -> value lookup for the habit/inventory write paths. On CPython 3.11
+# `.value` goes through a property (~180ns per read); indexing this dict takes ~20ns
+ENUM_VALUES = {
+    member: member.value
+    for enum_cls in (
+        InventoryState, InventorySource, InventoryAction,
+        HabitStatus, HabitType, HabitInputSource,
+    )
+    for member in enum_cls
+}
@@ -1,8 +1,9 @@
 """
 Pydantic schemas for Habits
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from typing import Optional, List, Dict, Any
+import re
 from datetime import datetime
 from app.models.enums import HabitType, HabitStatus, HabitInputSource
 
@@ -95,3 +96,103 @@ class ChatResponse(BaseModel):
     extracted_data: Optional[Dict[str, Any]] = None
     suggested_habits: Optional[List[str]] = None
 
+
+
+class _LenientChatModel(BaseModel):
+    """
+    Base for the chat model's JSON output: a field whose value doesn't fit its type
+    falls back to the field's default instead of failing the whole reply, so one
+    off-schema value doesn't throw away everything else the model extracted
+    """
+
+    @field_validator("*", mode="wrap")
+    @classmethod
+    def _default_on_error(cls, value, handler, info):
+        try:
+            return handler(value)
+        except ValidationError:
+            return cls.model_fields[info.field_name].get_default(call_default_factory=True)
+
+
+class ChatExtractedData(HabitParams, _LenientChatModel):
+    """HabitParams as extracted by the chat model"""
+
+    @field_validator("household_size", mode="before")
+    @classmethod
+    def _household_size_from_text(cls, value):
+        # "4 people" -> 4
+        if isinstance(value, str):
+            match = re.search(r"\d+", value)
+            return int(match.group()) if match else None
+        return value
+
+    @field_validator("dietary_preferences", "excluded_categories", mode="before")
+    @classmethod
+    def _list_from_text(cls, value):
+        # "vegetarian" -> ["vegetarian"]; non-string entries are dropped
+        if isinstance(value, str):
+            return [value]
+        if isinstance(value, list):
+            return [item for item in value if isinstance(item, str)]
+        return value
+
+
+class ChatHabitEffects(_LenientChatModel):
+    """Effects of a habit suggested by the chat model (names, not IDs)"""
+    product_multipliers: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Product NAME (e.g. 'milk') -> consumption multiplier"
+    )
+    category_multipliers: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Category NAME from all_available_categories (e.g. 'Dairy') -> consumption multiplier"
+    )
+    global_multiplier: Optional[float] = None
+
+    @field_validator("product_multipliers", "category_multipliers", mode="before")
+    @classmethod
+    def _numeric_multipliers(cls, value):
+        # Keep the entries that are numbers, drop the rest
+        if isinstance(value, dict):
+            kept = {}
+            for name, multiplier in value.items():
+                try:
+                    kept[name] = float(multiplier)
+                except (TypeError, ValueError):
+                    continue
+            return kept
+        return value
+
+
+class ChatSuggestedHabit(_LenientChatModel):
+    """Habit suggested by the chat model"""
+    name: Optional[str] = Field(
+        None,
+        description="Short, user-friendly name, 2-4 words (e.g. 'Weekly Shopping', 'Vegetarian Diet')"
+    )
+    type: HabitType = HabitType.OTHER
+    description: Optional[str] = Field(None, description="Detailed explanation of the habit")
+    effects: ChatHabitEffects = Field(default_factory=ChatHabitEffects)
+
+
+class ChatModelInsights(_LenientChatModel):
+    """Insights from the chat model that can update the predictor"""
+    new_habits: List[ChatSuggestedHabit] = Field(default_factory=list)
+
+    @field_validator("new_habits", mode="before")
+    @classmethod
+    def _habit_objects_only(cls, value):
+        # Skip entries that aren't habit objects instead of dropping the whole list
+        if isinstance(value, list):
+            return [item for item in value if isinstance(item, dict)]
+        return value
+
+
+class ChatOutput(_LenientChatModel):
+    """Structured JSON output expected from the habit chat model"""
+    response: str = Field(
+        "I've updated your preferences.",
+        description="Friendly response to the user acknowledging what you learned"
+    )
+    extracted_data: ChatExtractedData = Field(default_factory=ChatExtractedData)
+    model_insights: ChatModelInsights = Field(default_factory=ChatModelInsights)
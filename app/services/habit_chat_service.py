@@ -2,14 +2,135 @@
 Habit Chat Service using OpenAI GPT
 Extracts user preferences and consumption patterns from natural language
 """
-from typing import List, Optional, Dict, Any
-from openai import OpenAI
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple
+from openai import APIConnectionError, APIStatusError, BadRequestError, RateLimitError
+import copy
 import os
 import json
+import hashlib
 import logging
+import random
+import threading
+import time
+
+from pydantic import ValidationError
+
+from app.core.openai_client import get_openai_client
+from app.schemas.habit import ChatOutput
 
 logger = logging.getLogger(__name__)
 
+# Retry policy for transient OpenAI failures (429, 5xx, network errors)
+MAX_ATTEMPTS = 5
+BACKOFF_INITIAL_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+# Per-request timeout for habit chat completions
+REQUEST_TIMEOUT_SECONDS = 60.0
+
+# Only the most recent conversation messages are sent to bound prompt size
+MAX_HISTORY_MESSAGES = 20
+
+# Upper bound on completion length - the extraction JSON is a few hundred tokens
+MAX_COMPLETION_TOKENS = 800
+
+BASE_INSTRUCTIONS = """You are a helpful AI assistant for a smart pantry management system. 
+Your role is to:
+1. Extract user preferences and habits from natural language
+2. Understand consumption patterns
+3. Suggest improvements to the user's pantry management
+4. Provide insights that can help improve the AI prediction model
+
+IMPORTANT: Extract ALL information you can find, even if it's implicit. For example:
+- "we are 4 people" → household_size: 4
+- "I shop every Sunday" → preferred_shopping_day: "Sunday", shopping_frequency: "weekly"
+- "we don't eat meat" → excluded_categories: ["meat"], dietary_preferences: ["vegetarian"]
+
+Extract information about:
+- Household size (look for numbers + "people", "family", "household")
+- Shopping frequency and preferred days (look for "shop", "buy", "grocery", days of week)
+- Cooking frequency (look for "cook", "prepare meals", "kitchen")
+- Dietary preferences (vegetarian, vegan, kosher, halal, etc.)
+- Excluded food categories (meat, dairy, gluten, etc.)
+- Special events or habits that affect consumption
+
+IMPORTANT: 
+- model_insights.new_habits is the ONLY way to create habits - use it for dietary preferences, consumption patterns and any other habit that affects product consumption.
+- effects use product and category NAMES, never IDs. Use product names from user_products and category names from all_available_categories in the context. If a name is not in all_available_categories, it's likely a product, not a category.
+- The system will automatically convert these names to IDs. If a name doesn't exist, that effect will be skipped."""
+
+# The JSON structure is generated from the ChatOutput schema so the prompt
+# and the response parser can never drift apart
+SYSTEM_PROMPT = (
+    BASE_INSTRUCTIONS
+    + "\n\nReturn JSON matching this schema (use null or empty values for anything missing):\n"
+    + json.dumps(ChatOutput.model_json_schema(), separators=(",", ":"))
+)
+
+# Process-wide cache of parsed responses keyed by a hash of the full prompt
+# (system prompt, user context, history and message), so repeated questions
+# with unchanged context skip the OpenAI round-trip
+RESPONSE_CACHE_SIZE = 256
+RESPONSE_CACHE_TTL_SECONDS = 60 * 60
+_RESPONSE_CACHE: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_RESPONSE_CACHE_LOCK = threading.Lock()
+
+
+def _cache_key(messages: List[Dict[str, str]]) -> str:
+    """Stable hash of the messages sent to OpenAI"""
+    payload = json.dumps(messages, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_get(key: str) -> Optional[Dict[str, Any]]:
+    """Return a cached response if present and not expired"""
+    with _RESPONSE_CACHE_LOCK:
+        entry = _RESPONSE_CACHE.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if time.monotonic() - stored_at > RESPONSE_CACHE_TTL_SECONDS:
+            del _RESPONSE_CACHE[key]
+            return None
+        _RESPONSE_CACHE.move_to_end(key)
+        return value
+
+
+def _cache_put(key: str, value: Dict[str, Any]) -> None:
+    """Store a response, evicting the least recently used entry when full"""
+    with _RESPONSE_CACHE_LOCK:
+        _RESPONSE_CACHE[key] = (time.monotonic(), value)
+        _RESPONSE_CACHE.move_to_end(key)
+        while len(_RESPONSE_CACHE) > RESPONSE_CACHE_SIZE:
+            _RESPONSE_CACHE.popitem(last=False)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Return True for rate limits, server errors and connection failures"""
+    if isinstance(error, (RateLimitError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """
+    Seconds to wait before the next attempt.
+    Honors the Retry-After header when the server sends one, otherwise
+    falls back to exponential backoff with jitter.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+    delay = BACKOFF_INITIAL_SECONDS * (2 ** (attempt - 1))
+    return min(delay + random.uniform(0, 1), BACKOFF_MAX_SECONDS)
+
 
 class HabitChatService:
     """Service for chatting with GPT to extract habits and preferences"""
@@ -20,12 +141,83 @@ class HabitChatService:
             raise ValueError("OpenAI API key is required")
         
         try:
-            self.client = OpenAI(api_key=self.api_key)
+            # Retries are handled by _create_completion, so disable the SDK's own
+            self.client = get_openai_client(self.api_key, max_retries=0, timeout=REQUEST_TIMEOUT_SECONDS)
         except Exception as e:
             logger.error(f"Error initializing OpenAI client: {e}")
             # Fallback for newer OpenAI versions (should not be needed with openai>=1.55.3)
             raise ValueError(f"Failed to initialize OpenAI client: {str(e)}")
     
+    def _create_completion(self, messages: List[Dict[str, str]]):
+        """Call the chat completions API, retrying transient failures with backoff"""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=MAX_COMPLETION_TOKENS,
+                    response_format={"type": "json_object"}  # Force JSON response
+                )
+            except Exception as e:
+                if attempt == MAX_ATTEMPTS or not _is_retryable(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning(
+                    "OpenAI request failed (attempt %d/%d): %s - retrying in %.1fs",
+                    attempt, MAX_ATTEMPTS, e, delay
+                )
+                time.sleep(delay)
+    
+    def _complete_text(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Call OpenAI and return the raw response text"""
+        response = self._create_completion(messages)
+        response_text = response.choices[0].message.content
+        logger.debug("GPT raw response: %s", response_text)
+        if response.usage:
+            logger.info(
+                "habit_chat.ok",
+                extra={
+                    "prompt_tokens": response.usage.prompt_tokens,
+                    "completion_tokens": response.usage.completion_tokens,
+                }
+            )
+        return response_text
+    
+    def _request_output(self, messages: List[Dict[str, str]]) -> ChatOutput:
+        """
+        Get a validated ChatOutput from GPT.
+        Off-schema fields fall back to their defaults (see _LenientChatModel); if the first
+        reply isn't usable JSON at all, GPT is asked once to fix it before the
+        ValidationError is propagated.
+        """
+        response_text = self._complete_text(messages)
+        try:
+            return ChatOutput.model_validate_json(response_text)
+        except ValidationError as e:
+            logger.warning(f"Invalid JSON from GPT, requesting a corrected reply: {e}")
+            logger.debug("Response text: %s", response_text)
+        
+        repair_messages = messages + [
+            {"role": "assistant", "content": response_text or ""},
+            {
+                "role": "user",
+                "content": "Your previous reply was not valid JSON matching the schema. "
+                           "Return ONLY valid JSON matching the schema."
+            }
+        ]
+        return ChatOutput.model_validate_json(self._complete_text(repair_messages))
+    
+    @staticmethod
+    def _fallback_response() -> Dict[str, Any]:
+        """Basic response returned when GPT output cannot be used"""
+        return {
+            "response": "I understand. Let me help you update your preferences.",
+            "extracted_data": {},
+            "model_insights": {},
+            "suggested_habits": []
+        }
+    
     def chat_with_user(
         self,
         user_message: str,
@@ -38,7 +230,8 @@ class HabitChatService:
         
         Args:
             user_message: User's message
-            conversation_history: Previous messages in the conversation
+            conversation_history: Previous messages in the conversation (only the
+                last MAX_HISTORY_MESSAGES are sent)
             user_preferences: Current user preferences (to provide context)
             user_inventory_summary: Summary of user's inventory (to provide context)
         
@@ -50,64 +243,6 @@ class HabitChatService:
             - model_insights: Insights that can update the predictor model
         """
         
-        # Build system prompt
-        system_prompt = """You are a helpful AI assistant for a smart pantry management system. 
-Your role is to:
-1. Extract user preferences and habits from natural language
-2. Understand consumption patterns
-3. Suggest improvements to the user's pantry management
-4. Provide insights that can help improve the AI prediction model
-
-IMPORTANT: Extract ALL information you can find, even if it's implicit. For example:
-- "we are 4 people" → household_size: 4
-- "I shop every Sunday" → preferred_shopping_day: "Sunday", shopping_frequency: "weekly"
-- "we don't eat meat" → excluded_categories: ["meat"], dietary_preferences: ["vegetarian"]
-
-Extract information about:
-- Household size (look for numbers + "people", "family", "household")
-- Shopping frequency and preferred days (look for "shop", "buy", "grocery", days of week)
-- Cooking frequency (look for "cook", "prepare meals", "kitchen")
-- Dietary preferences (vegetarian, vegan, kosher, halal, etc.)
-- Excluded food categories (meat, dairy, gluten, etc.)
-- Special events or habits that affect consumption
-
-Return your response in JSON format with the following structure (ALL fields are required, use null for missing values):
-{
-  "response": "Your friendly response to the user acknowledging what you learned",
-  "extracted_data": {
-    "household_size": number or null,
-    "preferred_shopping_day": "Monday" or null,
-    "shopping_frequency": "weekly" or null,
-    "cooking_frequency": "daily" or null,
-    "dietary_preferences": ["vegetarian", "kosher", ...] or [],
-    "excluded_categories": ["meat", "dairy", ...] or [],
-    "notes": "Any additional notes" or null
-  },
-  "model_insights": {
-    "new_habits": [
-      {
-        "name": "Short, user-friendly name (e.g., 'Weekly Shopping', 'Vegetarian Diet', 'Sunday Meal Prep')",
-        "type": "DIET" or "HOUSEHOLD" or "SHOPPING_SCHEDULE" or "OTHER",
-        "description": "Detailed explanation of the habit",
-        "effects": {
-          "product_multipliers": {"product_name": multiplier} or {},
-          "category_multipliers": {"category_name": multiplier} or {},
-          "global_multiplier": number or null
-        }
-      }
-    ]
-  }
-}
-
-IMPORTANT: 
-- new_habits: This is the ONLY way to create habits. When suggesting habits, always include a concise "name" field (2-4 words) that clearly identifies the habit. The name should be user-friendly and descriptive (e.g., "Weekly Shopping", "Vegetarian Diet", "Sunday Meal Prep", "High Protein Intake"). The "description" field should contain more detailed explanation.
-- Use new_habits for ALL habit creation - whether it's a dietary preference, consumption pattern, or any other habit that affects product consumption.
-- effects in new_habits:
-  * product_multipliers: Use product NAMES (e.g., "milk", "bread"), NOT product IDs. Use names from the user's inventory if available (see user_products in context).
-  * category_multipliers: Use category NAMES (e.g., "Dairy", "Bakery"), NOT category IDs. Only use categories that exist in the system (see all_available_categories in context). If a name is not in all_available_categories, it's likely a product, not a category.
-  * The system will automatically convert these names to IDs. If a name doesn't exist, that effect will be skipped.
-  * When in doubt whether something is a product or category, check the all_available_categories list in the context. If it's not there, it's likely a product."""
-        
         # Build user context
         context_parts = []
         
@@ -121,58 +256,49 @@ IMPORTANT:
         
         # Build messages
         messages = [
-            {"role": "system", "content": system_prompt},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "system", "content": f"User context:\n{context}"}
         ]
         
-        # Add conversation history
+        # Add conversation history (sliding window of the latest messages)
         if conversation_history:
-            messages.extend(conversation_history)
+            messages.extend(conversation_history[-MAX_HISTORY_MESSAGES:])
         
         # Add current user message
         messages.append({"role": "user", "content": user_message})
         
+        cache_key = _cache_key(messages)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            logger.info("Returning cached GPT response")
+            return copy.deepcopy(cached)
+        
         try:
-            # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=messages,
-                temperature=0.7,
-                response_format={"type": "json_object"}  # Force JSON response
-            )
-            
-            # Parse response
-            response_text = response.choices[0].message.content
-            logger.info(f"GPT raw response: {response_text}")
+            parsed_response = self._request_output(messages)
+            logger.debug("GPT parsed response: %s", parsed_response)
             
-            parsed_response = json.loads(response_text)
-            logger.info(f"GPT parsed response: {json.dumps(parsed_response, indent=2)}")
+            extracted_data = parsed_response.extracted_data.model_dump()
+            model_insights = parsed_response.model_insights.model_dump(mode="json")
             
-            # Extract data
-            extracted_data = parsed_response.get("extracted_data", {}) or {}
-            model_insights = parsed_response.get("model_insights", {}) or {}
-            gpt_response = parsed_response.get("response", "I've updated your preferences.")
+            logger.debug("Final extracted_data: %s", extracted_data)
+            logger.debug("Final model_insights: %s", model_insights)
             
-            logger.info(f"Final extracted_data: {extracted_data}")
-            logger.info(f"Final model_insights: {model_insights}")
-            
-            return {
-                "response": gpt_response,
+            result = {
+                "response": parsed_response.response,
                 "extracted_data": extracted_data,
                 "model_insights": model_insights,
-                "suggested_habits": model_insights.get("new_habits", [])
+                "suggested_habits": model_insights["new_habits"]
             }
+            _cache_put(cache_key, copy.deepcopy(result))
+            return result
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Error parsing JSON from GPT response: {e}")
-            logger.error(f"Response text: {response_text}")
-            # Fallback: return basic response
-            return {
-                "response": "I understand. Let me help you update your preferences.",
-                "extracted_data": {},
-                "model_insights": {},
-                "suggested_habits": []
-            }
+        except ValidationError as e:
+            logger.error(f"Error parsing JSON from GPT response after repair attempt: {e}")
+            return self._fallback_response()
+        except BadRequestError as e:
+            # Not transient - retrying the same request would fail again
+            logger.error(f"OpenAI rejected the request: {e}")
+            return self._fallback_response()
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {e}")
             raise ValueError(f"Failed to get response from GPT: {str(e)}")
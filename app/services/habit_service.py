@@ -1,10 +1,58 @@
 """
 Service layer for Habits operations using Supabase API
 """
-from typing import List, Optional, Dict, Any
+import copy
+import threading
+import time
+from operator import methodcaller
+from typing import List, Optional, Dict, Any, Tuple
 from supabase import Client
 from app.schemas.habit import HabitCreate, HabitUpdate, HabitInputCreate
-from app.models.enums import HabitType, HabitStatus, HabitInputSource
+from app.models.enums import HabitType, HabitStatus, HabitInputSource, ENUM_VALUES
+from app.services.predictor_service import invalidate_habits
+
+# Explicit column list matching HabitResponse
+HABIT_COLUMNS = (
+    "habit_id,user_id,type,status,name,explanation,params,effects,"
+    "start_date,end_date,created_at,updated_at"
+)
+
+# HabitUpdate fields copied into the update payload, with an optional transform
+_HABIT_UPDATE_FIELDS = (
+    ("type", ENUM_VALUES.__getitem__),
+    ("status", ENUM_VALUES.__getitem__),
+    ("name", None),
+    ("explanation", None),
+    ("params", None),
+    ("effects", None),
+    ("start_date", methodcaller("isoformat")),
+    ("end_date", methodcaller("isoformat")),
+)
+
+# Columns returned by the get_user_preferences SQL function
+# (see migrations/add_get_user_preferences_function.sql)
+PREFERENCE_KEYS = (
+    "household_size",
+    "preferred_shopping_day",
+    "shopping_frequency",
+    "cooking_frequency",
+    "dietary_preferences",
+    "excluded_categories",
+    "notes",
+)
+PREFERENCE_LIST_KEYS = frozenset(("dietary_preferences", "excluded_categories"))
+
+# Process-local cache of aggregated preferences per user. Entries expire after
+# PREFERENCES_CACHE_TTL_SECONDS and are dropped whenever that user's habits change.
+PREFERENCES_CACHE_TTL_SECONDS = 60
+_preferences_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_preferences_cache_lock = threading.Lock()
+
+
+def invalidate_user_preferences(user_id: str) -> None:
+    """Drop the cached preferences for a user"""
+    with _preferences_cache_lock:
+        _preferences_cache.pop(user_id, None)
 
 
 class HabitService:
@@ -17,8 +65,8 @@ class HabitService:
         """Create a new habit"""
         data = {
             "user_id": user_id,
-            "type": habit.type.value,
-            "status": habit.status.value,
+            "type": ENUM_VALUES[habit.type],
+            "status": ENUM_VALUES[habit.status],
             "explanation": habit.explanation,
             "params": habit.params or {},
             "effects": habit.effects or {},
@@ -31,52 +79,47 @@ class HabitService:
             data["end_date"] = habit.end_date.isoformat()
 
         result = self.supabase.table("habits").insert(data).execute()
+        invalidate_user_preferences(user_id)
+        invalidate_habits(user_id)
         if result.data:
             return result.data[0]
         raise Exception("Failed to create habit")
 
     def get_habits(self, user_id: str, type: Optional[HabitType] = None, status: Optional[HabitStatus] = None) -> List[Dict[str, Any]]:
         """Get all habits for a user"""
-        query = self.supabase.table("habits").select("*").eq("user_id", user_id)
+        query = self.supabase.table("habits").select(HABIT_COLUMNS).eq("user_id", user_id)
         
         if type:
-            query = query.eq("type", type.value)
+            query = query.eq("type", ENUM_VALUES[type])
         if status:
-            query = query.eq("status", status.value)
+            query = query.eq("status", ENUM_VALUES[status])
         
         result = query.execute()
         return result.data or []
 
     def get_habit(self, habit_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific habit by ID"""
-        result = self.supabase.table("habits").select("*").eq("habit_id", habit_id).eq("user_id", user_id).execute()
-        if result.data:
-            return result.data[0]
-        return None
+        # maybe_single() returns None (not a response) when no row matches
+        result = self.supabase.table("habits").select(HABIT_COLUMNS).eq(
+            "habit_id", habit_id
+        ).eq("user_id", user_id).limit(1).maybe_single().execute()
+        return result.data if result else None
 
     def update_habit(self, habit_id: str, user_id: str, habit: HabitUpdate) -> Optional[Dict[str, Any]]:
         """Update a habit"""
-        data = {}
-        if habit.type is not None:
-            data["type"] = habit.type.value
-        if habit.status is not None:
-            data["status"] = habit.status.value
-        if habit.name is not None:
-            data["name"] = habit.name
-        if habit.explanation is not None:
-            data["explanation"] = habit.explanation
-        if habit.params is not None:
-            data["params"] = habit.params
-        if habit.effects is not None:
-            data["effects"] = habit.effects
-        if habit.start_date is not None:
-            data["start_date"] = habit.start_date.isoformat()
-        if habit.end_date is not None:
-            data["end_date"] = habit.end_date.isoformat()
+        data = {
+            field: (transform(value) if transform else value)
+            for field, transform in _HABIT_UPDATE_FIELDS
+            if (value := getattr(habit, field)) is not None
+        }
 
-        data["updated_at"] = "now()"
+        if not data:
+            return self.get_habit(habit_id, user_id)
 
+        # updated_at is set by the update_habits_updated_at trigger
         result = self.supabase.table("habits").update(data).eq("habit_id", habit_id).eq("user_id", user_id).execute()
+        invalidate_user_preferences(user_id)
+        invalidate_habits(user_id)
         if result.data:
             return result.data[0]
         return None
@@ -92,6 +135,8 @@ class HabitService:
         # Note: Supabase delete may return empty data even on success
         # So we verify deletion by checking if the habit still exists
         result = self.supabase.table("habits").delete().eq("habit_id", habit_id).eq("user_id", user_id).execute()
+        invalidate_user_preferences(user_id)
+        invalidate_habits(user_id)
         
         # Verify deletion by checking if it still exists
         # This is more reliable than checking result.data length
@@ -102,7 +147,7 @@ class HabitService:
         """Create a new habit input (chat message)"""
         data = {
             "user_id": user_id,
-            "source": habit_input.source.value,
+            "source": ENUM_VALUES[habit_input.source],
             "raw_text": habit_input.raw_text,
             "extracted_json": habit_input.extracted_json or {},
         }
@@ -126,51 +171,39 @@ class HabitService:
 
     def confirm_habit_input(self, habit_input_id: str, user_id: str) -> Optional[Dict[str, Any]]:
         """Confirm a habit input (mark as confirmed)"""
-        from datetime import datetime
-        result = self.supabase.table("habit_inputs").update({
-            "confirmed_at": datetime.utcnow().isoformat()
-        }).eq("habit_input_id", habit_input_id).eq("user_id", user_id).execute()
+        # confirmed_at is stamped by the database (see migrations/add_updated_at_triggers.sql)
+        result = self.supabase.rpc("confirm_habit_input", {
+            "p_habit_input_id": habit_input_id,
+            "p_user_id": user_id,
+        }).execute()
         
         if result.data:
             return result.data[0]
         return None
 
     def get_user_preferences(self, user_id: str) -> Dict[str, Any]:
-        """Get user preferences from habits (aggregated)"""
-        habits = self.get_habits(user_id, status=HabitStatus.ACTIVE)
-        
-        preferences = {
-            "household_size": None,
-            "preferred_shopping_day": None,
-            "shopping_frequency": None,
-            "cooking_frequency": None,
-            "dietary_preferences": [],
-            "excluded_categories": [],
-            "notes": None,
-        }
-        
-        # Aggregate preferences from all active habits
-        for habit in habits:
-            if habit.get("params"):
-                params = habit["params"]
-                if "household_size" in params and preferences["household_size"] is None:
-                    preferences["household_size"] = params["household_size"]
-                if "preferred_shopping_day" in params and preferences["preferred_shopping_day"] is None:
-                    preferences["preferred_shopping_day"] = params["preferred_shopping_day"]
-                if "shopping_frequency" in params and preferences["shopping_frequency"] is None:
-                    preferences["shopping_frequency"] = params["shopping_frequency"]
-                if "cooking_frequency" in params and preferences["cooking_frequency"] is None:
-                    preferences["cooking_frequency"] = params["cooking_frequency"]
-                if "dietary_preferences" in params:
-                    preferences["dietary_preferences"].extend(params["dietary_preferences"])
-                if "excluded_categories" in params:
-                    preferences["excluded_categories"].extend(params["excluded_categories"])
-                if "notes" in params and preferences["notes"] is None:
-                    preferences["notes"] = params["notes"]
+        """
+        Get user preferences from habits (aggregated).
+        Aggregation over active habits happens in the get_user_preferences SQL
+        function, which reads only the needed params keys and returns one row.
+        Results are cached per user for a short TTL.
+        """
+        now = time.monotonic()
+        with _preferences_cache_lock:
+            cached = _preferences_cache.get(user_id)
+        if cached is not None and now - cached[0] < PREFERENCES_CACHE_TTL_SECONDS:
+            return copy.deepcopy(cached[1])
         
-        # Remove duplicates
-        preferences["dietary_preferences"] = list(set(preferences["dietary_preferences"]))
-        preferences["excluded_categories"] = list(set(preferences["excluded_categories"]))
+        result = self.supabase.rpc("get_user_preferences", {"uid": user_id}).execute()
+        if not result.data:
+            preferences = {key: [] if key in PREFERENCE_LIST_KEYS else None for key in PREFERENCE_KEYS}
+        else:
+            row = result.data[0]
+            preferences = {
+                key: (row.get(key) or []) if key in PREFERENCE_LIST_KEYS else row.get(key)
+                for key in PREFERENCE_KEYS
+            }
         
+        with _preferences_cache_lock:
+            _preferences_cache[user_id] = (now, copy.deepcopy(preferences))
         return preferences
-
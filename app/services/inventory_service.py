@@ -1,12 +1,50 @@
 """
 Inventory service using Supabase API
 """
+import logging
 from typing import List, Optional
 from uuid import UUID
 from supabase import Client
 from datetime import datetime
 from app.schemas.inventory import InventoryCreate, InventoryUpdate, InventoryLogCreate
-from app.models.enums import InventoryState, InventorySource, InventoryAction
+from app.models.enums import InventoryState, ENUM_VALUES
+
+logger = logging.getLogger(__name__)
+
+# Explicit column lists matching InventoryResponse / InventoryLogResponse
+INVENTORY_COLUMNS = (
+    "user_id,product_id,state,estimated_qty,qty_unit,confidence,"
+    "last_updated_at,last_source,displayed_name"
+)
+INVENTORY_LOG_COLUMNS = (
+    "log_id,user_id,product_id,action,delta_state,action_confidence,"
+    "occurred_at,source,receipt_item_id,shopping_list_item_id,note"
+)
+
+# InventoryUpdate fields copied into the update payload, with an optional transform
+_INVENTORY_UPDATE_FIELDS = (
+    ("state", ENUM_VALUES.__getitem__),
+    ("estimated_qty", None),
+    ("qty_unit", None),
+    ("confidence", None),
+    ("last_source", ENUM_VALUES.__getitem__),
+    ("displayed_name", None),
+)
+
+def _search_pattern(search: str) -> Optional[str]:
+    """
+    Quoted PostgREST ilike value matching `search` literally anywhere in the column,
+    or None when there is nothing to search for (blank input).
+    LIKE wildcards are backslash-escaped; PostgREST always turns * into %, so a literal *
+    becomes the single-character wildcard _. The pattern is then double-quoted so
+    , . : ( ) in the term can't break the or= filter.
+    """
+    term = search.strip()
+    if not term:
+        return None
+    pattern = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("*", "_")
+    quoted = pattern.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"*{quoted}*"'
 
 
 class InventoryService:
@@ -20,141 +58,83 @@ class InventoryService:
         user_id: UUID, 
         category_id: Optional[UUID] = None,
         state: Optional[str] = None,
-        search: Optional[str] = None
+        search: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None
     ) -> List[dict]:
-        """Get all inventory items for a user with optional filtering"""
-        # If filtering by category, first get all product_ids in that category
-        product_ids_filter = None
-        if category_id:
-            products_response = self.supabase.table("products").select("product_id").eq("category_id", str(category_id)).execute()
-            if products_response.data:
-                product_ids = [item["product_id"] for item in products_response.data]
-                if product_ids:
-                    product_ids_filter = product_ids
-                else:
-                    # No products in this category, return empty list
-                    return []
-        
-        # Build query - get inventory with products
-        # First get basic inventory with products (without nested categories)
+        """
+        Get inventory items for a user with optional filtering.
+        When `limit` is given, only that page (starting at `offset`) is fetched
+        using a server-side range; otherwise all matching items are returned.
+        """
+        # Build query - get inventory with products and their categories embedded,
+        # so PostgREST joins everything server-side in a single round-trip.
+        # When filtering by category or searching, an inner join lets the filters on
+        # the embedded products table drop non-matching inventory rows (on a left
+        # embed they would only null out the embed).
+        pattern = _search_pattern(search) if search else None
+        products_embed = "products!inner" if category_id or pattern else "products"
         query = self.supabase.table("inventory").select(
-            "*, "
-            "products("
+            f"{INVENTORY_COLUMNS}, "
+            f"{products_embed}("
             "product_id, "
             "product_name, "
             "category_id, "
             "default_unit, "
-            "barcode"
+            "barcode, "
+            "product_categories(category_id, category_name)"
             ")"
         ).eq("user_id", str(user_id))
         
-        # Filter by category (server-side using product_ids)
-        if product_ids_filter:
-            # Supabase PostgREST supports filtering by array using .in_()
-            # Convert UUIDs to strings for filtering
-            product_ids_str = [str(pid) for pid in product_ids_filter]
-            query = query.in_("product_id", product_ids_str)
+        # Filter by category (server-side via the inner-joined products)
+        if category_id:
+            query = query.eq("products.category_id", str(category_id))
         
         # Filter by state
         if state:
             query = query.eq("state", state)
         
+        # Filter by search text (server-side ILIKE on display name or product name,
+        # over the inner-joined products); a blank search is no filter at all
+        if pattern:
+            query = query.or_(
+                f"displayed_name.ilike.{pattern},products.product_name.ilike.{pattern}"
+            )
+        
+        # Paginate server-side (ordered so pages are stable)
+        if limit is not None:
+            query = query.order("product_id").range(offset, offset + limit - 1)
+        
         try:
             response = query.execute()
             results = response.data if response.data else []
             
-            # Debug: log first item structure to see what we're getting
-            if results and len(results) > 0:
-                import json
-                print(f"[DEBUG Inventory] Total items: {len(results)}")
-                print(f"[DEBUG Inventory] First item structure: {json.dumps(results[0], indent=2, default=str)}")
-                
-                # Check if products and categories are present
-                first_item = results[0]
-                if "products" in first_item:
-                    products_data = first_item["products"]
-                    print(f"[DEBUG Inventory] Products data type: {type(products_data)}")
-                    print(f"[DEBUG Inventory] Products data: {json.dumps(products_data, indent=2, default=str)}")
-                else:
-                    print(f"[DEBUG Inventory] WARNING: No 'products' key in inventory item!")
+            if results and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("[Inventory] Total items: %d, first item: %s", len(results), results[0])
         except Exception as e:
-            print(f"[ERROR Inventory] Failed to execute query: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[Inventory] Failed to execute query: %s", e)
             results = []
         
-        # Post-process: Fetch and attach category information
-        # Get all unique category_ids from products
-        category_ids = set()
-        for item in results:
-            if "products" in item and isinstance(item["products"], dict):
-                products = item["products"]
-                category_id = products.get("category_id")
-                if category_id:
-                    category_ids.add(str(category_id))
-        
-        # Fetch all categories in one query
-        categories_map = {}
-        if category_ids:
-            try:
-                categories_response = self.supabase.table("product_categories").select(
-                    "category_id, category_name"
-                ).in_("category_id", list(category_ids)).execute()
-                
-                if categories_response.data:
-                    for cat in categories_response.data:
-                        categories_map[str(cat["category_id"])] = cat
-            except Exception as e:
-                print(f"[WARNING Inventory] Failed to fetch categories: {e}")
-        
-        # Attach category information to each product
-        for item in results:
-            if "products" in item and isinstance(item["products"], dict):
-                products = item["products"]
-                category_id = products.get("category_id")
-                
-                # Debug: log category_id for each item
-                if category_id:
-                    print(f"[DEBUG Inventory] Item {item.get('product_id')}: category_id={category_id}")
-                    category_id_str = str(category_id)
-                    if category_id_str in categories_map:
-                        # Attach category info directly to products
-                        products["product_categories"] = categories_map[category_id_str]
-                        print(f"[DEBUG Inventory] Attached category {categories_map[category_id_str].get('category_name')} to product {item.get('product_id')}")
-                    else:
-                        print(f"[WARNING Inventory] Category {category_id_str} not found in categories_map")
-                else:
-                    print(f"[DEBUG Inventory] Item {item.get('product_id')}: No category_id")
-            else:
-                # Debug: log if products is missing or wrong type
-                print(f"[WARNING Inventory] Item {item.get('product_id')}: products missing or wrong type. Has 'products' key: {'products' in item}, Type: {type(item.get('products'))}")
-        
-        # Apply search filter (client-side filtering as it's text search)
-        if search:
-            search_lower = search.lower()
-            results = [
-                item for item in results
-                if search_lower in item.get("displayed_name", "").lower() 
-                or (item.get("products", {}).get("product_name", "").lower() if isinstance(item.get("products"), dict) else "")
-            ]
-        
         return results
     
     def get_inventory_item(self, user_id: UUID, product_id: UUID) -> Optional[dict]:
         """Get a specific inventory item"""
-        response = self.supabase.table("inventory").select("*").eq("user_id", str(user_id)).eq("product_id", str(product_id)).execute()
-        return response.data[0] if response.data else None
+        # maybe_single() returns None (not a response) when no row matches
+        response = self.supabase.table("inventory").select(INVENTORY_COLUMNS).eq(
+            "user_id", str(user_id)
+        ).eq("product_id", str(product_id)).limit(1).maybe_single().execute()
+        return response.data if response else None
     
     def create_inventory(self, user_id: UUID, inventory: InventoryCreate) -> dict:
         """Create or update an inventory item"""
         data = {
             "user_id": str(user_id),
             "product_id": str(inventory.product_id),
-            "state": inventory.state.value,
+            "state": ENUM_VALUES[inventory.state],
             "estimated_qty": inventory.estimated_qty,
             "qty_unit": inventory.qty_unit,
             "confidence": inventory.confidence,
-            "last_source": inventory.last_source.value,
+            "last_source": ENUM_VALUES[inventory.last_source],
             "displayed_name": inventory.displayed_name,
         }
         # Upsert (insert or update)
@@ -162,70 +142,37 @@ class InventoryService:
         return response.data[0] if response.data else {}
     
     def update_inventory(self, user_id: UUID, product_id: UUID, inventory: InventoryUpdate, log_change: bool = True) -> Optional[dict]:
-        """Update an inventory item and optionally log the change"""
-        # Get current state before updating (for logging)
-        old_item = None
-        if log_change and inventory.state is not None:
-            old_item = self.get_inventory_item(user_id, product_id)
-        
-        data = {}
-        if inventory.state is not None:
-            data["state"] = inventory.state.value
-        if inventory.estimated_qty is not None:
-            data["estimated_qty"] = inventory.estimated_qty
-        if inventory.qty_unit is not None:
-            data["qty_unit"] = inventory.qty_unit
-        if inventory.confidence is not None:
-            data["confidence"] = inventory.confidence
-        if inventory.last_source is not None:
-            data["last_source"] = inventory.last_source.value
-        if inventory.displayed_name is not None:
-            data["displayed_name"] = inventory.displayed_name
+        """
+        Update an inventory item and optionally log the change.
+        Runs as a single RPC (update_inventory_with_log) that updates the row and,
+        when the state changed, inserts the ADJUST log entry in the same transaction.
+        """
+        data = {
+            field: (transform(value) if transform else value)
+            for field, transform in _INVENTORY_UPDATE_FIELDS
+            if (value := getattr(inventory, field)) is not None
+        }
         
         if not data:
-            print(f"No data to update for user_id={user_id}, product_id={product_id}")
+            logger.info("[Inventory] No data to update for user_id=%s, product_id=%s", user_id, product_id)
             return None
         
-        # IMPORTANT: Actually update the inventory in the database
+        params = {f"p_{key}": value for key, value in data.items()}
+        params["p_user_id"] = str(user_id)
+        params["p_product_id"] = str(product_id)
+        params["p_log_change"] = log_change
+        
         try:
-            print(f"Updating inventory: user_id={user_id}, product_id={product_id}, data={data}")
-            response = self.supabase.table("inventory").update(data).eq("user_id", str(user_id)).eq("product_id", str(product_id)).execute()
-            print(f"Update response: {response.data}")
+            response = self.supabase.rpc("update_inventory_with_log", params).execute()
             updated_item = response.data[0] if response.data else None
             
             if not updated_item:
-                print(f"WARNING: Inventory update returned no data!")
+                logger.warning("[Inventory] Update returned no data for user_id=%s, product_id=%s", user_id, product_id)
                 return None
-        except Exception as e:
-            print(f"ERROR updating inventory: {e}")
+        except Exception:
+            logger.exception("[Inventory] Failed to update inventory for user_id=%s, product_id=%s", user_id, product_id)
             raise
         
-        # Log the state change if requested
-        if log_change and inventory.state is not None and old_item:
-            old_state = old_item.get("state")
-            new_state = inventory.state.value
-            
-            if old_state != new_state:
-                # Determine action based on state change
-                action = InventoryAction.ADJUST
-                
-                # Create log entry
-                log_data = {
-                    "user_id": str(user_id),
-                    "product_id": str(product_id),
-                    "action": action.value,
-                    "delta_state": new_state,
-                    "action_confidence": inventory.confidence if inventory.confidence else 1.0,
-                    "source": inventory.last_source.value if inventory.last_source else InventorySource.MANUAL.value,
-                    "note": f"State changed from {old_state} to {new_state} via UI",
-                }
-                try:
-                    self.supabase.table("inventory_log").insert(log_data).execute()
-                    print(f"Log entry created: {old_state} -> {new_state}")
-                except Exception as e:
-                    # Log error but don't fail the update
-                    print(f"Error logging inventory change: {e}")
-        
         return updated_item
     
     def delete_inventory(self, user_id: UUID, product_id: UUID) -> bool:
@@ -233,25 +180,42 @@ class InventoryService:
         response = self.supabase.table("inventory").delete().eq("user_id", str(user_id)).eq("product_id", str(product_id)).execute()
         return len(response.data) > 0
     
-    def create_inventory_log(self, user_id: UUID, log: InventoryLogCreate) -> dict:
-        """Create an inventory log entry"""
-        data = {
-            "user_id": str(user_id),
+    @staticmethod
+    def _inventory_log_row(uid: str, log: InventoryLogCreate) -> dict:
+        """Build the inventory_log insert payload for a log entry (uid is the stringified user_id)"""
+        return {
+            "user_id": uid,
             "product_id": str(log.product_id),
-            "action": log.action.value,
-            "delta_state": log.delta_state.value if log.delta_state else None,
+            "action": ENUM_VALUES[log.action],
+            "delta_state": ENUM_VALUES[log.delta_state] if log.delta_state else None,
             "action_confidence": log.action_confidence,
-            "source": log.source.value,
+            "source": ENUM_VALUES[log.source],
             "receipt_item_id": str(log.receipt_item_id) if log.receipt_item_id else None,
             "shopping_list_item_id": str(log.shopping_list_item_id) if log.shopping_list_item_id else None,
             "note": log.note,
         }
+    
+    def create_inventory_log(self, user_id: UUID, log: InventoryLogCreate) -> dict:
+        """Create an inventory log entry"""
+        data = self._inventory_log_row(str(user_id), log)
         response = self.supabase.table("inventory_log").insert(data).execute()
         return response.data[0] if response.data else {}
     
+    def create_inventory_logs_bulk(self, user_id: UUID, logs: List[InventoryLogCreate]) -> List[dict]:
+        """
+        Create several inventory log entries in one request (and one transaction).
+        Returns the created rows in the same order as `logs`.
+        """
+        if not logs:
+            return []
+        uid = str(user_id)
+        rows = [self._inventory_log_row(uid, log) for log in logs]
+        response = self.supabase.table("inventory_log").insert(rows).execute()
+        return response.data or []
+    
     def get_inventory_logs(self, user_id: UUID, product_id: Optional[UUID] = None, limit: int = 100) -> List[dict]:
         """Get inventory logs for a user, optionally filtered by product"""
-        query = self.supabase.table("inventory_log").select("*").eq("user_id", str(user_id))
+        query = self.supabase.table("inventory_log").select(INVENTORY_LOG_COLUMNS).eq("user_id", str(user_id))
         if product_id:
             query = query.eq("product_id", str(product_id))
         response = query.order("occurred_at", desc=True).limit(limit).execute()
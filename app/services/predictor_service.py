@@ -1,12 +1,22 @@
 """
 Predictor service using Supabase API - adapts the EMA cycle predictor model
 """
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timezone
+from typing import List, Mapping, Optional, Dict, Any, Tuple
+from types import MappingProxyType
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+import threading
+import time
+import httpx
+from postgrest.exceptions import APIError
 from supabase import Client
 from app.schemas.inventory import InventoryLogCreate
 from app.models.enums import InventoryState, InventorySource, InventoryAction
 
+logger = logging.getLogger(__name__)
+
 # Import predictor modules (we'll adapt them to work with Supabase)
 import sys
 import os
@@ -17,40 +27,171 @@ try:
         PredictorConfig, CycleEmaState, Forecast,
         init_state_from_category, apply_purchase, apply_feedback,
         predict, predict_after_purchase, stamp_last_prediction, map_inventory_log_row_to_event,
-        derive_state, compute_confidence,
+        derive_state, compute_confidence, compute_days_left, _days_between, _clamp, _parse_iso_datetime, ema_mad_update,
         InventoryState as PredInventoryState, InventorySource as PredInventorySource,
         InventoryAction as PredInventoryAction, FeedbackKind
     )
     PREDICTOR_AVAILABLE = True
 except ImportError:
     PREDICTOR_AVAILABLE = False
-    print("Warning: Predictor modules not available. Install required dependencies.")
+    logger.warning("Predictor modules not available. Install required dependencies.")
+
+
+# Process-local cache of (predictor_profile_id, PredictorConfig, raw config) per user.
+# Services are created per request, so the cache lives at module level.
+PROFILE_CACHE_TTL_SECONDS = 60
+# The nightly jobs visit every user; cap the cache so it doesn't keep one entry per user forever
+PROFILE_CACHE_MAX_ENTRIES = 1024
+_profile_cache: Dict[str, Tuple[float, str, Any, Dict[str, Any]]] = {}
+_profile_cache_lock = threading.Lock()
+
+
+# Shared pool for independent Supabase requests issued by one refresh (bulk reads
+# and per-table bulk writes). The client's HTTP session is thread-safe.
+_IO_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="predictor-io")
+
+
+def _run_concurrently(*calls):
+    """Run independent zero-arg callables on the IO pool and return their results in order"""
+    futures = [_IO_EXECUTOR.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+# Writes that fail with a transient error are retried with jittered exponential backoff.
+# Only idempotent writes go through the retry helper: upserts, and forecast inserts keyed
+# by FORECAST_IDEMPOTENCY_KEY (see migrations/add_forecast_idempotency.sql)
+WRITE_RETRY_ATTEMPTS = 3
+WRITE_RETRY_BASE_SECONDS = 0.1
+# Rate limiting / gateway statuses (reported as the code when the error body isn't
+# PostgREST JSON), serialization failures and deadlocks
+_TRANSIENT_ERROR_CODES = {"429", "502", "503", "504", "40001", "40P01"}
+FORECAST_IDEMPOTENCY_KEY = "user_id,product_id,generated_at"
+
+
+def _execute_with_retry(builder):
+    """Execute an idempotent write request, retrying transient failures"""
+    for attempt in range(WRITE_RETRY_ATTEMPTS):
+        try:
+            return builder.execute()
+        except (APIError, httpx.TransportError) as e:
+            transient = isinstance(e, httpx.TransportError) or str(e.code) in _TRANSIENT_ERROR_CODES
+            if not transient or attempt == WRITE_RETRY_ATTEMPTS - 1:
+                raise
+            delay = WRITE_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning("Transient Supabase error on write (%s), retrying in %.2fs", e, delay)
+            time.sleep(delay)
+
+
+# Users whose last habits query returned no active habit, with the monotonic time until
+# which that answer is reused. Most users have no habits, so this skips a query per refresh;
+# HabitService drops the entry whenever the user's habits change.
+NO_HABITS_CACHE_TTL_SECONDS = 30
+_no_habits_until: Dict[str, float] = {}
+_no_habits_lock = threading.Lock()
+
+
+def invalidate_habits(user_id: str) -> None:
+    """Forget that a user had no active habits (call after writing to habits)"""
+    with _no_habits_lock:
+        _no_habits_until.pop(str(user_id), None)
+
+
+# product_id -> category_id for the single-event paths. A product's category only changes
+# through ProductService.update_product, which drops the entry.
+PRODUCT_CATEGORY_CACHE_MAX_ENTRIES = 4096
+_product_category_cache: Dict[str, Optional[str]] = {}
+_product_category_cache_lock = threading.Lock()
+
+
+def invalidate_product_category(product_id: str) -> None:
+    """Drop the cached category_id of a product"""
+    with _product_category_cache_lock:
+        _product_category_cache.pop(str(product_id), None)
 
 
-def get_default_category_priors_by_name() -> Dict[str, Dict[str, float]]:
+def invalidate_predictor_profile(user_id: str) -> None:
+    """Drop the cached predictor profile/config for a user"""
+    with _profile_cache_lock:
+        _profile_cache.pop(str(user_id), None)
+
+
+# Default category priors (mean_days, mad_days) by category name, used for new users
+# before they have personalized data. Priors are based on typical consumption patterns:
+# - mean_days: Average days until product runs out
+# - mad_days: Mean Absolute Deviation (variability)
+# Read-only: callers get this shared mapping, not a copy
+_DEFAULT_NAME_PRIORS: Mapping[str, Dict[str, float]] = MappingProxyType({
+    "Dairy & Eggs": {"mean_days": 5.0, "mad_days": 2.0},  # נגמר מהר
+    "Bread & Bakery": {"mean_days": 4.0, "mad_days": 1.5},  # נגמר מהר מאוד
+    "Meat & Poultry": {"mean_days": 4.0, "mad_days": 2.0},  # נגמר מהר
+    "Fish & Seafood": {"mean_days": 3.0, "mad_days": 1.5},  # נגמר מהר מאוד
+    "Fruits": {"mean_days": 6.0, "mad_days": 2.5},  # בינוני
+    "Vegetables": {"mean_days": 5.0, "mad_days": 2.0},  # בינוני
+    "Grains & Pasta": {"mean_days": 35.0, "mad_days": 10.0},  # נשמר הרבה זמן
+    "Canned & Jarred": {"mean_days": 75.0, "mad_days": 15.0},  # נשמר הרבה זמן
+    "Condiments & Sauces": {"mean_days": 45.0, "mad_days": 15.0},  # נשמר זמן
+    "Snacks": {"mean_days": 10.0, "mad_days": 5.0},  # בינוני
+    "Beverages": {"mean_days": 7.0, "mad_days": 3.0},  # בינוני
+    "Frozen Foods": {"mean_days": 45.0, "mad_days": 15.0},  # נשמר זמן
+    "Spices & Seasonings": {"mean_days": 75.0, "mad_days": 20.0},  # נשמר הרבה זמן
+})
+# Same priors keyed by lowercased category name
+_NAME_PRIORS_LOWER: Dict[str, Dict[str, float]] = {
+    name.lower(): prior for name, prior in _DEFAULT_NAME_PRIORS.items()
+}
+DEFAULT_CATEGORY_PRIOR: Dict[str, float] = {"mean_days": 7.0, "mad_days": 2.0}
+
+
+def get_default_category_priors_by_name() -> Mapping[str, Dict[str, float]]:
+    """Returns the (read-only) default category priors by category name"""
+    return _DEFAULT_NAME_PRIORS
+
+
+# Column projections for the predictor's reads (avoid select("*") over the wire)
+PREDICTOR_STATE_COLUMNS = "params, confidence, updated_at, predictor_profile_id"
+# Logs that map to no purchase/feedback event skip the state and inventory writes; a fresh
+# forecast snapshot is only recorded if the stored state is older than this
+NOOP_LOG_FORECAST_MAX_AGE = timedelta(hours=1)
+# Max rows per bulk upsert/insert request
+BULK_WRITE_CHUNK_SIZE = 500
+INVENTORY_LOG_EVENT_COLUMNS = "log_id, user_id, product_id, action, delta_state, action_confidence, occurred_at, source, note"
+
+
+# category_id -> default prior, built from product_categories and refreshed hourly
+# so new categories are picked up without a restart
+CATEGORY_PRIORS_CACHE_TTL_SECONDS = 3600
+_category_priors_cache: Optional[Tuple[float, Dict[str, Dict[str, float]]]] = None
+_category_priors_cache_lock = threading.Lock()
+
+
+def invalidate_default_category_priors() -> None:
+    """Drop the cached category_id -> prior map (e.g. after editing categories)"""
+    global _category_priors_cache
+    with _category_priors_cache_lock:
+        _category_priors_cache = None
+
+
+def load_default_category_priors(supabase: Client) -> Dict[str, Dict[str, float]]:
     """
-    Returns default category priors (mean_days, mad_days) by category name.
-    These are used for new users before they have personalized data.
-    
-    Priors are based on typical consumption patterns:
-    - mean_days: Average days until product runs out
-    - mad_days: Mean Absolute Deviation (variability)
+    Map every category_id in product_categories to its default prior (matched by name).
+    The map is cached for CATEGORY_PRIORS_CACHE_TTL_SECONDS, so lookups by category_id
+    do no string matching and no DB reads. Errors are not cached.
     """
-    return {
-        "Dairy & Eggs": {"mean_days": 5.0, "mad_days": 2.0},  # נגמר מהר
-        "Bread & Bakery": {"mean_days": 4.0, "mad_days": 1.5},  # נגמר מהר מאוד
-        "Meat & Poultry": {"mean_days": 4.0, "mad_days": 2.0},  # נגמר מהר
-        "Fish & Seafood": {"mean_days": 3.0, "mad_days": 1.5},  # נגמר מהר מאוד
-        "Fruits": {"mean_days": 6.0, "mad_days": 2.5},  # בינוני
-        "Vegetables": {"mean_days": 5.0, "mad_days": 2.0},  # בינוני
-        "Grains & Pasta": {"mean_days": 35.0, "mad_days": 10.0},  # נשמר הרבה זמן
-        "Canned & Jarred": {"mean_days": 75.0, "mad_days": 15.0},  # נשמר הרבה זמן
-        "Condiments & Sauces": {"mean_days": 45.0, "mad_days": 15.0},  # נשמר זמן
-        "Snacks": {"mean_days": 10.0, "mad_days": 5.0},  # בינוני
-        "Beverages": {"mean_days": 7.0, "mad_days": 3.0},  # בינוני
-        "Frozen Foods": {"mean_days": 45.0, "mad_days": 15.0},  # נשמר זמן
-        "Spices & Seasonings": {"mean_days": 75.0, "mad_days": 20.0},  # נשמר הרבה זמן
+    global _category_priors_cache
+    now = time.monotonic()
+    with _category_priors_cache_lock:
+        cached = _category_priors_cache
+    if cached is not None and now - cached[0] < CATEGORY_PRIORS_CACHE_TTL_SECONDS:
+        return cached[1]
+    
+    categories_result = supabase.table("product_categories").select("category_id, category_name").execute()
+    category_priors = {
+        str(cat.get("category_id", "")): _NAME_PRIORS_LOWER.get((cat.get("category_name") or "").lower(), DEFAULT_CATEGORY_PRIOR)
+        for cat in categories_result.data or []
     }
+    with _category_priors_cache_lock:
+        _category_priors_cache = (now, category_priors)
+    return category_priors
 
 
 class SupabasePantryRepository:
@@ -65,44 +206,18 @@ class SupabasePantryRepository:
     def _get_default_category_priors(self) -> Dict[str, Dict[str, float]]:
         """
         Get default category priors mapped by category_id.
-        Loads all categories from DB and maps them to default priors by name.
+        Categories are loaded from the DB once per process (see load_default_category_priors).
         """
         try:
-            # Get all categories from database
-            categories_result = self.supabase.table("product_categories").select("category_id, category_name").execute()
-            categories = categories_result.data if categories_result.data else []
-            
-            # Get default priors by name
-            name_priors = get_default_category_priors_by_name()
-            
-            # Map category_id to priors
-            category_priors = {}
-            for cat in categories:
-                category_name = cat.get("category_name", "")
-                category_id = str(cat.get("category_id", ""))
-                
-                # Find matching prior by category name (case-insensitive)
-                prior = None
-                for name, prior_data in name_priors.items():
-                    if name.lower() == category_name.lower():
-                        prior = prior_data
-                        break
-                
-                # If no match found, use default
-                if prior is None:
-                    prior = {"mean_days": 7.0, "mad_days": 2.0}
-                
-                category_priors[category_id] = prior
-            
-            return category_priors
+            return {cid: dict(prior) for cid, prior in load_default_category_priors(self.supabase).items()}
         except Exception as e:
-            print(f"Warning: Could not load category priors: {e}")
+            logger.warning("Could not load category priors: %s", e)
             # Return empty dict - will use default in init_state_from_category
             return {}
     
     def get_active_predictor_profile(self, user_id: str) -> Dict[str, Any]:
         """Get active predictor profile for user"""
-        result = self.supabase.table("predictor_profiles").select("*").eq("user_id", user_id).eq("is_active", True).limit(1).execute()
+        result = self.supabase.table("predictor_profiles").select("predictor_profile_id, config").eq("user_id", user_id).eq("is_active", True).limit(1).execute()
         if not result.data:
             # Create default profile with category priors for all existing categories
             category_priors = self._get_default_category_priors()
@@ -129,6 +244,20 @@ class SupabasePantryRepository:
             }).execute()
         return result.data[0]
     
+    def get_product_category(self, product_id: str) -> Optional[str]:
+        """Get a product's category_id (memoized per process)"""
+        key = str(product_id)
+        with _product_category_cache_lock:
+            if key in _product_category_cache:
+                return _product_category_cache[key]
+        result = self.supabase.table("products").select("category_id").eq("product_id", key).limit(1).execute()
+        category_id = result.data[0].get("category_id") if result.data else None
+        with _product_category_cache_lock:
+            _product_category_cache[key] = category_id
+            if len(_product_category_cache) > PRODUCT_CATEGORY_CACHE_MAX_ENTRIES:
+                del _product_category_cache[next(iter(_product_category_cache))]
+        return category_id
+    
     def get_user_inventory_products(self, user_id: str) -> List[tuple]:
         """Get (product_id, category_id) for all products in user's inventory"""
         result = self.supabase.table("inventory").select("product_id, products(category_id)").eq("user_id", user_id).execute()
@@ -139,14 +268,72 @@ class SupabasePantryRepository:
             products.append((product_id, category_id))
         return products
     
+    def get_user_inventory_index(self, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """Get {product_id: {"category_id", "state", "estimated_qty"}} for all products in user's inventory"""
+        result = self.supabase.table("inventory").select("product_id, state, estimated_qty, products(category_id)").eq("user_id", user_id).execute()
+        index = {}
+        for item in result.data:
+            product = item.get("products")
+            index[item["product_id"]] = {
+                "category_id": product.get("category_id") if isinstance(product, dict) else None,
+                "state": item.get("state"),
+                "estimated_qty": item.get("estimated_qty"),
+            }
+        return index
+    
     def get_predictor_state(self, user_id: str, product_id: str) -> Optional[tuple]:
         """Get predictor state: (params_json, confidence, updated_at, predictor_profile_id)"""
-        result = self.supabase.table("product_predictor_state").select("*").eq("user_id", user_id).eq("product_id", product_id).execute()
+        result = self.supabase.table("product_predictor_state").select(PREDICTOR_STATE_COLUMNS).eq("user_id", user_id).eq("product_id", product_id).execute()
         if not result.data:
             return None
         row = result.data[0]
         return (row.get("params") or {}, float(row.get("confidence", 0.0)), row.get("updated_at"), row.get("predictor_profile_id"))
     
+    def get_predictor_states_bulk(self, user_id: str, product_ids: List[str]) -> Dict[str, tuple]:
+        """Get predictor states for many products in one query, keyed by product_id"""
+        if not product_ids:
+            return {}
+        result = self.supabase.table("product_predictor_state").select(f"product_id, {PREDICTOR_STATE_COLUMNS}").eq("user_id", user_id).in_("product_id", [str(pid) for pid in product_ids]).execute()
+        return {
+            str(row["product_id"]): (row.get("params") or {}, float(row.get("confidence", 0.0)), row.get("updated_at"), row.get("predictor_profile_id"))
+            for row in (result.data or [])
+        }
+    
+    def get_user_forecast_context(self, user_id: str) -> Tuple[List[tuple], Dict[str, tuple]]:
+        """
+        Get the user's inventory products and their predictor states in one RPC
+        (see migrations/add_get_user_forecast_context.sql).
+        Returns ([(product_id, category_id)], {product_id: state row}) in the formats of
+        get_user_inventory_products and get_predictor_states_bulk.
+        """
+        result = self.supabase.rpc("get_user_forecast_context", {"p_user_id": user_id}).execute()
+        items: List[tuple] = []
+        state_rows: Dict[str, tuple] = {}
+        for row in result.data or []:
+            product_id = row["product_id"]
+            items.append((product_id, row.get("category_id")))
+            if row.get("params") is not None:
+                state_rows[str(product_id)] = (row["params"], float(row.get("confidence") or 0.0), row.get("updated_at"), row.get("predictor_profile_id"))
+        return items, state_rows
+    
+    def get_active_habits(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get effects dicts of the user's active habits"""
+        key = str(user_id)
+        with _no_habits_lock:
+            no_habits_until = _no_habits_until.get(key, 0.0)
+        if time.monotonic() < no_habits_until:
+            return []
+        try:
+            result = self.supabase.table("habits").select("effects").eq("user_id", user_id).eq("status", "ACTIVE").execute()
+        except Exception as e:
+            logger.warning("Could not fetch habits for multiplier calculation: %s", e)
+            return []
+        if not result.data:
+            with _no_habits_lock:
+                _no_habits_until[key] = time.monotonic() + NO_HABITS_CACHE_TTL_SECONDS
+            return []
+        return [row.get("effects") for row in result.data if isinstance(row.get("effects"), dict)]
+    
     def upsert_predictor_state(
         self,
         user_id: str,
@@ -157,7 +344,20 @@ class SupabasePantryRepository:
         updated_at: datetime,
     ) -> None:
         """Upsert predictor state"""
-        data = {
+        data = self.predictor_state_row(user_id, product_id, predictor_profile_id, params, confidence, updated_at)
+        _execute_with_retry(self.supabase.table("product_predictor_state").upsert(data, on_conflict="user_id,product_id"))
+    
+    @staticmethod
+    def predictor_state_row(
+        user_id: str,
+        product_id: str,
+        predictor_profile_id: str,
+        params: Dict[str, Any],
+        confidence: float,
+        updated_at: datetime,
+    ) -> Dict[str, Any]:
+        """Build a product_predictor_state row"""
+        return {
             "user_id": user_id,
             "product_id": product_id,
             "predictor_profile_id": predictor_profile_id,
@@ -165,7 +365,18 @@ class SupabasePantryRepository:
             "confidence": confidence,
             "updated_at": updated_at.isoformat(),
         }
-        self.supabase.table("product_predictor_state").upsert(data, on_conflict="user_id,product_id").execute()
+    
+    def upsert_predictor_states_bulk(self, rows: List[Dict[str, Any]]) -> None:
+        """Upsert many predictor state rows in one request"""
+        for start in range(0, len(rows), BULK_WRITE_CHUNK_SIZE):
+            _execute_with_retry(self.supabase.table("product_predictor_state").upsert(rows[start:start + BULK_WRITE_CHUNK_SIZE], on_conflict="user_id,product_id"))
+    
+    def insert_missing_predictor_states(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert predictor state rows, leaving any state that already exists untouched"""
+        for start in range(0, len(rows), BULK_WRITE_CHUNK_SIZE):
+            _execute_with_retry(self.supabase.table("product_predictor_state").upsert(
+                rows[start:start + BULK_WRITE_CHUNK_SIZE], on_conflict="user_id,product_id", ignore_duplicates=True
+            ))
     
     def upsert_inventory_days_estimate(
         self,
@@ -177,12 +388,27 @@ class SupabasePantryRepository:
         source: InventorySource = InventorySource.SYSTEM,
         displayed_name: Optional[str] = None,
     ) -> None:
-        """Update inventory with days estimate"""
-        # Check if inventory row exists first
-        existing = self.supabase.table("inventory").select("*").eq("user_id", user_id).eq("product_id", product_id).execute()
-        if not existing.data:
-            print(f"[WARNING upsert_inventory_days_estimate] Inventory row doesn't exist for user_id={user_id}, product_id={product_id}. Creating it...")
-        
+        """Update inventory with days estimate (ON CONFLICT covers a missing row)"""
+        data = self.inventory_days_estimate_row(user_id, product_id, days_left, state, confidence, source, displayed_name)
+        try:
+            result = _execute_with_retry(self.supabase.table("inventory").upsert(data, on_conflict="user_id,product_id"))
+        except Exception:
+            logger.exception("Failed to upsert inventory estimate for user_id=%s, product_id=%s", user_id, product_id)
+            raise
+        if not result.data:
+            logger.warning("Inventory estimate upsert returned no data for user_id=%s, product_id=%s", user_id, product_id)
+    
+    @staticmethod
+    def inventory_days_estimate_row(
+        user_id: str,
+        product_id: str,
+        days_left: float,
+        state: InventoryState,
+        confidence: float,
+        source: InventorySource = InventorySource.SYSTEM,
+        displayed_name: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Build an inventory row carrying a days estimate"""
         data = {
             "user_id": user_id,
             "product_id": product_id,
@@ -194,20 +420,12 @@ class SupabasePantryRepository:
         }
         if displayed_name:
             data["displayed_name"] = displayed_name
-        print(f"[DEBUG upsert_inventory_days_estimate] Upserting inventory: user_id={user_id}, product_id={product_id}, data={data}")
-        try:
-            result = self.supabase.table("inventory").upsert(data, on_conflict="user_id,product_id").execute()
-            print(f"[DEBUG upsert_inventory_days_estimate] Upsert result: {result.data if result.data else 'No data returned'}")
-            if result.data:
-                updated_row = result.data[0]
-                print(f"[DEBUG upsert_inventory_days_estimate] Updated row - estimated_qty={updated_row.get('estimated_qty')}, state={updated_row.get('state')}")
-            else:
-                print(f"[WARNING upsert_inventory_days_estimate] Upsert returned no data! This might indicate the row doesn't exist.")
-        except Exception as e:
-            print(f"[ERROR upsert_inventory_days_estimate] Failed to upsert inventory: {e}")
-            import traceback
-            traceback.print_exc()
-            raise
+        return data
+    
+    def upsert_inventory_days_estimates_bulk(self, rows: List[Dict[str, Any]]) -> None:
+        """Upsert many inventory days estimates in one request"""
+        for start in range(0, len(rows), BULK_WRITE_CHUNK_SIZE):
+            _execute_with_retry(self.supabase.table("inventory").upsert(rows[start:start + BULK_WRITE_CHUNK_SIZE], on_conflict="user_id,product_id"))
     
     def insert_forecast(
         self,
@@ -217,7 +435,18 @@ class SupabasePantryRepository:
         trigger_log_id: Optional[str],
     ) -> None:
         """Insert forecast snapshot"""
-        data = {
+        data = self.forecast_row(user_id, product_id, forecast, trigger_log_id)
+        _execute_with_retry(self.supabase.table("inventory_forecasts").upsert(data, on_conflict=FORECAST_IDEMPOTENCY_KEY, ignore_duplicates=True))
+    
+    @staticmethod
+    def forecast_row(
+        user_id: str,
+        product_id: str,
+        forecast: 'Forecast',
+        trigger_log_id: Optional[str],
+    ) -> Dict[str, Any]:
+        """Build an inventory_forecasts row"""
+        return {
             "user_id": user_id,
             "product_id": product_id,
             "generated_at": forecast.generated_at.isoformat(),
@@ -226,14 +455,132 @@ class SupabasePantryRepository:
             "confidence": forecast.confidence,
             "trigger_log_id": trigger_log_id,
         }
-        self.supabase.table("inventory_forecasts").insert(data).execute()
+    
+    def insert_forecasts_bulk(self, rows: List[Dict[str, Any]]) -> None:
+        """Insert many forecast snapshots in one request"""
+        for start in range(0, len(rows), BULK_WRITE_CHUNK_SIZE):
+            _execute_with_retry(self.supabase.table("inventory_forecasts").upsert(
+                rows[start:start + BULK_WRITE_CHUNK_SIZE], on_conflict=FORECAST_IDEMPOTENCY_KEY, ignore_duplicates=True
+            ))
+    
+    def update_forecast_bundle(
+        self,
+        user_id: str,
+        product_id: str,
+        predictor_profile_id: str,
+        params: Dict[str, Any],
+        forecast: 'Forecast',
+        trigger_log_id: Optional[str],
+        source: InventorySource = InventorySource.SYSTEM,
+    ) -> None:
+        """
+        Upsert predictor state, upsert the inventory days estimate and insert the forecast
+        snapshot in one transaction (see migrations/add_update_forecast_bundle.sql)
+        """
+        _execute_with_retry(self.supabase.rpc("update_forecast_bundle", {
+            "p_user_id": user_id,
+            "p_product_id": product_id,
+            "p_predictor_profile_id": predictor_profile_id,
+            "p_params": params,
+            "p_confidence": forecast.confidence,
+            "p_days_left": forecast.expected_days_left,
+            "p_state": forecast.predicted_state.value,
+            "p_generated_at": forecast.generated_at.isoformat(),
+            "p_source": source.value,
+            "p_trigger_log_id": trigger_log_id,
+        }))
+    
+    def daily_decrement(self, user_id: str, predictor_profile_id: str, cfg: 'PredictorConfig') -> Dict[str, Any]:
+        """
+        Decrement days left server-side for every non-empty product that has a days estimate
+        and a predictor state (see migrations/add_daily_decrement.sql).
+        Returns {product_id: (new_days, new_state)} for the rows that were updated.
+        """
+        result = self.supabase.rpc("daily_decrement", {
+            "p_user_id": user_id,
+            "p_predictor_profile_id": predictor_profile_id,
+            "p_cfg": {"full_ratio": cfg.full_ratio, "medium_ratio": cfg.medium_ratio},
+        }).execute()
+        return {row["product_id"]: (row["new_days"], row["new_state"]) for row in (result.data or [])}
+    
+    def update_state_and_estimate(
+        self,
+        user_id: str,
+        product_id: str,
+        predictor_profile_id: str,
+        params: Dict[str, Any],
+        confidence: float,
+        days_left: float,
+        state: InventoryState,
+        updated_at: datetime,
+        source: InventorySource = InventorySource.SYSTEM,
+    ) -> None:
+        """
+        Upsert predictor state and the inventory days estimate in one transaction, without a
+        forecast snapshot (see migrations/add_update_state_and_estimate.sql)
+        """
+        _execute_with_retry(self.supabase.rpc("update_state_and_estimate", {
+            "p_user_id": user_id,
+            "p_product_id": product_id,
+            "p_predictor_profile_id": predictor_profile_id,
+            "p_params": params,
+            "p_confidence": confidence,
+            "p_days_left": days_left,
+            "p_state": state.value,
+            "p_updated_at": updated_at.isoformat(),
+            "p_source": source.value,
+        }))
+    
+    @staticmethod
+    def forecast_bundle_row(
+        user_id: str,
+        product_id: str,
+        predictor_profile_id: str,
+        params: Dict[str, Any],
+        forecast: 'Forecast',
+        trigger_log_id: Optional[str] = None,
+        source: InventorySource = InventorySource.SYSTEM,
+    ) -> Dict[str, Any]:
+        """Build one element of the update_forecast_bundles payload"""
+        return {
+            "user_id": user_id,
+            "product_id": product_id,
+            "predictor_profile_id": predictor_profile_id,
+            "params": params,
+            "confidence": forecast.confidence,
+            "days_left": forecast.expected_days_left,
+            "state": forecast.predicted_state.value,
+            "generated_at": forecast.generated_at.isoformat(),
+            "source": source.value,
+            "qty_unit": "days",
+            "trigger_log_id": trigger_log_id,
+        }
+    
+    def update_forecast_bundles_bulk(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Write many forecast bundles (state, inventory estimate, forecast snapshot) with one
+        RPC per chunk (see migrations/add_update_forecast_bundles.sql)
+        """
+        for start in range(0, len(rows), BULK_WRITE_CHUNK_SIZE):
+            _execute_with_retry(self.supabase.rpc("update_forecast_bundles", {"p_rows": rows[start:start + BULK_WRITE_CHUNK_SIZE]}))
     
     def get_inventory_log_row(self, log_id: str) -> Dict[str, Any]:
         """Get inventory log row"""
-        result = self.supabase.table("inventory_log").select("*").eq("log_id", log_id).execute()
+        result = self.supabase.table("inventory_log").select(INVENTORY_LOG_EVENT_COLUMNS).eq("log_id", log_id).execute()
         if not result.data:
             raise RuntimeError(f"inventory_log row not found for log_id={log_id}")
-        row = result.data[0]
+        return self.inventory_log_event(result.data[0])
+    
+    def get_inventory_log_rows(self, log_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get many inventory log rows in one query, keyed by log_id"""
+        if not log_ids:
+            return {}
+        result = self.supabase.table("inventory_log").select(INVENTORY_LOG_EVENT_COLUMNS).in_("log_id", [str(lid) for lid in log_ids]).execute()
+        return {str(row["log_id"]): self.inventory_log_event(row) for row in (result.data or [])}
+    
+    @staticmethod
+    def inventory_log_event(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Map a raw inventory_log row to the fields the predictor consumes"""
         return {
             "log_id": row["log_id"],
             "user_id": row["user_id"],
@@ -248,42 +595,77 @@ class SupabasePantryRepository:
     
     def get_active_habit_multiplier(self, user_id: str, product_id: str, category_id: Optional[str], now: datetime) -> float:
         """Get habit multiplier from active habits"""
+        return habit_multiplier(self.get_active_habits(user_id), product_id, category_id)
+
+
+def habit_multiplier(habit_effects: List[Dict[str, Any]], product_id: str, category_id: Optional[str]) -> float:
+    """
+    Combined multiplier of the given active-habit effects for one product.
+    Lets callers fetch habits once (get_active_habits) and reuse them for many products.
+    """
+    mult = 1.0
+    pid = str(product_id)
+    cid = str(category_id) if category_id else None
+    
+    for effects in habit_effects:
         try:
-            result = self.supabase.table("habits").select("effects").eq("user_id", user_id).eq("status", "ACTIVE").execute()
-        except Exception as e:
-            # If there's a network error or any other issue, return default multiplier
-            print(f"Warning: Could not fetch habits for multiplier calculation: {e}")
-            return 1.0
-        
-        mult = 1.0
-        pid = str(product_id)
-        cid = str(category_id) if category_id else None
-        
-        if not result.data:
-            return 1.0
-        
-        for row in result.data:
-            effects = row.get("effects") or {}
-            if not isinstance(effects, dict):
-                continue
+            gm = effects.get("global_multiplier")
+            if gm is not None:
+                mult *= float(gm)
             
-            try:
-                gm = effects.get("global_multiplier")
-                if gm is not None:
-                    mult *= float(gm)
-                
-                pm = effects.get("product_multipliers") or {}
-                if pid in pm:
-                    mult *= float(pm[pid])
-                
-                if cid:
-                    cm = effects.get("category_multipliers") or {}
-                    if cid in cm:
-                        mult *= float(cm[cid])
-            except Exception:
-                continue
-        
-        return float(max(mult, 1e-6))
+            pm = effects.get("product_multipliers") or {}
+            if pid in pm:
+                mult *= float(pm[pid])
+            
+            if cid:
+                cm = effects.get("category_multipliers") or {}
+                if cid in cm:
+                    mult *= float(cm[cid])
+        except Exception:
+            continue
+    
+    return float(max(mult, 1e-6))
+
+
+def combine_habit_effects(habit_effects: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Flatten several habits' effects into one effects dict whose multipliers are the
+    products of the individual ones, so per-product lookups cost O(1) instead of O(habits).
+    """
+    global_mult = 1.0
+    product_mults: Dict[str, float] = {}
+    category_mults: Dict[str, float] = {}
+    
+    for effects in habit_effects:
+        try:
+            gm = effects.get("global_multiplier")
+            if gm is not None:
+                global_mult *= float(gm)
+            for pid, value in (effects.get("product_multipliers") or {}).items():
+                key = pid if type(pid) is str else str(pid)
+                product_mults[key] = product_mults.get(key, 1.0) * float(value)
+            for cid, value in (effects.get("category_multipliers") or {}).items():
+                key = cid if type(cid) is str else str(cid)
+                category_mults[key] = category_mults.get(key, 1.0) * float(value)
+        except Exception:
+            continue
+    
+    return {
+        "global_multiplier": global_mult,
+        "product_multipliers": product_mults,
+        "category_multipliers": category_mults,
+    }
+
+
+# Forecasts whose days left, cycle mean and confidence all moved less than this
+# since the stored state are not rewritten by the refresh paths
+FORECAST_UNCHANGED_TOLERANCE = 1e-3
+
+# Weekly EMA updates are disabled: cycle_mean_days is learned on purchase events
+# (apply_purchase, when empty_at is set or the state was LOW)
+WEEKLY_MODEL_UPDATE_ENABLED = False
+# inventory_log actions that end a consumption cycle (used by the weekly update)
+CYCLE_END_ACTIONS = ["EMPTY", "PURCHASE", "REPURCHASE"]
 
 
 class PredictorService:
@@ -315,8 +697,9 @@ class PredictorService:
             Combined multiplier for this product (global × product × category)
         """
         mult = 1.0
-        pid = str(product_id)
-        cid = str(category_id) if category_id else None
+        # Ids are normally already strings (from PostgREST); only convert UUIDs
+        pid = product_id if type(product_id) is str else str(product_id)
+        cid = (category_id if type(category_id) is str else str(category_id)) if category_id else None
         
         # Global multiplier applies to all products
         gm = effects.get("global_multiplier")
@@ -324,41 +707,70 @@ class PredictorService:
             mult *= float(gm)
         
         # Product-specific multiplier
-        pm = effects.get("product_multipliers") or {}
-        if pid in pm:
-            mult *= float(pm[pid])
+        pm_value = (effects.get("product_multipliers") or {}).get(pid)
+        if pm_value is not None:
+            mult *= float(pm_value)
         
         # Category-specific multiplier
         if cid:
-            cm = effects.get("category_multipliers") or {}
-            if cid in cm:
-                mult *= float(cm[cid])
+            cm_value = (effects.get("category_multipliers") or {}).get(cid)
+            if cm_value is not None:
+                mult *= float(cm_value)
         
         return float(max(mult, 1e-6))
     
-    def _make_json_serializable(self, obj: Any) -> Any:
-        """Recursively convert UUID objects and other non-serializable types to strings"""
-        from uuid import UUID
-        
-        if isinstance(obj, UUID):
-            return str(obj)
-        elif isinstance(obj, dict):
-            return {key: self._make_json_serializable(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [self._make_json_serializable(item) for item in obj]
-        elif isinstance(obj, tuple):
-            return tuple(self._make_json_serializable(item) for item in obj)
-        elif isinstance(obj, (datetime,)):
-            return obj.isoformat()
-        else:
-            return obj
-    
     def _load_cfg_and_profile(self, user_id: str) -> tuple:
-        """Load config and profile"""
+        """Load config and profile (cached per user for a short TTL)"""
+        key = str(user_id)
+        now = time.monotonic()
+        with _profile_cache_lock:
+            cached = _profile_cache.get(key)
+        if cached is not None and now - cached[0] < PROFILE_CACHE_TTL_SECONDS:
+            return cached[1], cached[2]
+        
         prof = self.repo.get_active_predictor_profile(user_id)
-        cfg = PredictorConfig.from_profile_config_json(prof.get("config") or {})
+        config = prof.get("config") or {}
+        # An expired entry for the same, unchanged profile keeps its parsed config
+        if cached is not None and cached[1] == prof["predictor_profile_id"] and cached[3] == config:
+            cfg = cached[2]
+        else:
+            cfg = PredictorConfig.from_profile_config_json(config)
+        with _profile_cache_lock:
+            # Re-insert so dict order stays oldest-first, then evict the oldest entry when over the cap
+            _profile_cache.pop(key, None)
+            _profile_cache[key] = (now, prof["predictor_profile_id"], cfg, config)
+            if len(_profile_cache) > PROFILE_CACHE_MAX_ENTRIES:
+                del _profile_cache[next(iter(_profile_cache))]
         return prof["predictor_profile_id"], cfg
     
+    def invalidate_profile(self, user_id: str) -> None:
+        """Drop the cached profile/config for a user after changing their predictor profile"""
+        invalidate_predictor_profile(user_id)
+    
+    def prewarm_user(self, user_id: str) -> None:
+        """
+        Create the user's predictor profile and initial states ahead of their first event,
+        so that event doesn't pay for the default-profile insert and category priors read,
+        and later batches find a stored state for every inventory product.
+        Not required for correctness; existing states are never overwritten.
+        """
+        now = datetime.now(timezone.utc)
+        predictor_profile_id, cfg = self._load_cfg_and_profile(user_id)
+        
+        items = self.repo.get_user_inventory_products(user_id)
+        if not items:
+            return
+        existing = self.repo.get_predictor_states_bulk(user_id, [product_id for product_id, _ in items])
+        rows = []
+        for product_id, category_id in items:
+            if str(product_id) in existing:
+                continue
+            state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now, existing)
+            rows.append(self.repo.predictor_state_row(
+                user_id, product_id, predictor_profile_id, state.to_params_json(), compute_confidence(state, now, cfg), now
+            ))
+        self.repo.insert_missing_predictor_states(rows)
+    
     def _load_or_init_state(
         self,
         user_id: str,
@@ -367,9 +779,16 @@ class PredictorService:
         cfg: PredictorConfig,
         category_id: Optional[str],
         now: datetime,
+        state_rows: Optional[Dict[str, tuple]] = None,
     ) -> CycleEmaState:
-        """Load or initialize predictor state"""
-        row = self.repo.get_predictor_state(user_id, product_id)
+        """
+        Load or initialize predictor state.
+        If state_rows (from get_predictor_states_bulk) is given, the row is taken from it instead of the DB.
+        """
+        if state_rows is not None:
+            row = state_rows.get(str(product_id))
+        else:
+            row = self.repo.get_predictor_state(user_id, product_id)
         if row is None:
             st = init_state_from_category(category_id, cfg, now=now)
             st.category_id = str(category_id) if category_id else None
@@ -388,45 +807,95 @@ class PredictorService:
             st.category_id = str(category_id)
         return st
     
-    def process_inventory_log(self, log_id: str, state_before_purchase: Optional[InventoryState] = None) -> None:
+    def _user_habits(self, user_id: str, habits_by_user: Optional[Dict[str, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Active habit effects for a user, taken from (and stored in) habits_by_user when given"""
+        if habits_by_user is None:
+            return self.repo.get_active_habits(user_id)
+        if user_id not in habits_by_user:
+            habits_by_user[user_id] = self.repo.get_active_habits(user_id)
+        return habits_by_user[user_id]
+    
+    def process_inventory_log(
+        self,
+        log_id: str,
+        state_before_purchase: Optional[InventoryState] = None,
+        log_row: Optional[Dict[str, Any]] = None,
+        inventory_index: Optional[Dict[str, Dict[str, Any]]] = None,
+        habits_by_user: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        state_rows: Optional[Dict[str, Optional[tuple]]] = None,
+    ) -> None:
         """
         Process inventory log event and update predictions
         
         Args:
             log_id: Inventory log ID to process
             state_before_purchase: Optional state before purchase (for cases where inventory was already updated)
+            log_row: Optional inventory_log row the caller already has (e.g. returned by the insert),
+                     which saves re-reading it from the DB
+            inventory_index: Optional result of get_user_inventory_index for the log's user,
+                             shared when processing several logs together; the product's entry
+                             is updated after the write
+            habits_by_user: Optional {user_id: active habit effects} shared across several logs;
+                            filled on first need so habits are fetched at most once per user
+            state_rows: Optional prefetched {product_id: state row or None}; the product's entry is
+                        consumed, so a later log for the same product re-reads the updated state
         """
-        row = self.repo.get_inventory_log_row(log_id)
+        if log_row is not None:
+            row = self.repo.inventory_log_event(log_row)
+        else:
+            row = self.repo.get_inventory_log_row(log_id)
         user_id = row["user_id"]
         product_id = row["product_id"]
         now = datetime.now(timezone.utc)
         
         predictor_profile_id, cfg = self._load_cfg_and_profile(user_id)
         
-        products = dict(self.repo.get_user_inventory_products(user_id))
-        category_id = products.get(product_id)
+        prefetched = None
+        if state_rows is not None and product_id in state_rows:
+            prefetched = {product_id: state_rows.pop(product_id)}
         
-        state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now)
+        # Category and current state come from the same inventory read
+        if inventory_index is None and prefetched is None:
+            # The inventory and predictor state reads are independent, so overlap them
+            inventory_index, state_row = _run_concurrently(
+                lambda: self.repo.get_user_inventory_index(user_id),
+                lambda: self.repo.get_predictor_state(user_id, product_id),
+            )
+            prefetched = {product_id: state_row}
+        elif inventory_index is None:
+            inventory_index = self.repo.get_user_inventory_index(user_id)
+        if prefetched is None:
+            prefetched = {product_id: self.repo.get_predictor_state(user_id, product_id)}
+        inventory_item = inventory_index.get(product_id) or {}
+        category_id = inventory_item.get("category_id")
+        
+        state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now, prefetched)
         
         purchase_ev, feedback_ev = map_inventory_log_row_to_event(row)
         
+        state_row = prefetched[product_id]
+        if purchase_ev is None and feedback_ev is None and state_row is not None:
+            # Nothing to learn from this log and the state already exists: keep the stored
+            # state and inventory estimate, and only snapshot a forecast if the last one is stale
+            updated_at = state_row[2]
+            if updated_at and now - _parse_iso_datetime(updated_at) < NOOP_LOG_FORECAST_MAX_AGE:
+                return
+            mult = habit_multiplier(self._user_habits(user_id, habits_by_user), product_id, category_id)
+            self.repo.insert_forecast(user_id, product_id, predict(state, now, mult, cfg), row["log_id"])
+            return
+        
         # Get current inventory state before purchase (if purchase event)
-        # Use provided state_before_purchase if available, otherwise read from DB
+        # Use provided state_before_purchase if available, otherwise the state read above
         current_state = state_before_purchase
         if purchase_ev is not None and current_state is None:
-            try:
-                inventory_item = self.repo.supabase.table("inventory").select("state").eq(
-                    "user_id", user_id
-                ).eq("product_id", product_id).limit(1).execute()
-                if inventory_item.data and len(inventory_item.data) > 0:
-                    state_str = inventory_item.data[0].get("state")
-                    if state_str:
-                        current_state = InventoryState(state_str)
-            except Exception as e:
-                print(f"Warning: Could not get current inventory state: {e}")
+            state_str = inventory_item.get("state")
+            if state_str:
+                try:
+                    current_state = InventoryState(state_str)
+                except ValueError as e:
+                    logger.warning("Could not get current inventory state: %s", e)
         
         if purchase_ev is not None:
-            from ema_cycle_predictor import InventoryState as PredInventoryState
             pred_current_state = PredInventoryState(current_state.value) if current_state else None
             state = apply_purchase(state, purchase_ev, cfg, pred_current_state)
         
@@ -438,87 +907,165 @@ class PredictorService:
             fc = predict_after_purchase(state, now, cfg)
         else:
             # For non-purchase events (feedback, etc.), use regular predict with multiplier
-            mult = self.repo.get_active_habit_multiplier(user_id, product_id, category_id, now)
+            mult = habit_multiplier(self._user_habits(user_id, habits_by_user), product_id, category_id)
             fc = predict(state, now, mult, cfg)
         
         state = stamp_last_prediction(state, fc)
         
-        # Convert params to JSON-serializable format
+        # Params are JSON-serializable as returned by to_params_json
         params_json = state.to_params_json()
-        params_json = self._make_json_serializable(params_json)
         
-        self.repo.upsert_predictor_state(
+        # State, inventory estimate and forecast snapshot are written atomically in one RPC
+        self.repo.update_forecast_bundle(
             user_id=user_id,
             product_id=product_id,
             predictor_profile_id=predictor_profile_id,
             params=params_json,
-            confidence=fc.confidence,
-            updated_at=now,
+            forecast=fc,
+            trigger_log_id=row["log_id"],
         )
-        
-        self.repo.upsert_inventory_days_estimate(
-            user_id=user_id,
-            product_id=product_id,
-            days_left=fc.expected_days_left,
-            state=InventoryState(fc.predicted_state.value),
-            confidence=fc.confidence,
-            source=InventorySource.SYSTEM,
-        )
-        
-        self.repo.insert_forecast(user_id, product_id, fc, trigger_log_id=row["log_id"])
+        # Keep a shared index in step with the row just written, so a later log for the
+        # same product in the batch sees the post-bundle state
+        inventory_index[product_id] = {
+            **inventory_item,
+            "category_id": category_id,
+            "state": fc.predicted_state.value,
+            "estimated_qty": fc.expected_days_left,
+        }
     
-    def update_from_inventory_event(self, user_id: str, product_id: str) -> None:
-        """Update predictions for a specific product based on latest inventory log"""
+    def update_from_inventory_event(self, user_id: str, product_id: str, log_id: Optional[str] = None) -> None:
+        """
+        Update predictions for a specific product from an inventory log.
+        Pass log_id when the caller knows it; otherwise the product's latest log is looked up.
+        """
         try:
-            # Get the latest log entry for this product
-            result = self.repo.supabase.table("inventory_log").select("log_id").eq("user_id", str(user_id)).eq("product_id", str(product_id)).order("occurred_at", desc=True).limit(1).execute()
-            
-            if result.data and len(result.data) > 0:
+            if log_id is None:
+                # Get the latest log entry for this product
+                result = self.repo.supabase.table("inventory_log").select("log_id").eq("user_id", str(user_id)).eq("product_id", str(product_id)).order("occurred_at", desc=True).limit(1).execute()
+                if not result.data:
+                    return
                 log_id = result.data[0]["log_id"]
-                self.process_inventory_log(log_id)
+            self.process_inventory_log(str(log_id))
         except Exception as e:
-            print(f"Error updating predictor from inventory event: {e}")
+            logger.error("Error updating predictor from inventory event: %s", e)
+    
+    def update_from_inventory_events(self, events: List[Tuple[str, str, str]]) -> None:
+        """Update predictions for many (user_id, product_id, log_id) events in one batch"""
+        self.process_inventory_logs([log_id for _, _, log_id in events])
+    
+    def process_inventory_logs(
+        self,
+        log_ids: List[str],
+        states_before_purchase: Optional[Dict[str, InventoryState]] = None,
+    ) -> None:
+        """
+        Process a burst of inventory logs (e.g. a completed shopping list) in one task.
+        Log rows are read with one query and each user's inventory, predictor states
+        and habits once, instead of per log; the logs themselves are still applied one by one, in the given order,
+        so no event is dropped.
+        """
+        states_before_purchase = states_before_purchase or {}
+        rows = self.repo.get_inventory_log_rows(log_ids)
+        inventory_by_user: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        habits_by_user: Dict[str, List[Dict[str, Any]]] = {}
+        state_rows_by_user: Dict[str, Dict[str, Optional[tuple]]] = {}
+        products_by_user: Dict[str, set] = {}
+        for row in rows.values():
+            products_by_user.setdefault(row["user_id"], set()).add(row["product_id"])
+        for log_id in log_ids:
+            row = rows.get(str(log_id))
+            if row is None:
+                logger.error("Error processing inventory log %s: not found", log_id)
+                continue
+            try:
+                uid = row["user_id"]
+                if uid not in inventory_by_user:
+                    # Inventory and the states of every product in the batch, fetched together
+                    product_ids = list(products_by_user[uid])
+                    inventory_by_user[uid], fetched = _run_concurrently(
+                        lambda: self.repo.get_user_inventory_index(uid),
+                        lambda: self.repo.get_predictor_states_bulk(uid, product_ids),
+                    )
+                    # None marks "fetched, no state row yet" as opposed to "not prefetched"
+                    state_rows_by_user[uid] = {pid: fetched.get(pid) for pid in product_ids}
+                self.process_inventory_log(
+                    str(log_id),
+                    state_before_purchase=states_before_purchase.get(log_id),
+                    log_row=row,
+                    inventory_index=inventory_by_user[uid],
+                    habits_by_user=habits_by_user,
+                    state_rows=state_rows_by_user[uid],
+                )
+            except Exception as e:
+                logger.error("Error processing inventory log %s: %s", log_id, e)
     
     def refresh_user_inventory_forecasts(self, user_id: str) -> None:
         """Refresh predictions for all products in user's inventory"""
         now = datetime.now(timezone.utc)
         predictor_profile_id, cfg = self._load_cfg_and_profile(user_id)
         
-        items = self.repo.get_user_inventory_products(user_id)
+        # Products, categories and predictor states come from one RPC, fetched alongside
+        # the active habits, instead of per product
+        (items, state_rows), habit_effects = _run_concurrently(
+            lambda: self.repo.get_user_forecast_context(user_id),
+            lambda: self.repo.get_active_habits(user_id),
+        )
+        combined_effects = combine_habit_effects(habit_effects)
+        
+        writes: List[Dict[str, Any]] = []
         for product_id, category_id in items:
-            state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now)
+            state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now, state_rows)
+            mult = self._extract_multiplier_from_effects(combined_effects, product_id, category_id)
             
             # Use last_pred_days_left from state (already in memory, no DB read needed)
             # This represents the model's last prediction and should be synchronized with inventory.estimated_qty
             # in normal operation. Using it ensures we apply the multiplier to the correct base value.
-            base_days_left = state.last_pred_days_left if state.last_pred_days_left is not None else None
-            
-            mult = self.repo.get_active_habit_multiplier(user_id, product_id, category_id, now)
-            # Use predict() with base_days_left to ensure correct multiplier application
-            fc = predict(state, now, mult, cfg, inventory_days_left=base_days_left)
+            prev_days_left = state.last_pred_days_left
+            fc = predict(state, now, mult, cfg, inventory_days_left=prev_days_left)
+            if self._forecast_unchanged(state_rows.get(str(product_id)), prev_days_left, state.cycle_mean_days, state, fc):
+                continue
             state = stamp_last_prediction(state, fc)
             
-            # Convert params to JSON-serializable format
+            # Params are JSON-serializable as returned by to_params_json
             params_json = state.to_params_json()
-            params_json = self._make_json_serializable(params_json)
             
-            self.repo.upsert_predictor_state(
-                user_id=user_id,
-                product_id=product_id,
-                predictor_profile_id=predictor_profile_id,
-                params=params_json,
-                confidence=fc.confidence,
-                updated_at=now,
-            )
-            self.repo.upsert_inventory_days_estimate(
-                user_id=user_id,
-                product_id=product_id,
-                days_left=fc.expected_days_left,
-                state=InventoryState(fc.predicted_state.value),
-                confidence=fc.confidence,
-                source=InventorySource.SYSTEM,
-            )
-            self.repo.insert_forecast(user_id, product_id, fc, trigger_log_id=None)
+            self._queue_forecast_writes(writes, user_id, product_id, predictor_profile_id, params_json, fc, now)
+        
+        self._flush_forecast_writes(writes)
+    
+    @staticmethod
+    def _forecast_unchanged(
+        row: Optional[tuple],
+        prev_days_left: Optional[float],
+        prev_cycle_mean_days: float,
+        state: CycleEmaState,
+        fc: 'Forecast',
+    ) -> bool:
+        """True if fc matches the stored prediction (state row from get_predictor_states_bulk)"""
+        if row is None or prev_days_left is None:
+            return False
+        return (
+            abs(fc.expected_days_left - prev_days_left) < FORECAST_UNCHANGED_TOLERANCE
+            and abs(state.cycle_mean_days - prev_cycle_mean_days) < FORECAST_UNCHANGED_TOLERANCE
+            and abs(fc.confidence - row[1]) < FORECAST_UNCHANGED_TOLERANCE
+        )
+    
+    def _queue_forecast_writes(
+        self,
+        writes: List[Dict[str, Any]],
+        user_id: str,
+        product_id: str,
+        predictor_profile_id: str,
+        params_json: Dict[str, Any],
+        fc: 'Forecast',
+        now: datetime,
+    ) -> None:
+        """Accumulate the state, inventory and forecast writes for one product"""
+        writes.append(self.repo.forecast_bundle_row(user_id, product_id, predictor_profile_id, params_json, fc))
+    
+    def _flush_forecast_writes(self, writes: List[Dict[str, Any]]) -> None:
+        """Write all accumulated bundles in a single RPC (one transaction for all three tables)"""
+        self.repo.update_forecast_bundles_bulk(writes)
     
     def refresh_products_affected_by_habit(
         self, 
@@ -547,87 +1094,56 @@ class PredictorService:
         now = datetime.now(timezone.utc)
         predictor_profile_id, cfg = self._load_cfg_and_profile(user_id)
         
-        # Collect all affected product IDs
-        affected_product_ids = set()
-        
-        # Get products directly affected by product_multipliers
-        product_multipliers = habit_effects.get("product_multipliers", {})
-        if product_multipliers:
-            for product_id in product_multipliers.keys():
-                affected_product_ids.add(str(product_id))
-        
-        # Get products affected by category_multipliers or global_multiplier
-        category_multipliers = habit_effects.get("category_multipliers", {})
-        global_multiplier = habit_effects.get("global_multiplier")
-        if category_multipliers or global_multiplier is not None:
-            # Get all products in user's inventory
-            user_products = self.repo.get_user_inventory_products(user_id)
-            
-            # Find products in affected categories (or all products if global_multiplier)
-            affected_category_ids = set(category_multipliers.keys())
-            for product_id, category_id in user_products:
-                if global_multiplier is not None:
-                    # Global multiplier affects all products
-                    affected_product_ids.add(str(product_id))
-                elif category_id and str(category_id) in affected_category_ids:
-                    affected_product_ids.add(str(product_id))
-        
-        # Get user's inventory products once
+        # Get user's inventory products once; every affected product must be in it
         user_products = self.repo.get_user_inventory_products(user_id)
-        user_product_ids = {str(pid) for pid, _ in user_products}
+        product_to_category = {str(pid): cid for pid, cid in user_products}
         
-        # Refresh predictions for all affected products
+        # Collect affected products: all of them for a global multiplier, otherwise
+        # those named in product_multipliers or in a category from category_multipliers
+        product_multipliers = habit_effects.get("product_multipliers") or {}
+        category_multipliers = habit_effects.get("category_multipliers") or {}
+        if habit_effects.get("global_multiplier") is not None:
+            affected_product_ids = list(product_to_category)
+        else:
+            explicit_product_ids = {str(pid) for pid in product_multipliers}
+            affected_category_ids = {str(cid) for cid in category_multipliers}
+            affected_product_ids = [
+                pid for pid, cid in product_to_category.items()
+                if pid in explicit_product_ids or (cid and str(cid) in affected_category_ids)
+            ]
+        state_rows = self.repo.get_predictor_states_bulk(user_id, affected_product_ids)
+        min_cycle_days, max_cycle_days = cfg.min_cycle_days, cfg.max_cycle_days
+        
+        # Refresh predictions for all affected products, writing all rows at the end
+        writes: List[Dict[str, Any]] = []
         for product_id in affected_product_ids:
             try:
-                # Only refresh if product is in user's inventory
-                if product_id not in user_product_ids:
-                    continue
+                category_id = product_to_category[product_id]
                 
-                # Get category_id for this product
-                category_id = None
-                for pid, cid in user_products:
-                    if str(pid) == product_id:
-                        category_id = cid
-                        break
-                
-                state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now)
+                state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now, state_rows)
+                prev_days_left, prev_cycle_mean_days = state.last_pred_days_left, state.cycle_mean_days
                 
                 # Extract multiplier from the habit being added/removed
                 habit_mult = self._extract_multiplier_from_effects(
                     habit_effects, product_id, category_id
                 )
                 
-                # Adjust cycle_mean_days and last_pred_days_left based on habit creation/deletion
-                if is_deletion:
-                    # Revert: multiply by the deleted habit's multiplier
-                    # This removes that habit's effect, leaving others intact
-                    state.cycle_mean_days = state.cycle_mean_days * habit_mult
-                    if state.last_pred_days_left is not None:
-                        new_days_left = state.last_pred_days_left * habit_mult
-                    else:
-                        # No previous prediction - calculate from adjusted cycle_mean_days
-                        new_days_left = None
-                else:
-                    # Apply: divide by the new habit's multiplier
-                    # This applies the new habit on top of existing ones
-                    state.cycle_mean_days = state.cycle_mean_days / habit_mult
-                    if state.last_pred_days_left is not None:
-                        new_days_left = state.last_pred_days_left / habit_mult
-                    else:
-                        # No previous prediction - calculate from adjusted cycle_mean_days
-                        new_days_left = None
+                # Adjust cycle_mean_days and last_pred_days_left based on habit creation/deletion:
+                # deletion reverts the habit (multiply by its multiplier, leaving others intact),
+                # creation applies it on top of existing ones (divide by its multiplier)
+                scale = habit_mult if is_deletion else 1.0 / habit_mult
+                state.cycle_mean_days = state.cycle_mean_days * scale
                 
                 # Clamp cycle_mean_days to valid range
-                state.cycle_mean_days = max(cfg.min_cycle_days, min(state.cycle_mean_days, cfg.max_cycle_days))
+                state.cycle_mean_days = _clamp(state.cycle_mean_days, min_cycle_days, max_cycle_days)
                 
                 # Create forecast with the new values
-                # If we have a new_days_left value, use it; otherwise calculate from cycle_mean_days
-                if new_days_left is not None:
-                    expected_days_left = float(new_days_left)
+                # If we have a previous prediction, scale it; otherwise calculate from cycle_mean_days
+                if state.last_pred_days_left is not None:
+                    expected_days_left = float(state.last_pred_days_left * scale)
                 else:
                     # Fallback: calculate from adjusted cycle_mean_days
                     if state.cycle_started_at is not None:
-                        from ema_cycle_predictor import _days_between
                         elapsed = _days_between(now, state.cycle_started_at)
                         expected_days_left = float(max(0.0, state.cycle_mean_days - elapsed))
                     else:
@@ -640,49 +1156,42 @@ class PredictorService:
                     confidence=float(compute_confidence(state, now, cfg)),
                     generated_at=now,
                 )
+                if self._forecast_unchanged(state_rows.get(product_id), prev_days_left, prev_cycle_mean_days, state, fc):
+                    continue
                 
                 state = stamp_last_prediction(state, fc)
                 
-                # Convert params to JSON-serializable format
+                # Params are JSON-serializable as returned by to_params_json
                 params_json = state.to_params_json()
-                params_json = self._make_json_serializable(params_json)
                 
-                self.repo.upsert_predictor_state(
-                    user_id=user_id,
-                    product_id=product_id,
-                    predictor_profile_id=predictor_profile_id,
-                    params=params_json,
-                    confidence=fc.confidence,
-                    updated_at=now,
-                )
-                self.repo.upsert_inventory_days_estimate(
-                    user_id=user_id,
-                    product_id=product_id,
-                    days_left=fc.expected_days_left,
-                    state=InventoryState(fc.predicted_state.value),
-                    confidence=fc.confidence,
-                    source=InventorySource.SYSTEM,
-                )
-                self.repo.insert_forecast(user_id, product_id, fc, trigger_log_id=None)
+                self._queue_forecast_writes(writes, user_id, product_id, predictor_profile_id, params_json, fc, now)
             except Exception as e:
-                import logging
                 action = "deletion" if is_deletion else "creation"
-                logging.error(f"Error refreshing prediction for product {product_id} after habit {action}: {e}", exc_info=True)
+                logger.error("Error refreshing prediction for product %s after habit %s: %s", product_id, action, e, exc_info=True)
                 continue
+        
+        self._flush_forecast_writes(writes)
     
     def weekly_model_update(self, user_id: str, product_id: str) -> None:
         """
         Weekly model update - DISABLED.
         Model updates now happen only on purchase events (when empty_at != null or state=LOW).
         """
-        # Model updates are now handled in apply_purchase, not in weekly updates
-        return
-        
+        # Model updates are now handled in apply_purchase, not in weekly updates.
+        # Disabled; see _weekly_model_update_impl
+        if not WEEKLY_MODEL_UPDATE_ENABLED:
+            return
+        self._weekly_model_update_impl(user_id, product_id)
+    
+    def _weekly_model_update_impl(self, user_id: str, product_id: str) -> None:
+        """
+        EMA update of cycle_mean_days from the last observed cycle (only runs when
+        WEEKLY_MODEL_UPDATE_ENABLED is set)
+        """
         now = datetime.now(timezone.utc)
         predictor_profile_id, cfg = self._load_cfg_and_profile(user_id)
         
-        products = dict(self.repo.get_user_inventory_products(user_id))
-        category_id = products.get(product_id)
+        category_id = self.repo.get_product_category(product_id)
         
         state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now)
         
@@ -692,7 +1201,6 @@ class PredictorService:
             return
         
         # Calculate days since purchase
-        from ema_cycle_predictor import _days_between
         days_since_purchase = _days_between(now, state.cycle_started_at)
         
         # Condition: only update if days_since_purchase >= cycle_mean_days
@@ -704,48 +1212,30 @@ class PredictorService:
         # Calculate observed cycle length: how many days the product actually lasted
         # This is the time from cycle_started_at to when the cycle ended (EMPTY or new PURCHASE)
         observed = None
-        cycle_end_time = None
         
-        # 1. Check for EMPTY events since cycle_started_at
-        empty_logs = self.repo.supabase.table("inventory_log").select("*").eq(
+        # One query for every cycle-ending event since cycle_started_at (oldest first).
+        # The cycle ended at the first EMPTY (product ran out) if there is one, otherwise at
+        # the first PURCHASE/REPURCHASE (new cycle started = previous cycle ended)
+        end_logs = self.repo.supabase.table("inventory_log").select("occurred_at, action").eq(
             "user_id", user_id
-        ).eq("product_id", product_id).eq("action", "EMPTY").gte(
+        ).eq("product_id", product_id).in_("action", CYCLE_END_ACTIONS).gte(
             "occurred_at", state.cycle_started_at.isoformat()
-        ).order("occurred_at", desc=False).limit(1).execute()
-        
-        if empty_logs.data:
-            # EMPTY event found - cycle ended when product ran out
-            cycle_end_time_str = empty_logs.data[0].get("occurred_at")
-            if cycle_end_time_str:
-                from datetime import datetime
-                cycle_end_time = datetime.fromisoformat(cycle_end_time_str.replace("Z", "+00:00"))
-                from ema_cycle_predictor import _days_between
-                observed = _days_between(cycle_end_time, state.cycle_started_at)
-        
-        # 2. If no EMPTY, check for PURCHASE events (new cycle started = previous cycle ended)
-        if observed is None:
-            purchase_logs = self.repo.supabase.table("inventory_log").select("*").eq(
-                "user_id", user_id
-            ).eq("product_id", product_id).in_("action", ["PURCHASE", "REPURCHASE"]).gte(
-                "occurred_at", state.cycle_started_at.isoformat()
-            ).order("occurred_at", desc=False).limit(1).execute()
-            
-            if purchase_logs.data:
-                # New cycle started - the previous cycle ended when this purchase happened
-                cycle_end_time_str = purchase_logs.data[0].get("occurred_at")
-                if cycle_end_time_str:
-                    from datetime import datetime
-                    cycle_end_time = datetime.fromisoformat(cycle_end_time_str.replace("Z", "+00:00"))
-                    from ema_cycle_predictor import _days_between
-                    observed = _days_between(cycle_end_time, state.cycle_started_at)
+        ).order("occurred_at", desc=False).execute()
+        
+        rows = end_logs.data or []
+        end_log = next((r for r in rows if r.get("action") == "EMPTY"), None) or next(
+            (r for r in rows if r.get("action") in ("PURCHASE", "REPURCHASE")), None
+        )
+        if end_log and end_log.get("occurred_at"):
+            cycle_end_time = _parse_iso_datetime(end_log["occurred_at"])
+            observed = _days_between(cycle_end_time, state.cycle_started_at)
         
         # 3. If still no observed, use current time (cycle is still ongoing, but we're updating weekly)
         if observed is None:
-            from ema_cycle_predictor import _days_between
             observed = _days_between(now, state.cycle_started_at)
         
         # Clamp observed to valid range
-        observed = max(cfg.min_cycle_days, min(observed, cfg.max_cycle_days))
+        observed = _clamp(observed, cfg.min_cycle_days, cfg.max_cycle_days)
         
         # Update cycle_mean_days based on observed cycle length (EMA update)
         old_mean = state.cycle_mean_days
@@ -758,17 +1248,13 @@ class PredictorService:
         else:
             a = cfg.alpha_strong
         
-        # EMA update for mean
-        new_mean = (1 - a) * old_mean + a * observed
-        new_mean = max(cfg.min_cycle_days, min(new_mean, cfg.max_cycle_days))
-        
-        # Update MAD
-        err = observed - old_mean
-        new_mad = (1 - a) * state.cycle_mad_days + a * abs(err)
-        new_mad = max(0.1, min(new_mad, cfg.max_cycle_days))
+        # EMA update for mean and MAD
+        new_mean, new_mad = ema_mad_update(
+            old_mean, state.cycle_mad_days, observed, a, cfg.min_cycle_days, cfg.max_cycle_days
+        )
         
-        state.cycle_mean_days = float(new_mean)
-        state.cycle_mad_days = float(new_mad)
+        state.cycle_mean_days = new_mean
+        state.cycle_mad_days = new_mad
         state.n_strong_updates += 1
         
         # Generate new forecast
@@ -778,7 +1264,6 @@ class PredictorService:
         
         # Save updated state
         params_json = state.to_params_json()
-        params_json = self._make_json_serializable(params_json)
         
         self.repo.upsert_predictor_state(
             user_id=user_id,
@@ -799,69 +1284,76 @@ class PredictorService:
             source=InventorySource.SYSTEM,
         )
         
-        print(f"Weekly update: Product {product_id} - observed cycle: {observed} days, updated cycle_mean_days: {old_mean} -> {new_mean}")
+        logger.debug(
+            "Weekly update: Product %s - observed cycle: %s days, updated cycle_mean_days: %s -> %s",
+            product_id, observed, old_mean, new_mean,
+        )
         return
     
-    def daily_state_update_all_products(self, user_id: str) -> None:
+    def daily_state_update_all_products(self, user_id: str) -> int:
         """
         Daily state update for all products of a user.
         Decreases days_left by 1 for each product and updates state accordingly.
         Also updates last_pred_days_left in product_predictor_state.
+        Returns the number of products updated.
         """
         if not PREDICTOR_AVAILABLE:
-            return
+            return 0
         
         now = datetime.now(timezone.utc)
         predictor_profile_id, cfg = self._load_cfg_and_profile(user_id)
         
-        products = self.repo.get_user_inventory_products(user_id)
-        updated_count = 0
+        # One read for every inventory row (category, state and days left) instead of one per product
+        inventory_index = self.repo.get_user_inventory_index(user_id)
+        # Rows with a days estimate and a predictor state are decremented in one server-side
+        # statement; the loop below only handles the rest (no estimate yet, or no state row)
+        decremented = self.repo.daily_decrement(user_id, predictor_profile_id, cfg)
+        # Rows are collected here and written with one bulk upsert per table after the loop
+        state_batch: List[Dict[str, Any]] = []
+        inventory_batch: List[Dict[str, Any]] = []
+        combined_effects: Optional[Dict[str, Any]] = None
+        # All predictor states for the remaining non-empty products, in one query
+        pending = {
+            pid: item for pid, item in inventory_index.items()
+            if item.get("state") != "EMPTY" and pid not in decremented
+        }
+        state_rows = self.repo.get_predictor_states_bulk(user_id, list(pending))
         
-        for product_id, category_id in products:
+        for product_id, current_item in pending.items():
             try:
-                # Load current state
-                state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now)
+                category_id = current_item["category_id"]
                 
-                # Get current inventory item
-                inventory_item = self.repo.supabase.table("inventory").select("*").eq(
-                    "user_id", user_id
-                ).eq("product_id", product_id).limit(1).execute()
-                
-                if not inventory_item.data:
-                    continue
-                
-                current_item = inventory_item.data[0]
-                current_state_str = current_item.get("state")
+                # Load current state
+                state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now, state_rows)
                 
-                # Skip products that are already EMPTY
-                if current_state_str == "EMPTY":
+                # Already ran out and already updated today: another pass would rewrite the same values
+                if state.empty_at is not None and state.last_pred_days_left == 0 and state.last_update_at.date() == now.date():
                     continue
                 
                 current_days_left = current_item.get("estimated_qty")
-                
-                if current_days_left is None:
-                    # If no days_left, calculate from cycle_mean_days
-                    mult = self.repo.get_active_habit_multiplier(user_id, product_id, category_id, now)
-                    from ema_cycle_predictor import compute_days_left
-                    current_days_left = compute_days_left(state, now, mult, cfg, inventory_days_left=None)
-                else:
+                if current_days_left is not None:
                     try:
                         current_days_left = float(current_days_left)
                     except (ValueError, TypeError):
-                        # If invalid, calculate from cycle_mean_days
-                        mult = self.repo.get_active_habit_multiplier(user_id, product_id, category_id, now)
-                        from ema_cycle_predictor import compute_days_left
-                        current_days_left = compute_days_left(state, now, mult, cfg, inventory_days_left=None)
+                        current_days_left = None
+                
+                if current_days_left is None:
+                    # If no (valid) days_left, calculate from cycle_mean_days.
+                    # Habits are fetched at most once per user, on first need.
+                    if combined_effects is None:
+                        combined_effects = combine_habit_effects(self.repo.get_active_habits(user_id))
+                    mult = self._extract_multiplier_from_effects(combined_effects, product_id, category_id)
+                    current_days_left = compute_days_left(state, now, mult, cfg, inventory_days_left=None)
                 
                 # Decrease by 1 day (but not below 0)
                 new_days_left = max(0.0, current_days_left - 1.0)
                 
                 # If days_left reached 0, save empty_at (if not already set)
-                if new_days_left <= 0.0 and state.empty_at is None:
+                ran_out_now = new_days_left <= 0.0 and state.empty_at is None
+                if ran_out_now:
                     state.empty_at = now
                 
                 # Derive new state
-                from ema_cycle_predictor import derive_state, compute_confidence
                 new_state = derive_state(new_days_left, state.cycle_mean_days, cfg)
                 
                 # Update state.last_pred_days_left
@@ -871,48 +1363,51 @@ class PredictorService:
                 # Calculate confidence
                 confidence = compute_confidence(state, now, cfg)
                 
-                # Update product_predictor_state
-                params_json = state.to_params_json()
-                params_json = self._make_json_serializable(params_json)
-                self.repo.upsert_predictor_state(
-                    user_id=user_id,
-                    product_id=product_id,
-                    predictor_profile_id=predictor_profile_id,
-                    params=params_json,
-                    confidence=confidence,
-                    updated_at=now,
-                )
+                # Only the daily keys change, so patch the stored params instead of re-serializing the state
+                stored = state_rows.get(str(product_id))
+                if stored is not None and isinstance(stored[0], dict) and stored[0].get("category_id") == state.category_id:
+                    params = dict(stored[0])
+                    params["last_pred_days_left"] = state.last_pred_days_left
+                    params["last_update_at"] = now.isoformat()
+                    # empty_at is only written on the day the product runs out; otherwise the stored value stands
+                    if ran_out_now:
+                        params["empty_at"] = params["last_update_at"]
+                else:
+                    params = state.to_params_json()
                 
-                # Update inventory
-                self.repo.upsert_inventory_days_estimate(
-                    user_id=user_id,
-                    product_id=product_id,
-                    days_left=new_days_left,
-                    state=InventoryState(new_state.value),
-                    confidence=confidence,
-                    source=InventorySource.SYSTEM,
+                # Build both rows before appending either, so a failure drops the product from both batches
+                state_row = self.repo.predictor_state_row(
+                    user_id, product_id, predictor_profile_id, params, confidence, now
                 )
+                inventory_row = self.repo.inventory_days_estimate_row(
+                    user_id, product_id, new_days_left, InventoryState(new_state.value), confidence, InventorySource.SYSTEM
+                )
+                state_batch.append(state_row)
+                inventory_batch.append(inventory_row)
                 
-                updated_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error in daily state update for product {product_id}: {e}")
-                import traceback
-                traceback.print_exc()
+            except Exception:
+                logger.exception("Error in daily state update for product %s", product_id)
                 continue
         
-        logger.info(f"Daily state update completed for user {user_id}: {updated_count} products updated")
+        self.repo.upsert_predictor_states_bulk(state_batch)
+        self.repo.upsert_inventory_days_estimates_bulk(inventory_batch)
+        
+        updated = len(decremented) + len(inventory_batch)
+        logger.info("Daily state update completed for user %s: %d products updated", user_id, updated)
+        return updated
     
     def weekly_model_update_all_products(self, user_id: str) -> None:
         """
         Run weekly update for all products of a user
         """
+        # Every per-product update would return immediately, so skip the inventory read too
+        if not WEEKLY_MODEL_UPDATE_ENABLED:
+            return
+        
         products = self.repo.get_user_inventory_products(user_id)
         for product_id, category_id in products:
             try:
                 self.weekly_model_update(user_id, product_id)
-            except Exception as e:
-                print(f"Error in weekly update for product {product_id}: {e}")
-                import traceback
-                traceback.print_exc()
+            except Exception:
+                logger.exception("Error in weekly update for product %s", product_id)
 
@@ -5,6 +5,7 @@ from typing import List, Optional
 from uuid import UUID
 from supabase import Client
 from app.schemas.product import ProductCategoryCreate, ProductCreate, ProductUpdate
+from app.services.predictor_service import invalidate_default_category_priors, invalidate_product_category
 
 
 class ProductService:
@@ -28,16 +29,20 @@ class ProductService:
         """Create a new category"""
         data = {"category_name": category.category_name}
         response = self.supabase.table("product_categories").insert(data).execute()
+        # Category priors are matched by name and cached per category_id, so drop them on any category write
+        invalidate_default_category_priors()
         return response.data[0] if response.data else {}
     
     def update_category(self, category_id: UUID, category_name: str) -> Optional[dict]:
         """Update a category"""
         response = self.supabase.table("product_categories").update({"category_name": category_name}).eq("category_id", str(category_id)).execute()
+        invalidate_default_category_priors()
         return response.data[0] if response.data else None
     
     def delete_category(self, category_id: UUID) -> bool:
         """Delete a category"""
         response = self.supabase.table("product_categories").delete().eq("category_id", str(category_id)).execute()
+        invalidate_default_category_priors()
         return len(response.data) > 0
     
     # Products
@@ -49,6 +54,18 @@ class ProductService:
         response = query.execute()
         return response.data if response.data else []
     
+    def search_products_by_names(self, names: List[str]) -> List[dict]:
+        """
+        Get candidate products for the given names (indexed trigram search, see
+        migrations/add_search_products_by_names.sql), with their categories.
+        Candidates are a prefilter only: a typo'd name may get none, so callers that
+        need every match must fall back to get_products().
+        """
+        if not names:
+            return []
+        response = self.supabase.rpc("search_products_by_names", {"p_names": names}).select("*, product_categories(*)").execute()
+        return response.data if response.data else []
+    
     def get_product(self, product_id: UUID) -> Optional[dict]:
         """Get a specific product"""
         response = self.supabase.table("products").select("*, product_categories(*)").eq("product_id", str(product_id)).execute()
@@ -106,6 +123,8 @@ class ProductService:
             
             # Update the product in the products table
             response = self.supabase.table("products").update(data).eq("product_id", str(product_id)).execute()
+            if "category_id" in data:
+                invalidate_product_category(str(product_id))
             print(f"[DEBUG ProductService] Update response: {response.data}")
             
             if not response.data:
@@ -135,5 +154,6 @@ class ProductService:
     def delete_product(self, product_id: UUID) -> bool:
         """Delete a product"""
         response = self.supabase.table("products").delete().eq("product_id", str(product_id)).execute()
+        invalidate_product_category(str(product_id))
         return len(response.data) > 0
 
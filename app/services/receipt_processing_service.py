@@ -3,7 +3,7 @@ Receipt processing service - orchestrates receipt scanning, product matching, an
 """
 from typing import List, Dict, Any, Optional, Tuple
 from uuid import UUID
-from datetime import datetime, timezone
+from datetime import datetime
 from supabase import Client
 from difflib import SequenceMatcher
 
@@ -14,6 +14,9 @@ from app.services.receipt_service import ReceiptService
 from app.schemas.product import ProductCreate
 from app.schemas.receipt import ReceiptCreate
 
+# Minimum similarity for a scanned name to reuse an existing product
+PRODUCT_MATCH_THRESHOLD = 0.75
+
 
 class ReceiptProcessingService:
     """
@@ -31,6 +34,8 @@ class ReceiptProcessingService:
         self.scanner_service = ReceiptScannerService(openai_api_key)
         self.product_service = ProductService(supabase)
         self.receipt_service = ReceiptService(supabase)
+        # Lowercased category name -> category_id, loaded on first use
+        self._category_ids_by_name: Optional[Dict[str, str]] = None
     
     def scan_and_match_receipt(
         self,
@@ -127,42 +132,72 @@ class ReceiptProcessingService:
         ]
         """
         try:
-            added_items = []
             inventory_updates = []
+            log_entries = []
             
-            for item in confirmed_items:
-                product_id = item["product_id"]
-                quantity = item.get("quantity", 1.0)
-                
-                # Create receipt item
-                receipt_item_data = {
-                    "product_id": product_id,
+            # Create all receipt items in one request
+            added_items = self.receipt_service.create_receipt_items(receipt_id, [
+                {
+                    "product_id": item["product_id"],
                     "detected_name": item.get("detected_name", ""),
-                    "quantity": quantity,
+                    "quantity": item.get("quantity", 1.0),
                     "unit_price": item.get("unit_price"),
                     "total_price": item.get("total_price"),
                     "confidence": item.get("confidence", 0.9)
                 }
-                receipt_item = self.receipt_service.create_receipt_item(receipt_id, receipt_item_data)
-                added_items.append(receipt_item)
-                
-                # Check if product exists in user's inventory
-                existing_inventory = self.supabase.table("inventory").select("*").eq(
-                    "user_id", str(user_id)
-                ).eq("product_id", product_id).execute()
+                for item in confirmed_items
+            ])
+            
+            # Read the user's inventory rows for all confirmed products at once
+            product_ids = list({item["product_id"] for item in confirmed_items})
+            inventory_by_product = {}
+            if product_ids:
+                existing_inventory = self.supabase.table("inventory").select(
+                    "product_id, estimated_qty, qty_unit, confidence, displayed_name"
+                ).eq("user_id", str(user_id)).in_("product_id", product_ids).execute()
+                inventory_by_product = {row["product_id"]: row for row in existing_inventory.data or []}
+            
+            # Name and unit of products that are new to the inventory, also in one read
+            new_product_ids = [pid for pid in product_ids if pid not in inventory_by_product]
+            products_by_id = {}
+            if new_product_ids:
+                products_result = self.supabase.table("products").select(
+                    "product_id, product_name, default_unit"
+                ).in_("product_id", new_product_ids).execute()
+                products_by_id = {row["product_id"]: row for row in products_result.data or []}
+            
+            # Created receipt items per product, in the order returned. Each confirmed item takes
+            # the next one for its product, so the logs don't rely on the bulk insert returning
+            # rows in input order
+            receipt_items_by_product = {}
+            for receipt_item in added_items:
+                receipt_items_by_product.setdefault(str(receipt_item.get("product_id")), []).append(receipt_item)
+            
+            # Final inventory row per product; a product listed twice adds up like sequential updates
+            inventory_rows = {}
+            for item in confirmed_items:
+                product_id = item["product_id"]
+                quantity = item.get("quantity", 1.0)
+                pending_receipt_items = receipt_items_by_product.get(str(product_id))
+                receipt_item = pending_receipt_items.pop(0) if pending_receipt_items else {}
                 
-                if existing_inventory.data and len(existing_inventory.data) > 0:
+                existing = inventory_rows.get(product_id) or inventory_by_product.get(product_id)
+                if existing is not None:
                     # Update existing inventory - ADD to existing quantity
-                    existing = existing_inventory.data[0]
                     current_qty = existing.get("estimated_qty", 0) or 0
                     new_qty = current_qty + quantity
                     
-                    update_result = self.supabase.table("inventory").update({
+                    # Columns other than state, source and quantity keep their current values
+                    inventory_rows[product_id] = {
+                        "user_id": str(user_id),
+                        "product_id": product_id,
                         "state": "FULL",
-                        "last_source": "RECEIPT",
                         "estimated_qty": new_qty,
-                        "last_updated_at": datetime.now(timezone.utc).isoformat()
-                    }).eq("user_id", str(user_id)).eq("product_id", product_id).execute()
+                        "qty_unit": existing.get("qty_unit"),
+                        "confidence": existing.get("confidence"),
+                        "last_source": "RECEIPT",
+                        "displayed_name": existing.get("displayed_name")
+                    }
                     
                     print(f"[+] Updated inventory: {existing.get('displayed_name')} - {current_qty} + {quantity} = {new_qty}")
                     
@@ -175,8 +210,8 @@ class ReceiptProcessingService:
                     })
                 else:
                     # Create new inventory item as FULL
-                    product = self.product_service.get_product(product_id)
-                    insert_result = self.supabase.table("inventory").insert({
+                    product = products_by_id.get(product_id, {})
+                    inventory_rows[product_id] = {
                         "user_id": str(user_id),
                         "product_id": product_id,
                         "state": "FULL",
@@ -185,7 +220,7 @@ class ReceiptProcessingService:
                         "confidence": 1.0,
                         "last_source": "RECEIPT",
                         "displayed_name": product.get("product_name")
-                    }).execute()
+                    }
                     
                     inventory_updates.append({
                         "product_id": product_id,
@@ -193,7 +228,7 @@ class ReceiptProcessingService:
                         "state": "FULL"
                     })
                 
-                # Create inventory log entry with receipt_item_id linkage
+                # Create inventory log entry with receipt_item_id linkage (inserted in bulk below)
                 log_entry = {
                     "user_id": str(user_id),
                     "product_id": product_id,
@@ -204,19 +239,29 @@ class ReceiptProcessingService:
                     "receipt_item_id": receipt_item.get("receipt_item_id"),
                     "note": f"Purchased {quantity} units from receipt"
                 }
-                log_result = self.supabase.table("inventory_log").insert(log_entry).execute()
+                log_entries.append(log_entry)
+            
+            # Write every inventory row (updated and new) in one upsert
+            if inventory_rows:
+                self.supabase.table("inventory").upsert(
+                    list(inventory_rows.values()), on_conflict="user_id,product_id"
+                ).execute()
+            
+            # Insert all log entries in one request
+            if log_entries:
+                log_result = self.supabase.table("inventory_log").insert(log_entries).execute()
                 
                 # Update predictor with the purchase data
-                if log_result.data and len(log_result.data) > 0:
-                    log_id = log_result.data[0].get("log_id")
+                from app.services.predictor_service import PredictorService
+                predictor_service = PredictorService(self.supabase)
+                for log_row in log_result.data or []:
+                    log_id = log_row.get("log_id")
+                    product_id = log_row.get("product_id")
                     try:
-                        from app.services.predictor_service import PredictorService
-                        predictor_service = PredictorService(self.supabase)
-                        
                         # Process the log to create predictor state and forecast
-                        predictor_service.process_inventory_log(str(log_id))
+                        predictor_service.process_inventory_log(str(log_id), log_row=log_row)
                         
-                        print(f"[+] Predictor updated for product {product_id} with quantity {quantity}")
+                        print(f"[+] Predictor updated for product {product_id}")
                     except Exception as pred_err:
                         print(f"[!] Warning: Could not update predictor: {pred_err}")
             
@@ -245,18 +290,35 @@ class ReceiptProcessingService:
         """
         matched_items = []
         
-        # Get all existing products
-        existing_products = self.product_service.get_products()
-        print(f"[*] Found {len(existing_products)} existing products in database")
+        # Get only the products that could match one of the scanned names
+        existing_products = self.product_service.search_products_by_names(
+            [item.name for item in scan_result.items if item.name]
+        )
+        print(f"[*] Found {len(existing_products)} candidate products in database")
+        # Lowercased names and their matchers are built once per receipt, not per scanned item
+        product_index = [self._product_index_entry(product) for product in existing_products]
+        full_catalogue = False
         
         for scanned_item in scan_result.items:
             # Try to find matching product
             best_match, score = self._find_best_product_match(
                 scanned_item.name,
-                existing_products
+                product_index
             )
             
-            if best_match and score >= 0.75:  # 75% similarity threshold
+            if (not best_match or score < PRODUCT_MATCH_THRESHOLD) and not full_catalogue:
+                # The trigram prefilter misses short typos ("mlik" vs "milk"); re-check against
+                # the whole catalogue (which includes products created above) before creating one
+                existing_products = self.product_service.get_products()
+                print(f"[*] No candidate for '{scanned_item.name}', using all {len(existing_products)} products")
+                product_index = [self._product_index_entry(product) for product in existing_products]
+                full_catalogue = True
+                best_match, score = self._find_best_product_match(
+                    scanned_item.name,
+                    product_index
+                )
+            
+            if best_match and score >= PRODUCT_MATCH_THRESHOLD:
                 # Use existing product
                 # Extract category name (handles nested product_categories)
                 category_name = None
@@ -298,18 +360,34 @@ class ReceiptProcessingService:
                     "is_new_product": True
                 })
                 # Add to existing products for next iterations
-                existing_products.append(new_product)
+                product_index.append(self._product_index_entry(new_product))
         
         return matched_items
     
+    @staticmethod
+    def _product_index_entry(product) -> Tuple[str, SequenceMatcher, Any]:
+        """
+        (lowercased product name, matcher with that name as its second sequence, product).
+        The matcher caches its analysis of the product name, so it is reused for every scanned item.
+        """
+        # Handle both direct product_name and nested structures
+        if isinstance(product, dict):
+            product_name = product.get("product_name", "").lower().strip()
+        else:
+            product_name = getattr(product, "product_name", "").lower().strip()
+        return product_name, SequenceMatcher(None, "", product_name), product
+    
     def _find_best_product_match(
         self,
         scanned_name: str,
-        existing_products: List[dict]
+        product_index: List[Tuple[str, SequenceMatcher, Any]]
     ) -> Tuple[Optional[dict], float]:
         """
         Find best matching product using fuzzy string matching
         
+        Args:
+            product_index: entries built by _product_index_entry
+        
         Returns:
             (best_match_product, similarity_score)
         """
@@ -318,22 +396,21 @@ class ReceiptProcessingService:
         
         scanned_name_lower = scanned_name.lower().strip()
         
-        for product in existing_products:
-            # Handle both direct product_name and nested structures
-            if isinstance(product, dict):
-                product_name = product.get("product_name", "").lower().strip()
-            else:
-                product_name = getattr(product, "product_name", "").lower().strip()
-            
+        for product_name, matcher, product in product_index:
             if not product_name:
                 continue
             
-            # Calculate similarity score
-            score = SequenceMatcher(None, scanned_name_lower, product_name).ratio()
-            
             # Boost score for exact substring matches
-            if scanned_name_lower in product_name or product_name in scanned_name_lower:
-                score = max(score, 0.85)
+            floor = 0.85 if scanned_name_lower in product_name or product_name in scanned_name_lower else 0.0
+            threshold = max(floor, best_score)
+            
+            # Calculate similarity score; real_quick_ratio() >= quick_ratio() >= ratio(), so the
+            # cheap upper bounds skip the full ratio() whenever it could not change the result
+            matcher.set_seq1(scanned_name_lower)
+            if matcher.real_quick_ratio() > threshold and matcher.quick_ratio() > threshold:
+                score = max(matcher.ratio(), floor)
+            else:
+                score = floor
             
             if score > best_score:
                 best_score = score
@@ -373,11 +450,16 @@ class ReceiptProcessingService:
         Returns category_id if found, None otherwise
         """
         try:
-            # Get all categories from database
-            categories = self.product_service.get_categories()
-            for cat in categories:
-                if cat["category_name"].lower() == category_name.lower():
-                    return cat["category_id"]
+            # Read all categories once per receipt and index them by lowercased name,
+            # instead of re-reading and re-scanning them for every new product
+            if self._category_ids_by_name is None:
+                self._category_ids_by_name = {
+                    cat["category_name"].lower(): cat["category_id"]
+                    for cat in reversed(self.product_service.get_categories())
+                }
+            category_id = self._category_ids_by_name.get(category_name.lower())
+            if category_id is not None:
+                return category_id
             
             # Category not found in database
             print(f"[!] Category '{category_name}' not found in database")
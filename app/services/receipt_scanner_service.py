@@ -4,7 +4,7 @@ AI-powered receipt scanning service using OpenAI Vision API
 from typing import List, Optional
 import os
 import json
-from openai import OpenAI
+from app.core.openai_client import get_openai_client
 
 
 class ReceiptItem:
@@ -70,7 +70,7 @@ class ReceiptScannerService:
         if not self.api_key:
             raise ValueError("OpenAI API key is required")
         try:
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = get_openai_client(self.api_key)
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
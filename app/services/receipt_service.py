@@ -65,7 +65,21 @@ class ReceiptService:
     
     def create_receipt_item(self, receipt_id: str, item_data: dict) -> dict:
         """Create a single receipt item"""
-        receipt_item_data = {
+        response = self.supabase.table("receipt_items").insert(self._receipt_item_row(receipt_id, item_data)).execute()
+        return response.data[0] if response.data else {}
+    
+    def create_receipt_items(self, receipt_id: str, items_data: List[dict]) -> List[dict]:
+        """Create many receipt items in one request"""
+        if not items_data:
+            return []
+        rows = [self._receipt_item_row(receipt_id, item_data) for item_data in items_data]
+        response = self.supabase.table("receipt_items").insert(rows).execute()
+        return response.data if response.data else []
+    
+    @staticmethod
+    def _receipt_item_row(receipt_id: str, item_data: dict) -> dict:
+        """Build a receipt_items row from confirmed/scanned item data"""
+        return {
             "receipt_id": receipt_id,
             "product_id": str(item_data.get("product_id")) if item_data.get("product_id") else None,
             "raw_label": item_data.get("detected_name", item_data.get("raw_label", "")),
@@ -76,9 +90,6 @@ class ReceiptService:
             "total_price": float(item_data.get("total_price")) if item_data.get("total_price") else None,
             "match_confidence": item_data.get("confidence", item_data.get("match_confidence", 0.9))
         }
-        
-        response = self.supabase.table("receipt_items").insert(receipt_item_data).execute()
-        return response.data[0] if response.data else {}
     
     def update_receipt(self, receipt_id: UUID, receipt_data: dict) -> Optional[dict]:
         """Update a receipt"""
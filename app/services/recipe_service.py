@@ -2,7 +2,7 @@
 Recipe generation service using OpenAI GPT
 """
 from typing import List, Optional, Dict, Any
-from openai import OpenAI
+from app.core.openai_client import get_openai_client
 import os
 import json
 
@@ -16,7 +16,7 @@ class RecipeService:
             raise ValueError("OpenAI API key is required")
         
         try:
-            self.client = OpenAI(api_key=self.api_key)
+            self.client = get_openai_client(self.api_key)
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
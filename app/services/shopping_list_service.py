@@ -87,7 +87,7 @@ class ShoppingListService:
                 shopping_frequency_days = self._get_shopping_frequency_days(user_id)
             
             # Get inventory item
-            inventory_result = self.supabase.table("inventory").select("*").eq("user_id", str(user_id)).eq("product_id", str(product_id)).execute()
+            inventory_result = self.supabase.table("inventory").select("state, estimated_qty, confidence").eq("user_id", str(user_id)).eq("product_id", str(product_id)).execute()
             
             if not inventory_result.data or len(inventory_result.data) == 0:
                 # No inventory - return default prediction
@@ -167,7 +167,7 @@ class ShoppingListService:
         """
         try:
             # Get current inventory state
-            inventory_result = self.supabase.table("inventory").select("*").eq("user_id", str(user_id)).eq("product_id", str(product_id)).execute()
+            inventory_result = self.supabase.table("inventory").select("state, estimated_qty").eq("user_id", str(user_id)).eq("product_id", str(product_id)).execute()
             
             if not inventory_result.data or len(inventory_result.data) == 0:
                 # No inventory - recommend based on shopping frequency and default cycle
@@ -338,7 +338,7 @@ class ShoppingListService:
                 continue
             
             # Check if product exists in user's inventory
-            existing_inventory = self.supabase.table("inventory").select("*").eq(
+            existing_inventory = self.supabase.table("inventory").select("state").eq(
                 "user_id", str(user_id)
             ).eq("product_id", product_id).execute()
             
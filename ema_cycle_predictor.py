@@ -1,11 +1,30 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from enum import Enum
 from typing import Any, Dict, Optional, Tuple
 import json
 import math
+import re
+
+
+# Fractional seconds + UTC offset at the end of an ISO timestamp (e.g. ".12345+00:00")
+_ISO_FRACTION_RE = re.compile(r'\.(\d{1,6})([+-]\d{2}:\d{2})$')
+
+
+def _parse_iso_datetime(x: str) -> datetime:
+    """Parse an ISO timestamp as returned by Supabase or isoformat()."""
+    x_str = x.replace("Z", "+00:00")
+    try:
+        # Fast path: a single C call for well-formed timestamps (the common case)
+        return datetime.fromisoformat(x_str)
+    except ValueError:
+        # Supabase sometimes returns fewer than 6 fractional digits, which older Pythons reject
+        match = _ISO_FRACTION_RE.search(x_str)
+        if match and len(match.group(1)) < 6:
+            return datetime.fromisoformat(f"{x_str[:match.start()]}.{match.group(1).ljust(6, '0')}{match.group(2)}")
+        raise
 
 
 # ----------------------------
@@ -139,11 +158,15 @@ class CycleEmaState:
     empty_at: Optional[datetime] = None  # Date when product ran out (state=EMPTY for first time)
 
     def to_params_json(self) -> Dict[str, Any]:
-        d = asdict(self)
+        # All fields are scalars, so a shallow copy is enough (asdict deep-copies)
+        d = dict(self.__dict__)
         # datetimes -> iso
-        for k in ["cycle_started_at", "last_purchase_at", "last_update_at", "empty_at", "last_feedback_at"]:
+        for k in ("cycle_started_at", "last_purchase_at", "last_update_at", "empty_at", "last_feedback_at"):
             if d[k] is not None:
                 d[k] = d[k].astimezone(timezone.utc).isoformat()
+        # category_id may arrive as a UUID; the result must be JSON-safe as is
+        if d["category_id"] is not None:
+            d["category_id"] = str(d["category_id"])
         return d
 
     @staticmethod
@@ -160,17 +183,7 @@ class CycleEmaState:
             if isinstance(x, str) and x.strip():
                 # expects ISO string; timezone recommended
                 try:
-                    # Fix microsecond precision if needed
-                    x_str = x.replace("Z", "+00:00")
-                    import re
-                    match = re.search(r'\.(\d{1,6})([+-]\d{2}:\d{2})$', x_str)
-                    if match:
-                        microseconds = match.group(1)
-                        timezone_part = match.group(2)
-                        if len(microseconds) < 6:
-                            microseconds = microseconds.ljust(6, '0')
-                        x_str = re.sub(r'\.\d{1,6}([+-]\d{2}:\d{2})$', f'.{microseconds}\\1', x_str)
-                    return datetime.fromisoformat(x_str)
+                    return _parse_iso_datetime(x)
                 except (ValueError, AttributeError):
                     try:
                         from dateutil import parser
@@ -218,7 +231,52 @@ def _days_between(a: datetime, b: datetime) -> float:
 
 
 def _clamp(x: float, lo: float, hi: float) -> float:
-    return max(lo, min(hi, x))
+    # Plain comparisons avoid two builtin calls; in-range values (the common case) take two compares
+    return lo if x < lo else hi if x > hi else x
+
+
+def ema_mad_update(
+    old_mean: float,
+    old_mad: float,
+    observed: float,
+    a: float,
+    min_cycle_days: float,
+    max_cycle_days: float,
+    mad_weight: float = 1.0,
+) -> Tuple[float, float]:
+    """
+    One EMA step for (cycle_mean_days, cycle_mad_days) towards an observed cycle length.
+    Plain float arithmetic with no state object, so it is cheap to call per product.
+    """
+    new_mean = _clamp((1 - a) * old_mean + a * observed, min_cycle_days, max_cycle_days)
+    new_mad = _clamp((1 - a) * old_mad + a * abs(observed - old_mean) * mad_weight, 0.1, max_cycle_days)
+    return float(new_mean), float(new_mad)
+
+
+def cumulative_cycle_update(
+    old_mean: float,
+    old_mad: float,
+    n_cycles: int,
+    observed: float,
+    min_cycle_days: float,
+    max_cycle_days: float,
+) -> Tuple[float, float]:
+    """
+    Fold one completed cycle into (cycle_mean_days, cycle_mad_days) as cumulative averages
+    over n_cycles previous cycles. Plain float arithmetic, like ema_mad_update.
+    """
+    # Cumulative average: (old_mean * n_cycles + new_cycle) / (n_cycles + 1)
+    err = abs(observed - old_mean)
+    if n_cycles == 0:
+        # First cycle - use observed and its absolute error directly
+        new_mean = observed
+        new_mad = err if err > 0 else 0.1
+    else:
+        new_mean = (old_mean * n_cycles + observed) / (n_cycles + 1)
+        new_mad = (old_mad * n_cycles + err) / (n_cycles + 1)
+    new_mean = _clamp(new_mean, min_cycle_days, max_cycle_days)
+    new_mad = _clamp(new_mad, 0.1, max_cycle_days)
+    return float(new_mean), float(new_mad)
 
 
 def _sigmoid(x: float) -> float:
@@ -379,32 +437,10 @@ def apply_purchase(state: CycleEmaState, ev: PurchaseEvent, cfg: PredictorConfig
     
     # Update mean if needed
     if should_update_mean and observed is not None:
-        old_mean = state.cycle_mean_days
-        n_cycles = state.n_completed_cycles
-        
-        # Cumulative average: (old_mean * n_cycles + new_cycle) / (n_cycles + 1)
-        if n_cycles == 0:
-            # First cycle - use observed directly
-            new_mean = observed
-        else:
-            # Cumulative average formula
-            new_mean = (old_mean * n_cycles + observed) / (n_cycles + 1)
-        
-        new_mean = _clamp(new_mean, cfg.min_cycle_days, cfg.max_cycle_days)
-        
-        # Update MAD based on error (cumulative average of absolute errors)
-        err = observed - old_mean
-        if n_cycles == 0:
-            # First cycle - use absolute error directly
-            new_mad = abs(err) if abs(err) > 0 else 0.1
-        else:
-            # Cumulative average of absolute errors
-            current_mad_sum = state.cycle_mad_days * n_cycles
-            new_mad = (current_mad_sum + abs(err)) / (n_cycles + 1)
-        new_mad = _clamp(new_mad, 0.1, cfg.max_cycle_days)
-        
-        state.cycle_mean_days = float(new_mean)
-        state.cycle_mad_days = float(new_mad)
+        state.cycle_mean_days, state.cycle_mad_days = cumulative_cycle_update(
+            state.cycle_mean_days, state.cycle_mad_days, state.n_completed_cycles, observed,
+            cfg.min_cycle_days, cfg.max_cycle_days,
+        )
         state.n_completed_cycles += 1
         state.n_strong_updates += 1
     elif state.cycle_started_at is not None:
@@ -459,14 +495,11 @@ def apply_feedback(state: CycleEmaState, ev: FeedbackEvent, cfg: PredictorConfig
                 observed = _clamp(observed, cfg.min_cycle_days, cfg.max_cycle_days)
                 # Very weak update (20% of alpha_strong)
                 a = cfg.alpha_strong * 0.2
-                old_mean = state.cycle_mean_days
-                new_mean = (1 - a) * old_mean + a * observed
-                new_mean = _clamp(new_mean, cfg.min_cycle_days, cfg.max_cycle_days)
-                state.cycle_mean_days = float(new_mean)
-                # Update MAD slightly
-                err = observed - old_mean
-                new_mad = (1 - a) * state.cycle_mad_days + a * abs(err) * 0.5
-                state.cycle_mad_days = float(_clamp(new_mad, 0.1, cfg.max_cycle_days))
+                # Update MAD slightly (half weight on the error)
+                state.cycle_mean_days, state.cycle_mad_days = ema_mad_update(
+                    state.cycle_mean_days, state.cycle_mad_days, observed, a,
+                    cfg.min_cycle_days, cfg.max_cycle_days, mad_weight=0.5,
+                )
             state.cycle_started_at = None
         else:
             # Default: don't learn consumption
@@ -610,25 +643,8 @@ def map_inventory_log_row_to_event(row: Dict[str, Any]) -> Tuple[Optional[Purcha
     occurred_at = row.get("occurred_at")
     if isinstance(occurred_at, str):
         try:
-            # Try to parse ISO format string
-            # Handle different formats: "Z" suffix, "+00:00", or already has timezone
-            occurred_at_str = occurred_at.replace("Z", "+00:00")
-            
-            # Fix microsecond precision if needed (Supabase sometimes returns 5 digits instead of 6)
-            # Format: '2025-12-27T16:45:25.52139+00:00' -> '2025-12-27T16:45:25.521390+00:00'
-            import re
-            # Match pattern: .DDDDD+ or .DDDDD- (5 digits before timezone)
-            match = re.search(r'\.(\d{1,6})([+-]\d{2}:\d{2})$', occurred_at_str)
-            if match:
-                microseconds = match.group(1)
-                timezone_part = match.group(2)
-                # Pad to 6 digits if less than 6
-                if len(microseconds) < 6:
-                    microseconds = microseconds.ljust(6, '0')
-                # Replace in string
-                occurred_at_str = re.sub(r'\.\d{1,6}([+-]\d{2}:\d{2})$', f'.{microseconds}\\1', occurred_at_str)
-            
-            occurred_at = datetime.fromisoformat(occurred_at_str)
+            # Handles the "Z" suffix and short fractional seconds from Supabase
+            occurred_at = _parse_iso_datetime(occurred_at)
         except (ValueError, AttributeError) as e:
             # Fallback: try parsing with dateutil if available, or use current time
             try:
@@ -0,0 +1,9 @@
+-- Migration: Partial index for active habit lookups
+-- Run this in Supabase SQL Editor
+--
+-- get_user_preferences and the predictor's habit multiplier lookups always
+-- filter habits by user_id and status = 'ACTIVE'.
+
+CREATE INDEX IF NOT EXISTS idx_habits_active_by_user
+    ON habits(user_id)
+    WHERE status = 'ACTIVE';
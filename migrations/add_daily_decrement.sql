@@ -0,0 +1,92 @@
+-- Migration: Run the daily days-left decrement server-side
+-- Run this in Supabase SQL Editor
+--
+-- Replaces the per-product Python loop in daily_state_update_all_products for
+-- the common case: inventory rows that already carry a days estimate and have
+-- a product_predictor_state row. Each such row is decremented by one day, its
+-- state is re-derived (same thresholds as derive_state) and the predictor
+-- params/confidence are patched (same formula as compute_confidence with
+-- last_update_at = now), all in one statement. Rows without an estimate or
+-- without predictor state are left to the Python fallback.
+--
+-- p_cfg carries the profile thresholds: {"full_ratio": ..., "medium_ratio": ...}
+
+CREATE OR REPLACE FUNCTION daily_decrement(
+    p_user_id UUID,
+    p_predictor_profile_id UUID,
+    p_cfg JSONB DEFAULT '{}'::JSONB
+)
+RETURNS TABLE (product_id UUID, new_days NUMERIC, new_state inventory_state) AS $$
+DECLARE
+    v_now TIMESTAMPTZ := now();
+    v_full_ratio NUMERIC := COALESCE((p_cfg->>'full_ratio')::NUMERIC, 0.70);
+    v_medium_ratio NUMERIC := COALESCE((p_cfg->>'medium_ratio')::NUMERIC, 0.30);
+BEGIN
+    RETURN QUERY
+    WITH src AS (
+        SELECT
+            i.product_id AS pid,
+            GREATEST(0, i.estimated_qty - 1) AS days,
+            COALESCE(s.params, '{}'::JSONB) AS params,
+            COALESCE((s.params->>'cycle_mean_days')::NUMERIC, 7.0) AS mean_days,
+            COALESCE((s.params->>'cycle_mad_days')::NUMERIC, 2.0) AS mad_days,
+            CASE
+                WHEN COALESCE((s.params->>'n_completed_cycles')::INT, 0) > 0
+                    THEN (s.params->>'n_completed_cycles')::INT
+                ELSE COALESCE((s.params->>'n_strong_updates')::INT, 0)
+            END AS cycles
+        FROM inventory i
+        JOIN product_predictor_state s
+            ON s.user_id = i.user_id AND s.product_id = i.product_id
+        WHERE i.user_id = p_user_id
+            AND i.state <> 'EMPTY'
+            AND i.estimated_qty IS NOT NULL
+        FOR UPDATE OF i, s
+    ),
+    calc AS (
+        SELECT
+            pid,
+            days,
+            params,
+            CASE
+                WHEN days <= 0 OR days / GREATEST(mean_days, 1e-6) < 0.02 THEN 'EMPTY'::inventory_state
+                WHEN days / GREATEST(mean_days, 1e-6) >= v_full_ratio THEN 'FULL'::inventory_state
+                WHEN days / GREATEST(mean_days, 1e-6) >= v_medium_ratio THEN 'MEDIUM'::inventory_state
+                ELSE 'LOW'::inventory_state
+            END AS st,
+            -- Recency is 1 because last_update_at is reset to now
+            LEAST(1.0, GREATEST(0.0,
+                0.2 + 0.8
+                * CASE WHEN cycles = 0 THEN 0.3 ELSE 1.0 / (1.0 + exp(-cycles / 2.0)) END
+                * LEAST(1.0, GREATEST(0.2, 1.0 - mad_days / GREATEST(mean_days, 1.0)))
+            ))::REAL AS conf
+        FROM src
+    ),
+    upd_state AS (
+        UPDATE product_predictor_state s SET
+            predictor_profile_id = p_predictor_profile_id,
+            params = c.params || jsonb_build_object(
+                'last_pred_days_left', c.days,
+                'last_update_at', v_now,
+                'empty_at', CASE
+                    WHEN c.days <= 0 AND COALESCE(c.params->'empty_at', 'null'::JSONB) = 'null'::JSONB
+                        THEN to_jsonb(v_now)
+                    ELSE COALESCE(c.params->'empty_at', 'null'::JSONB)
+                END
+            ),
+            confidence = c.conf,
+            updated_at = v_now
+        FROM calc c
+        WHERE s.user_id = p_user_id AND s.product_id = c.pid
+    )
+    UPDATE inventory i SET
+        estimated_qty = c.days,
+        qty_unit = 'days',
+        state = c.st,
+        confidence = c.conf,
+        last_source = 'SYSTEM'
+    FROM calc c
+    WHERE i.user_id = p_user_id AND i.product_id = c.pid
+    RETURNING i.product_id, i.estimated_qty, i.state;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,149 @@
+-- Migration: Write forecast bundles with a single data-modifying CTE statement
+-- Run this in Supabase SQL Editor (after add_forecast_idempotency.sql)
+--
+-- Redefines update_forecast_bundle, update_forecast_bundles and
+-- update_state_and_estimate (same signatures) as one SQL statement each,
+-- chaining the upserts with WITH ... RETURNING instead of running separate
+-- plpgsql statements. The bulk variant also decodes its JSON payload in a CTE
+-- rather than materialising a temporary table on every call.
+
+CREATE OR REPLACE FUNCTION update_forecast_bundle(
+    p_user_id UUID,
+    p_product_id UUID,
+    p_predictor_profile_id UUID,
+    p_params JSONB,
+    p_confidence REAL,
+    p_days_left NUMERIC,
+    p_state inventory_state,
+    p_generated_at TIMESTAMPTZ,
+    p_source inventory_source DEFAULT 'SYSTEM',
+    p_qty_unit TEXT DEFAULT 'days',
+    p_trigger_log_id UUID DEFAULT NULL
+)
+RETURNS VOID AS $$
+    WITH upsert_state AS (
+        INSERT INTO product_predictor_state (
+            user_id, product_id, predictor_profile_id, params, confidence, updated_at
+        ) VALUES (
+            p_user_id, p_product_id, p_predictor_profile_id, p_params, p_confidence, p_generated_at
+        )
+        ON CONFLICT (user_id, product_id) DO UPDATE SET
+            predictor_profile_id = EXCLUDED.predictor_profile_id,
+            params = EXCLUDED.params,
+            confidence = EXCLUDED.confidence,
+            updated_at = EXCLUDED.updated_at
+        RETURNING 1
+    ),
+    upsert_inventory AS (
+        INSERT INTO inventory (
+            user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+        ) VALUES (
+            p_user_id, p_product_id, p_state, p_days_left, p_qty_unit, p_confidence, p_source
+        )
+        ON CONFLICT (user_id, product_id) DO UPDATE SET
+            state = EXCLUDED.state,
+            estimated_qty = EXCLUDED.estimated_qty,
+            qty_unit = EXCLUDED.qty_unit,
+            confidence = EXCLUDED.confidence,
+            last_source = EXCLUDED.last_source
+        RETURNING 1
+    )
+    INSERT INTO inventory_forecasts (
+        user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id
+    ) VALUES (
+        p_user_id, p_product_id, p_generated_at, p_days_left, p_state, p_confidence, p_trigger_log_id
+    )
+    ON CONFLICT (user_id, product_id, generated_at) DO NOTHING;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION update_forecast_bundles(p_rows JSONB)
+RETURNS VOID AS $$
+    WITH bundles AS (
+        SELECT *
+        FROM jsonb_to_recordset(p_rows) AS r(
+            user_id UUID,
+            product_id UUID,
+            predictor_profile_id UUID,
+            params JSONB,
+            confidence REAL,
+            days_left NUMERIC,
+            state inventory_state,
+            generated_at TIMESTAMPTZ,
+            source inventory_source,
+            qty_unit TEXT,
+            trigger_log_id UUID
+        )
+    ),
+    upsert_state AS (
+        INSERT INTO product_predictor_state (
+            user_id, product_id, predictor_profile_id, params, confidence, updated_at
+        )
+        SELECT user_id, product_id, predictor_profile_id, params, confidence, generated_at
+        FROM bundles
+        ON CONFLICT (user_id, product_id) DO UPDATE SET
+            predictor_profile_id = EXCLUDED.predictor_profile_id,
+            params = EXCLUDED.params,
+            confidence = EXCLUDED.confidence,
+            updated_at = EXCLUDED.updated_at
+        RETURNING 1
+    ),
+    upsert_inventory AS (
+        INSERT INTO inventory (
+            user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+        )
+        SELECT user_id, product_id, state, days_left, COALESCE(qty_unit, 'days'), confidence, COALESCE(source, 'SYSTEM')
+        FROM bundles
+        ON CONFLICT (user_id, product_id) DO UPDATE SET
+            state = EXCLUDED.state,
+            estimated_qty = EXCLUDED.estimated_qty,
+            qty_unit = EXCLUDED.qty_unit,
+            confidence = EXCLUDED.confidence,
+            last_source = EXCLUDED.last_source
+        RETURNING 1
+    )
+    INSERT INTO inventory_forecasts (
+        user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id
+    )
+    SELECT user_id, product_id, generated_at, days_left, state, confidence, trigger_log_id
+    FROM bundles
+    ON CONFLICT (user_id, product_id, generated_at) DO NOTHING;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION update_state_and_estimate(
+    p_user_id UUID,
+    p_product_id UUID,
+    p_predictor_profile_id UUID,
+    p_params JSONB,
+    p_confidence REAL,
+    p_days_left NUMERIC,
+    p_state inventory_state,
+    p_updated_at TIMESTAMPTZ,
+    p_source inventory_source DEFAULT 'SYSTEM',
+    p_qty_unit TEXT DEFAULT 'days'
+)
+RETURNS VOID AS $$
+    WITH upsert_state AS (
+        INSERT INTO product_predictor_state (
+            user_id, product_id, predictor_profile_id, params, confidence, updated_at
+        ) VALUES (
+            p_user_id, p_product_id, p_predictor_profile_id, p_params, p_confidence, p_updated_at
+        )
+        ON CONFLICT (user_id, product_id) DO UPDATE SET
+            predictor_profile_id = EXCLUDED.predictor_profile_id,
+            params = EXCLUDED.params,
+            confidence = EXCLUDED.confidence,
+            updated_at = EXCLUDED.updated_at
+        RETURNING 1
+    )
+    INSERT INTO inventory (
+        user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+    ) VALUES (
+        p_user_id, p_product_id, p_state, p_days_left, p_qty_unit, p_confidence, p_source
+    )
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        state = EXCLUDED.state,
+        estimated_qty = EXCLUDED.estimated_qty,
+        qty_unit = EXCLUDED.qty_unit,
+        confidence = EXCLUDED.confidence,
+        last_source = EXCLUDED.last_source;
+$$ LANGUAGE sql;
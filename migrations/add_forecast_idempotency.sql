@@ -0,0 +1,113 @@
+-- Migration: Make forecast snapshot writes safe to retry
+-- Run this in Supabase SQL Editor (after add_update_forecast_bundle.sql and
+-- add_update_forecast_bundles.sql)
+--
+-- The predictor retries writes that fail with a transient error (see
+-- _execute_with_retry in app/services/predictor_service.py). A retry can follow
+-- a request that did commit but whose response was lost, so the forecast
+-- insert must not create a second snapshot. generated_at is set by the client
+-- and is identical on every attempt, so (user_id, product_id, generated_at)
+-- serves as the idempotency key. The state and inventory writes are upserts
+-- and already idempotent.
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_inventory_forecasts_user_product_generated
+    ON inventory_forecasts(user_id, product_id, generated_at);
+
+CREATE OR REPLACE FUNCTION update_forecast_bundle(
+    p_user_id UUID,
+    p_product_id UUID,
+    p_predictor_profile_id UUID,
+    p_params JSONB,
+    p_confidence REAL,
+    p_days_left NUMERIC,
+    p_state inventory_state,
+    p_generated_at TIMESTAMPTZ,
+    p_source inventory_source DEFAULT 'SYSTEM',
+    p_qty_unit TEXT DEFAULT 'days',
+    p_trigger_log_id UUID DEFAULT NULL
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO product_predictor_state (
+        user_id, product_id, predictor_profile_id, params, confidence, updated_at
+    ) VALUES (
+        p_user_id, p_product_id, p_predictor_profile_id, p_params, p_confidence, p_generated_at
+    )
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        predictor_profile_id = EXCLUDED.predictor_profile_id,
+        params = EXCLUDED.params,
+        confidence = EXCLUDED.confidence,
+        updated_at = EXCLUDED.updated_at;
+
+    INSERT INTO inventory (
+        user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+    ) VALUES (
+        p_user_id, p_product_id, p_state, p_days_left, p_qty_unit, p_confidence, p_source
+    )
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        state = EXCLUDED.state,
+        estimated_qty = EXCLUDED.estimated_qty,
+        qty_unit = EXCLUDED.qty_unit,
+        confidence = EXCLUDED.confidence,
+        last_source = EXCLUDED.last_source;
+
+    INSERT INTO inventory_forecasts (
+        user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id
+    ) VALUES (
+        p_user_id, p_product_id, p_generated_at, p_days_left, p_state, p_confidence, p_trigger_log_id
+    )
+    ON CONFLICT (user_id, product_id, generated_at) DO NOTHING;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION update_forecast_bundles(p_rows JSONB)
+RETURNS VOID AS $$
+BEGIN
+    -- Decode the payload once; the temp table is dropped when the transaction commits
+    CREATE TEMP TABLE _bundles ON COMMIT DROP AS
+    SELECT *
+    FROM jsonb_to_recordset(p_rows) AS r(
+        user_id UUID,
+        product_id UUID,
+        predictor_profile_id UUID,
+        params JSONB,
+        confidence REAL,
+        days_left NUMERIC,
+        state inventory_state,
+        generated_at TIMESTAMPTZ,
+        source inventory_source,
+        qty_unit TEXT,
+        trigger_log_id UUID
+    );
+
+    INSERT INTO product_predictor_state (
+        user_id, product_id, predictor_profile_id, params, confidence, updated_at
+    )
+    SELECT user_id, product_id, predictor_profile_id, params, confidence, generated_at
+    FROM _bundles
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        predictor_profile_id = EXCLUDED.predictor_profile_id,
+        params = EXCLUDED.params,
+        confidence = EXCLUDED.confidence,
+        updated_at = EXCLUDED.updated_at;
+
+    INSERT INTO inventory (
+        user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+    )
+    SELECT user_id, product_id, state, days_left, COALESCE(qty_unit, 'days'), confidence, COALESCE(source, 'SYSTEM')
+    FROM _bundles
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        state = EXCLUDED.state,
+        estimated_qty = EXCLUDED.estimated_qty,
+        qty_unit = EXCLUDED.qty_unit,
+        confidence = EXCLUDED.confidence,
+        last_source = EXCLUDED.last_source;
+
+    INSERT INTO inventory_forecasts (
+        user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id
+    )
+    SELECT user_id, product_id, generated_at, days_left, state, confidence, trigger_log_id
+    FROM _bundles
+    ON CONFLICT (user_id, product_id, generated_at) DO NOTHING;
+END;
+$$ LANGUAGE plpgsql;
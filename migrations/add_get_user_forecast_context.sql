@@ -0,0 +1,30 @@
+-- Migration: Read a user's inventory products with their categories and predictor states in one call
+-- Run this in Supabase SQL Editor
+--
+-- Used by PredictorService.refresh_user_inventory_forecasts, which previously
+-- read the inventory (with products(category_id)) and then, in a second
+-- round-trip, the predictor states of those products. The state columns are
+-- NULL for products that have no predictor state yet.
+
+CREATE OR REPLACE FUNCTION get_user_forecast_context(p_user_id UUID)
+RETURNS TABLE (
+    product_id UUID,
+    category_id UUID,
+    params JSONB,
+    confidence REAL,
+    updated_at TIMESTAMPTZ,
+    predictor_profile_id UUID
+) AS $$
+    SELECT
+        i.product_id,
+        p.category_id,
+        s.params,
+        s.confidence,
+        s.updated_at,
+        s.predictor_profile_id
+    FROM inventory i
+    LEFT JOIN products p ON p.product_id = i.product_id
+    LEFT JOIN product_predictor_state s
+        ON s.user_id = i.user_id AND s.product_id = i.product_id
+    WHERE i.user_id = p_user_id;
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,49 @@
+-- Migration: Per-user preferences function
+-- Run this in Supabase SQL Editor
+--
+-- Replaces the v_user_preferences view (add_user_preferences_view.sql, dropped at
+-- the end of this file) with a function that filters to one user's ACTIVE habits
+-- before aggregating, and reads only the params keys it needs via JSONB operators:
+--   * scalar fields take the first non-null value found across habits
+--   * list fields are the distinct union across habits
+-- Always returns exactly one row (nulls / empty arrays for users without habits).
+
+CREATE OR REPLACE FUNCTION get_user_preferences(uid UUID)
+RETURNS TABLE (
+    household_size JSONB,
+    preferred_shopping_day TEXT,
+    shopping_frequency TEXT,
+    cooking_frequency TEXT,
+    dietary_preferences TEXT[],
+    excluded_categories TEXT[],
+    notes TEXT
+) AS $$
+    WITH active AS (
+        SELECT params
+        FROM habits
+        WHERE user_id = uid AND status = 'ACTIVE' AND params IS NOT NULL
+    )
+    SELECT
+        (SELECT params->'household_size' FROM active
+            WHERE jsonb_typeof(params->'household_size') <> 'null' LIMIT 1),
+        (SELECT params->>'preferred_shopping_day' FROM active
+            WHERE jsonb_typeof(params->'preferred_shopping_day') <> 'null' LIMIT 1),
+        (SELECT params->>'shopping_frequency' FROM active
+            WHERE jsonb_typeof(params->'shopping_frequency') <> 'null' LIMIT 1),
+        (SELECT params->>'cooking_frequency' FROM active
+            WHERE jsonb_typeof(params->'cooking_frequency') <> 'null' LIMIT 1),
+        ARRAY(
+            SELECT DISTINCT jsonb_array_elements_text(params->'dietary_preferences')
+            FROM active
+            WHERE jsonb_typeof(params->'dietary_preferences') = 'array'
+        ),
+        ARRAY(
+            SELECT DISTINCT jsonb_array_elements_text(params->'excluded_categories')
+            FROM active
+            WHERE jsonb_typeof(params->'excluded_categories') = 'array'
+        ),
+        (SELECT params->>'notes' FROM active
+            WHERE jsonb_typeof(params->'notes') <> 'null' LIMIT 1);
+$$ LANGUAGE sql STABLE;
+
+DROP VIEW IF EXISTS v_user_preferences;
@@ -0,0 +1,19 @@
+-- Migration: Composite indexes for the hot API queries
+-- Run this in Supabase SQL Editor
+--
+-- Verify with EXPLAIN (ANALYZE, BUFFERS) on the matching queries:
+--   InventoryService.get_inventory_logs : inventory_log WHERE user_id ORDER BY occurred_at DESC LIMIT n
+--   HabitService.get_habits             : habits WHERE user_id [AND status] [AND type]
+--
+-- inventory(user_id, product_id) lookups are served by the primary key. A covering
+-- index over the same columns only duplicated it and made every daily decrement /
+-- forecast write rewrite the included columns, so drop it where it was created.
+DROP INDEX IF EXISTS idx_inventory_user_product_covering;
+
+-- Per-user log listing without a product filter (the existing
+-- idx_inventory_log_user_product_time leads with product_id after user_id)
+CREATE INDEX IF NOT EXISTS idx_inventory_log_user_time
+    ON inventory_log(user_id, occurred_at DESC, product_id);
+
+CREATE INDEX IF NOT EXISTS idx_habits_user_status_type
+    ON habits(user_id, status, type);
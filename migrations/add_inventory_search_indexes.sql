@@ -0,0 +1,14 @@
+-- Migration: Trigram indexes for inventory text search
+-- Run this in Supabase SQL Editor
+--
+-- InventoryService.get_inventory filters with ILIKE '%term%' on
+-- inventory.displayed_name and products.product_name. Trigram GIN indexes
+-- keep these lookups fast as inventories grow.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_inventory_displayed_name_trgm
+    ON inventory USING gin (displayed_name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_products_product_name_trgm
+    ON products USING gin (product_name gin_trgm_ops);
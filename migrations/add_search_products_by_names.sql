@@ -0,0 +1,40 @@
+-- Migration: Find candidate products for a list of scanned receipt names
+-- Run this in Supabase SQL Editor (after add_inventory_search_indexes.sql)
+--
+-- Used by ReceiptProcessingService._match_or_create_products, which
+-- previously downloaded every product (with its category) to fuzzy-match the
+-- scanned names in Python. This returns only products whose name is
+-- trigram-similar to one of the names (%), or that contain one of them as a
+-- word-similar extent (<%). Both operators are served by the GIN index
+-- idx_products_product_name_trgm; the final scoring still happens in Python.
+--
+-- Trigram similarity is not the Python score: short typos ("mlik" vs "milk")
+-- share few trigrams, so a name with no acceptable candidate here is
+-- re-matched by the caller against the full catalogue.
+--
+-- The thresholds are set with set_config(..., true), the transaction-local
+-- form of set_limit(), so the pooled connection keeps its defaults.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE OR REPLACE FUNCTION search_products_by_names(
+    p_names TEXT[],
+    p_threshold REAL DEFAULT 0.3
+)
+RETURNS SETOF products AS $$
+BEGIN
+    PERFORM set_config('pg_trgm.similarity_threshold', p_threshold::TEXT, true);
+    PERFORM set_config('pg_trgm.word_similarity_threshold', p_threshold::TEXT, true);
+
+    RETURN QUERY
+    SELECT p.*
+    FROM products p
+    WHERE p.product_id IN (
+        SELECT p2.product_id
+        FROM unnest(p_names) AS n(name)
+        JOIN products p2
+            ON p2.product_name % n.name
+            OR n.name <% p2.product_name
+    );
+END;
+$$ LANGUAGE plpgsql;
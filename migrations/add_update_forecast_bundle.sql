@@ -0,0 +1,53 @@
+-- Migration: Write predictor state, inventory estimate and forecast in one call
+-- Run this in Supabase SQL Editor
+--
+-- Replaces the three separate requests made after each processed inventory log
+-- (upsert product_predictor_state, upsert inventory, insert inventory_forecasts)
+-- with a single RPC that runs in one transaction, so a partial failure can no
+-- longer leave the predictor state and the inventory estimate out of sync.
+
+CREATE OR REPLACE FUNCTION update_forecast_bundle(
+    p_user_id UUID,
+    p_product_id UUID,
+    p_predictor_profile_id UUID,
+    p_params JSONB,
+    p_confidence REAL,
+    p_days_left NUMERIC,
+    p_state inventory_state,
+    p_generated_at TIMESTAMPTZ,
+    p_source inventory_source DEFAULT 'SYSTEM',
+    p_qty_unit TEXT DEFAULT 'days',
+    p_trigger_log_id UUID DEFAULT NULL
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO product_predictor_state (
+        user_id, product_id, predictor_profile_id, params, confidence, updated_at
+    ) VALUES (
+        p_user_id, p_product_id, p_predictor_profile_id, p_params, p_confidence, p_generated_at
+    )
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        predictor_profile_id = EXCLUDED.predictor_profile_id,
+        params = EXCLUDED.params,
+        confidence = EXCLUDED.confidence,
+        updated_at = EXCLUDED.updated_at;
+
+    INSERT INTO inventory (
+        user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+    ) VALUES (
+        p_user_id, p_product_id, p_state, p_days_left, p_qty_unit, p_confidence, p_source
+    )
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        state = EXCLUDED.state,
+        estimated_qty = EXCLUDED.estimated_qty,
+        qty_unit = EXCLUDED.qty_unit,
+        confidence = EXCLUDED.confidence,
+        last_source = EXCLUDED.last_source;
+
+    INSERT INTO inventory_forecasts (
+        user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id
+    ) VALUES (
+        p_user_id, p_product_id, p_generated_at, p_days_left, p_state, p_confidence, p_trigger_log_id
+    );
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,61 @@
+-- Migration: Write many predictor state / inventory estimate / forecast bundles in one call
+-- Run this in Supabase SQL Editor
+--
+-- Bulk variant of update_forecast_bundle used by the inventory and habit
+-- refreshes. Replaces the three bulk requests (one per table) with a single
+-- RPC that writes all rows in one transaction.
+--
+-- p_rows is a JSON array of objects with the keys: user_id, product_id,
+-- predictor_profile_id, params, confidence, days_left, state, generated_at,
+-- source, qty_unit, trigger_log_id
+
+CREATE OR REPLACE FUNCTION update_forecast_bundles(p_rows JSONB)
+RETURNS VOID AS $$
+BEGIN
+    -- Decode the payload once; the temp table is dropped when the transaction commits
+    CREATE TEMP TABLE _bundles ON COMMIT DROP AS
+    SELECT *
+    FROM jsonb_to_recordset(p_rows) AS r(
+        user_id UUID,
+        product_id UUID,
+        predictor_profile_id UUID,
+        params JSONB,
+        confidence REAL,
+        days_left NUMERIC,
+        state inventory_state,
+        generated_at TIMESTAMPTZ,
+        source inventory_source,
+        qty_unit TEXT,
+        trigger_log_id UUID
+    );
+
+    INSERT INTO product_predictor_state (
+        user_id, product_id, predictor_profile_id, params, confidence, updated_at
+    )
+    SELECT user_id, product_id, predictor_profile_id, params, confidence, generated_at
+    FROM _bundles
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        predictor_profile_id = EXCLUDED.predictor_profile_id,
+        params = EXCLUDED.params,
+        confidence = EXCLUDED.confidence,
+        updated_at = EXCLUDED.updated_at;
+
+    INSERT INTO inventory (
+        user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+    )
+    SELECT user_id, product_id, state, days_left, COALESCE(qty_unit, 'days'), confidence, COALESCE(source, 'SYSTEM')
+    FROM _bundles
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        state = EXCLUDED.state,
+        estimated_qty = EXCLUDED.estimated_qty,
+        qty_unit = EXCLUDED.qty_unit,
+        confidence = EXCLUDED.confidence,
+        last_source = EXCLUDED.last_source;
+
+    INSERT INTO inventory_forecasts (
+        user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id
+    )
+    SELECT user_id, product_id, generated_at, days_left, state, confidence, trigger_log_id
+    FROM _bundles;
+END;
+$$ LANGUAGE plpgsql;
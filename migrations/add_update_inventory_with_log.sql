@@ -0,0 +1,60 @@
+-- Migration: Update an inventory item and log the state change in one call
+-- Run this in Supabase SQL Editor
+--
+-- Replaces the SELECT (old state) + UPDATE + INSERT inventory_log round-trips
+-- in InventoryService.update_inventory with a single RPC that runs in one
+-- transaction. NULL parameters leave the corresponding column unchanged.
+
+CREATE OR REPLACE FUNCTION update_inventory_with_log(
+    p_user_id UUID,
+    p_product_id UUID,
+    p_state inventory_state DEFAULT NULL,
+    p_estimated_qty NUMERIC DEFAULT NULL,
+    p_qty_unit TEXT DEFAULT NULL,
+    p_confidence REAL DEFAULT NULL,
+    p_last_source inventory_source DEFAULT NULL,
+    p_displayed_name TEXT DEFAULT NULL,
+    p_log_change BOOLEAN DEFAULT TRUE
+)
+RETURNS SETOF inventory AS $$
+DECLARE
+    v_old_state inventory_state;
+    v_row inventory;
+BEGIN
+    -- Lock the row so the logged old state matches what we overwrite
+    SELECT state INTO v_old_state
+    FROM inventory
+    WHERE user_id = p_user_id AND product_id = p_product_id
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+
+    UPDATE inventory SET
+        state = COALESCE(p_state, state),
+        estimated_qty = COALESCE(p_estimated_qty, estimated_qty),
+        qty_unit = COALESCE(p_qty_unit, qty_unit),
+        confidence = COALESCE(p_confidence, confidence),
+        last_source = COALESCE(p_last_source, last_source),
+        displayed_name = COALESCE(p_displayed_name, displayed_name)
+    WHERE user_id = p_user_id AND product_id = p_product_id
+    RETURNING * INTO v_row;
+
+    IF p_log_change AND p_state IS NOT NULL AND v_old_state IS DISTINCT FROM p_state THEN
+        INSERT INTO inventory_log (
+            user_id, product_id, action, delta_state, action_confidence, source, note
+        ) VALUES (
+            p_user_id,
+            p_product_id,
+            'ADJUST',
+            p_state,
+            COALESCE(NULLIF(p_confidence, 0), 1.0),
+            COALESCE(p_last_source, 'MANUAL'),
+            format('State changed from %s to %s via UI', v_old_state, p_state)
+        );
+    END IF;
+
+    RETURN NEXT v_row;
+END;
+$$ LANGUAGE plpgsql;
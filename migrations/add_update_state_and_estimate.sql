@@ -0,0 +1,46 @@
+-- Migration: Write predictor state and inventory estimate in one call
+-- Run this in Supabase SQL Editor
+--
+-- Used by the days-left feedback endpoints (inventory feedback and shopping
+-- list feedback), which adjust the prediction without recording a forecast
+-- snapshot. Replaces their two separate upserts with one RPC that runs in one
+-- transaction (see update_forecast_bundle for the variant with a forecast).
+
+CREATE OR REPLACE FUNCTION update_state_and_estimate(
+    p_user_id UUID,
+    p_product_id UUID,
+    p_predictor_profile_id UUID,
+    p_params JSONB,
+    p_confidence REAL,
+    p_days_left NUMERIC,
+    p_state inventory_state,
+    p_updated_at TIMESTAMPTZ,
+    p_source inventory_source DEFAULT 'SYSTEM',
+    p_qty_unit TEXT DEFAULT 'days'
+)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO product_predictor_state (
+        user_id, product_id, predictor_profile_id, params, confidence, updated_at
+    ) VALUES (
+        p_user_id, p_product_id, p_predictor_profile_id, p_params, p_confidence, p_updated_at
+    )
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        predictor_profile_id = EXCLUDED.predictor_profile_id,
+        params = EXCLUDED.params,
+        confidence = EXCLUDED.confidence,
+        updated_at = EXCLUDED.updated_at;
+
+    INSERT INTO inventory (
+        user_id, product_id, state, estimated_qty, qty_unit, confidence, last_source
+    ) VALUES (
+        p_user_id, p_product_id, p_state, p_days_left, p_qty_unit, p_confidence, p_source
+    )
+    ON CONFLICT (user_id, product_id) DO UPDATE SET
+        state = EXCLUDED.state,
+        estimated_qty = EXCLUDED.estimated_qty,
+        qty_unit = EXCLUDED.qty_unit,
+        confidence = EXCLUDED.confidence,
+        last_source = EXCLUDED.last_source;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,49 @@
+-- Migration: Set modification timestamps in the database
+-- Run this in Supabase SQL Editor
+--
+-- The API used to send updated_at = 'now()' / confirmed_at = <python utcnow>
+-- in every update payload. These triggers and the confirm function let
+-- Postgres stamp the time itself.
+
+-- habits.updated_at
+CREATE OR REPLACE FUNCTION update_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_habits_updated_at ON habits;
+CREATE TRIGGER update_habits_updated_at BEFORE UPDATE ON habits
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- inventory.last_updated_at
+-- Only receipts, shopping lists, recipes and user edits move the timestamp. System
+-- writes (daily_decrement, forecast refreshes) keep it, so the pantry's
+-- "recently updated" order reflects what the user did, not the nightly job.
+CREATE OR REPLACE FUNCTION update_last_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.last_source IS DISTINCT FROM 'SYSTEM' THEN
+        NEW.last_updated_at = NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_inventory_last_updated_at ON inventory;
+CREATE TRIGGER update_inventory_last_updated_at BEFORE UPDATE ON inventory
+    FOR EACH ROW EXECUTE FUNCTION update_last_updated_at_column();
+
+-- habit_inputs.confirmed_at
+CREATE OR REPLACE FUNCTION confirm_habit_input(
+    p_habit_input_id UUID,
+    p_user_id UUID
+)
+RETURNS SETOF habit_inputs AS $$
+    UPDATE habit_inputs
+    SET confirmed_at = NOW()
+    WHERE habit_input_id = p_habit_input_id AND user_id = p_user_id
+    RETURNING *;
+$$ LANGUAGE sql;
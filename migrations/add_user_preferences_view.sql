@@ -0,0 +1,43 @@
+-- Migration: Aggregated user preferences view
+--
+-- SUPERSEDED by add_get_user_preferences_function.sql, which drops this view and
+-- replaces it with the get_user_preferences(uid) function that HabitService calls.
+-- Nothing reads v_user_preferences any more: on a fresh database skip this file
+-- and run add_get_user_preferences_function.sql instead.
+--
+-- Aggregates params of all ACTIVE habits into one row per user, replacing the
+-- Python loop in HabitService.get_user_preferences:
+--   * scalar fields take the first non-null value found across habits
+--   * list fields are the distinct union across habits
+
+CREATE OR REPLACE VIEW v_user_preferences
+WITH (security_invoker = true) AS
+SELECT
+    h.user_id,
+    (array_agg(h.params->'household_size')
+        FILTER (WHERE jsonb_typeof(h.params->'household_size') <> 'null'))[1] AS household_size,
+    (array_agg(h.params->>'preferred_shopping_day')
+        FILTER (WHERE jsonb_typeof(h.params->'preferred_shopping_day') <> 'null'))[1] AS preferred_shopping_day,
+    (array_agg(h.params->>'shopping_frequency')
+        FILTER (WHERE jsonb_typeof(h.params->'shopping_frequency') <> 'null'))[1] AS shopping_frequency,
+    (array_agg(h.params->>'cooking_frequency')
+        FILTER (WHERE jsonb_typeof(h.params->'cooking_frequency') <> 'null'))[1] AS cooking_frequency,
+    (array_agg(h.params->>'notes')
+        FILTER (WHERE jsonb_typeof(h.params->'notes') <> 'null'))[1] AS notes,
+    ARRAY(
+        SELECT DISTINCT jsonb_array_elements_text(h2.params->'dietary_preferences')
+        FROM habits h2
+        WHERE h2.user_id = h.user_id
+          AND h2.status = 'ACTIVE'
+          AND jsonb_typeof(h2.params->'dietary_preferences') = 'array'
+    ) AS dietary_preferences,
+    ARRAY(
+        SELECT DISTINCT jsonb_array_elements_text(h2.params->'excluded_categories')
+        FROM habits h2
+        WHERE h2.user_id = h.user_id
+          AND h2.status = 'ACTIVE'
+          AND jsonb_typeof(h2.params->'excluded_categories') = 'array'
+    ) AS excluded_categories
+FROM habits h
+WHERE h.status = 'ACTIVE'
+GROUP BY h.user_id;
@@ -7,8 +7,14 @@ from typing import Any, Dict, List, Optional, Tuple
 # You need a DB-API connection (psycopg3 / psycopg2).
 # This module is written to be simple and explicit.
 # Example with psycopg3:
-#   import psycopg
-#   conn = psycopg.connect(dsn)
+#   conn = connect(dsn)   # see connect() below
+#
+# Supabase exposes two poolers:
+#   port 5432 - session pooler / direct: prepared statements work normally
+#   port 6543 - transaction pooler (pgbouncer, transaction mode): a prepared
+#               statement may land on a different backend than the one that
+#               prepared it ("prepared statement ... does not exist"), so
+#               automatic preparation must be disabled.
 
 from ema_cycle_predictor import (
     PredictorConfig, CycleEmaState, Forecast,
@@ -18,10 +24,67 @@ from ema_cycle_predictor import (
 )
 
 
+TRANSACTION_POOLER_PORT = "6543"
+
+# Hot-path write statements. Kept as module constants so every call sends the
+# identical query text, which psycopg prepares once per connection and then
+# reuses (unless preparation is disabled for the transaction pooler).
+UPSERT_PREDICTOR_STATE_SQL = """
+insert into product_predictor_state
+  (user_id, product_id, predictor_profile_id, params, confidence, updated_at)
+values
+  (%s, %s, %s, %s::jsonb, %s, %s)
+on conflict (user_id, product_id)
+do update set
+  predictor_profile_id = excluded.predictor_profile_id,
+  params = excluded.params,
+  confidence = excluded.confidence,
+  updated_at = excluded.updated_at;
+"""
+
+UPSERT_INVENTORY_DAYS_SQL = """
+insert into inventory
+  (user_id, product_id, state, estimated_qty, qty_unit, confidence, last_updated_at, last_source, displayed_name)
+values
+  (%s, %s, %s, %s, 'days', %s, now(), %s, %s)
+on conflict (user_id, product_id)
+do update set
+  state = excluded.state,
+  estimated_qty = excluded.estimated_qty,
+  qty_unit = excluded.qty_unit,
+  confidence = excluded.confidence,
+  last_updated_at = excluded.last_updated_at,
+  last_source = excluded.last_source,
+  displayed_name = coalesce(excluded.displayed_name, inventory.displayed_name);
+"""
+
+INSERT_FORECAST_SQL = """
+insert into inventory_forecasts
+  (user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id)
+values
+  (%s, %s, %s, %s, %s, %s, %s)
+on conflict (user_id, product_id, generated_at) do nothing;
+"""
+
+
 def _now_utc() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def connect(dsn: str, **kwargs):
+    """
+    Open a psycopg3 connection suitable for PantryRepository.
+    On Supabase's transaction pooler (port 6543) server-side prepared
+    statements are disabled (prepare_threshold=None).
+    """
+    import psycopg
+    from psycopg.conninfo import conninfo_to_dict
+
+    if str(conninfo_to_dict(dsn).get("port", "")) == TRANSACTION_POOLER_PORT:
+        kwargs.setdefault("prepare_threshold", None)
+    return psycopg.connect(dsn, **kwargs)
+
+
 @dataclass(frozen=True)
 class ActiveProfile:
     predictor_profile_id: str
@@ -103,20 +166,14 @@ class PantryRepository:
         confidence: float,
         updated_at: datetime,
     ) -> None:
-        q = """
-        insert into product_predictor_state
-          (user_id, product_id, predictor_profile_id, params, confidence, updated_at)
-        values
-          (%s, %s, %s, %s::jsonb, %s, %s)
-        on conflict (user_id, product_id)
-        do update set
-          predictor_profile_id = excluded.predictor_profile_id,
-          params = excluded.params,
-          confidence = excluded.confidence,
-          updated_at = excluded.updated_at;
-        """
         with self.conn.cursor() as cur:
-            cur.execute(q, (user_id, product_id, predictor_profile_id, params, confidence, updated_at))
+            cur.execute(UPSERT_PREDICTOR_STATE_SQL, (user_id, product_id, predictor_profile_id, params, confidence, updated_at))
+
+    def upsert_predictor_states_many(self, rows: List[Tuple]) -> None:
+        """rows: (user_id, product_id, predictor_profile_id, params, confidence, updated_at)"""
+        if rows:
+            with self.conn.cursor() as cur:
+                cur.executemany(UPSERT_PREDICTOR_STATE_SQL, rows)
 
     # ---------- inventory ----------
     def upsert_inventory_days_estimate(
@@ -129,23 +186,14 @@ class PantryRepository:
         source: InventorySource = InventorySource.SYSTEM,
         displayed_name: Optional[str] = None,
     ) -> None:
-        q = """
-        insert into inventory
-          (user_id, product_id, state, estimated_qty, qty_unit, confidence, last_updated_at, last_source, displayed_name)
-        values
-          (%s, %s, %s, %s, 'days', %s, now(), %s, coalesce(%s, displayed_name))
-        on conflict (user_id, product_id)
-        do update set
-          state = excluded.state,
-          estimated_qty = excluded.estimated_qty,
-          qty_unit = excluded.qty_unit,
-          confidence = excluded.confidence,
-          last_updated_at = excluded.last_updated_at,
-          last_source = excluded.last_source,
-          displayed_name = coalesce(excluded.displayed_name, inventory.displayed_name);
-        """
         with self.conn.cursor() as cur:
-            cur.execute(q, (user_id, product_id, state.value, days_left, confidence, source.value, displayed_name))
+            cur.execute(UPSERT_INVENTORY_DAYS_SQL, (user_id, product_id, state.value, days_left, confidence, source.value, displayed_name))
+
+    def upsert_inventory_days_estimates_many(self, rows: List[Tuple]) -> None:
+        """rows: (user_id, product_id, state, days_left, confidence, source, displayed_name)"""
+        if rows:
+            with self.conn.cursor() as cur:
+                cur.executemany(UPSERT_INVENTORY_DAYS_SQL, rows)
 
     # ---------- forecasts ----------
     def insert_forecast(
@@ -155,15 +203,9 @@ class PantryRepository:
         forecast: Forecast,
         trigger_log_id: Optional[str],
     ) -> None:
-        q = """
-        insert into inventory_forecasts
-          (user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id)
-        values
-          (%s, %s, %s, %s, %s, %s, %s);
-        """
         with self.conn.cursor() as cur:
             cur.execute(
-                q,
+                INSERT_FORECAST_SQL,
                 (
                     user_id,
                     product_id,
@@ -175,6 +217,12 @@ class PantryRepository:
                 ),
             )
 
+    def insert_forecasts_many(self, rows: List[Tuple]) -> None:
+        """rows: (user_id, product_id, generated_at, expected_days_left, predicted_state, confidence, trigger_log_id)"""
+        if rows:
+            with self.conn.cursor() as cur:
+                cur.executemany(INSERT_FORECAST_SQL, rows)
+
     # ---------- inventory log ----------
     def get_inventory_log_row(self, log_id: str) -> Dict[str, Any]:
         q = """
@@ -357,29 +405,23 @@ class PantryPredictorService:
         predictor_profile_id, cfg = self._load_cfg_and_profile(user_id)
 
         items = self.repo.get_user_inventory_products(user_id)  # [(product_id, category_id)]
+        state_rows, estimate_rows, forecast_rows = [], [], []
         for product_id, category_id in items:
             state = self._load_or_init_state(user_id, product_id, predictor_profile_id, cfg, category_id, now)
             mult = self.repo.get_active_habit_multiplier(user_id, product_id, category_id, now)
             fc = predict(state, now, mult, cfg)
             state = stamp_last_prediction(state, fc)
 
-            self.repo.upsert_predictor_state(
-                user_id=user_id,
-                product_id=product_id,
-                predictor_profile_id=predictor_profile_id,
-                params=state.to_params_json(),
-                confidence=fc.confidence,
-                updated_at=now,
-            )
-            self.repo.upsert_inventory_days_estimate(
-                user_id=user_id,
-                product_id=product_id,
-                days_left=fc.expected_days_left,
-                state=fc.predicted_state,
-                confidence=fc.confidence,
-                source=InventorySource.SYSTEM,
-            )
+            state_rows.append((user_id, product_id, predictor_profile_id, state.to_params_json(), fc.confidence, now))
+            estimate_rows.append((user_id, product_id, fc.predicted_state.value, fc.expected_days_left,
+                                  fc.confidence, InventorySource.SYSTEM.value, None))
             # forecast row is optional here; you can skip to reduce writes:
-            self.repo.insert_forecast(user_id, product_id, fc, trigger_log_id=None)
+            forecast_rows.append((user_id, product_id, fc.generated_at, fc.expected_days_left,
+                                  fc.predicted_state.value, fc.confidence, None))
+
+        # One executemany per table instead of three statements per product
+        self.repo.upsert_predictor_states_many(state_rows)
+        self.repo.upsert_inventory_days_estimates_many(estimate_rows)
+        self.repo.insert_forecasts_many(forecast_rows)
 
         self.repo.commit()
@@ -0,0 +1,72 @@
+"""
+Tests for the EMA cycle predictor math
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from ema_cycle_predictor import (
+    InventorySource,
+    PredictorConfig,
+    PurchaseEvent,
+    apply_purchase,
+    cumulative_cycle_update,
+    ema_mad_update,
+    init_state_from_category,
+)
+
+NOW = datetime(2026, 1, 15, 12, 0, tzinfo=timezone.utc)
+
+
+def _config() -> PredictorConfig:
+    return PredictorConfig(category_priors={})
+
+
+def _clamp(x: float, lo: float, hi: float) -> float:
+    return max(lo, min(hi, x))
+
+
+def test_ema_mad_update_matches_the_inline_step():
+    rng = random.Random(7)
+    for _ in range(500):
+        old_mean, old_mad = rng.uniform(0.5, 100), rng.uniform(0, 30)
+        observed, a = rng.uniform(0, 120), rng.uniform(0, 1)
+        mad_weight = rng.choice((1.0, 0.5))
+        expected_mean = _clamp((1 - a) * old_mean + a * observed, 1.0, 90.0)
+        expected_mad = _clamp((1 - a) * old_mad + a * abs(observed - old_mean) * mad_weight, 0.1, 90.0)
+        assert ema_mad_update(old_mean, old_mad, observed, a, 1.0, 90.0, mad_weight) == (expected_mean, expected_mad)
+
+
+def test_cumulative_cycle_update_first_cycle_takes_the_observation():
+    assert cumulative_cycle_update(7.0, 2.0, 0, 10.0, 1.0, 90.0) == (10.0, 3.0)
+    # A first cycle equal to the prior keeps the MAD floor rather than zero
+    assert cumulative_cycle_update(7.0, 2.0, 0, 7.0, 1.0, 90.0) == (7.0, 0.1)
+
+
+def test_cumulative_cycle_update_averages_over_previous_cycles():
+    rng = random.Random(11)
+    for _ in range(500):
+        old_mean, old_mad = rng.uniform(1, 90), rng.uniform(0.1, 30)
+        n_cycles, observed = rng.randint(1, 20), rng.uniform(0, 120)
+        expected_mean = _clamp((old_mean * n_cycles + observed) / (n_cycles + 1), 1.0, 90.0)
+        expected_mad = _clamp((old_mad * n_cycles + abs(observed - old_mean)) / (n_cycles + 1), 0.1, 90.0)
+        assert cumulative_cycle_update(old_mean, old_mad, n_cycles, observed, 1.0, 90.0) == pytest.approx(
+            (expected_mean, expected_mad)
+        )
+
+
+def test_apply_purchase_folds_a_completed_cycle_into_the_state():
+    cfg = _config()
+    state = init_state_from_category(None, cfg, now=NOW - timedelta(days=12))
+    state.cycle_started_at = NOW - timedelta(days=12)
+    state.empty_at = NOW - timedelta(days=2)
+    mean, mad = cumulative_cycle_update(
+        state.cycle_mean_days, state.cycle_mad_days, state.n_completed_cycles, 10.0,
+        cfg.min_cycle_days, cfg.max_cycle_days,
+    )
+
+    state = apply_purchase(state, PurchaseEvent(ts=NOW, source=InventorySource.RECEIPT), cfg)
+
+    assert state.n_completed_cycles == 1
+    assert (state.cycle_mean_days, state.cycle_mad_days) == pytest.approx((mean, mad))
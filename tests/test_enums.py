@@ -0,0 +1,23 @@
+"""
+Tests for the precomputed enum value table
+"""
+import pytest
+
+from app.models.enums import (
+    ENUM_VALUES,
+    HabitInputSource,
+    HabitStatus,
+    HabitType,
+    InventoryAction,
+    InventorySource,
+    InventoryState,
+)
+
+
+@pytest.mark.parametrize("enum_cls", [
+    InventoryState, InventorySource, InventoryAction, HabitStatus, HabitType, HabitInputSource,
+])
+def test_every_written_member_maps_to_its_value(enum_cls):
+    for member in enum_cls:
+        assert ENUM_VALUES[member] == member.value
+        assert type(ENUM_VALUES[member]) is str
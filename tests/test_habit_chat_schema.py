@@ -0,0 +1,61 @@
+"""
+Tests for parsing the habit chat model's JSON reply
+"""
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from app.models.enums import HabitType
+from app.schemas.habit import ChatOutput
+
+
+def test_partially_invalid_payload_keeps_the_valid_fields():
+    payload = {
+        "response": "Got it!",
+        "extracted_data": {
+            "household_size": "4 people",
+            "preferred_shopping_day": "Sunday",
+            "dietary_preferences": "vegetarian",
+            "excluded_categories": [1, "meat"],
+            "notes": {"not": "a string"},
+        },
+        "model_insights": {
+            "new_habits": [
+                {
+                    "name": "Weekly Shopping",
+                    "type": "NOT_A_TYPE",
+                    "effects": {"product_multipliers": {"milk": "1.5", "bread": "lots"}, "global_multiplier": "x"},
+                },
+                "not a habit",
+            ]
+        },
+    }
+
+    output = ChatOutput.model_validate_json(json.dumps(payload))
+
+    assert output.response == "Got it!"
+    data = output.extracted_data
+    assert data.household_size == 4
+    assert data.preferred_shopping_day == "Sunday"
+    assert data.dietary_preferences == ["vegetarian"]
+    assert data.excluded_categories == ["meat"]
+    assert data.notes is None
+    [habit] = output.model_insights.new_habits
+    assert habit.name == "Weekly Shopping"
+    assert habit.type == HabitType.OTHER
+    assert habit.effects.product_multipliers == {"milk": 1.5}
+    assert habit.effects.global_multiplier is None
+
+
+def test_wrong_section_types_fall_back_to_defaults():
+    output = ChatOutput.model_validate_json('{"response": 5, "extracted_data": 3, "model_insights": []}')
+
+    assert output.response == "I've updated your preferences."
+    assert output.extracted_data.household_size is None
+    assert output.model_insights.new_habits == []
+
+
+def test_reply_that_is_not_json_still_fails():
+    with pytest.raises(ValidationError):
+        ChatOutput.model_validate_json("Sure! Here are your preferences")
@@ -0,0 +1,72 @@
+"""
+Tests for the habit service caches (with an in-memory Supabase stand-in)
+"""
+import pytest
+
+import app.services.habit_service as habit_module
+import app.services.predictor_service as predictor_module
+from app.schemas.habit import HabitCreate, HabitUpdate
+from app.services.habit_service import HabitService
+
+
+class FakeQuery:
+    """Chainable query that answers every execute() with the rows it was given"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.rpc_calls = 0
+        self.preferences_row = {"household_size": 2, "dietary_preferences": ["vegan"]}
+
+    def table(self, name):
+        return FakeQuery([{"habit_id": "h-1", "user_id": "user-1"}])
+
+    def rpc(self, name, params):
+        self.rpc_calls += 1
+        return FakeQuery([dict(self.preferences_row)])
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(habit_module, "_preferences_cache", {})
+    monkeypatch.setattr(predictor_module, "_no_habits_until", {})
+
+
+def test_preferences_are_cached_per_user():
+    supabase = FakeSupabase()
+    service = HabitService(supabase)
+
+    first = service.get_user_preferences("user-1")
+    first["dietary_preferences"].append("changed by caller")
+    second = service.get_user_preferences("user-1")
+
+    assert supabase.rpc_calls == 1
+    assert second["dietary_preferences"] == ["vegan"]
+
+
+@pytest.mark.parametrize("write", [
+    lambda service: service.create_habit("user-1", HabitCreate(name="Diet")),
+    lambda service: service.update_habit("h-1", "user-1", HabitUpdate(name="Diet")),
+    lambda service: service.delete_habit("h-1", "user-1"),
+])
+def test_habit_writes_drop_the_users_cached_answers(write):
+    supabase = FakeSupabase()
+    service = HabitService(supabase)
+    service.get_user_preferences("user-1")
+    predictor_module._no_habits_until["user-1"] = float("inf")
+    supabase.preferences_row["household_size"] = 4
+
+    write(service)
+
+    assert service.get_user_preferences("user-1")["household_size"] == 4
+    assert supabase.rpc_calls == 2
+    assert "user-1" not in predictor_module._no_habits_until
@@ -0,0 +1,75 @@
+"""
+Tests for the inventory search filter
+"""
+from uuid import uuid4
+
+from app.services.inventory_service import InventoryService, _search_pattern
+
+
+class FakeQuery:
+    """Records the PostgREST filters applied to an inventory query"""
+
+    def __init__(self):
+        self.or_filters = []
+        self.columns = None
+
+    def select(self, columns, *args, **kwargs):
+        self.columns = columns
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def or_(self, filters):
+        self.or_filters.append(filters)
+        return self
+
+    def execute(self):
+        return type("Response", (), {"data": []})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.query = FakeQuery()
+
+    def table(self, name):
+        return self.query
+
+
+def test_search_pattern_keeps_the_users_characters():
+    assert _search_pattern("milk") == '"*milk*"'
+    # % and _ match literally instead of being stripped ("2.5%" used to become "25")
+    assert _search_pattern("2.5%") == '"*2.5\\\\%*"'
+    assert _search_pattern("a_b") == '"*a\\\\_b*"'
+    # PostgREST syntax characters are protected by the quotes
+    assert _search_pattern("a,b(c):d") == '"*a,b(c):d*"'
+    assert _search_pattern('say "hi"') == '"*say \\"hi\\"*"'
+
+
+def test_blank_search_has_no_pattern():
+    assert _search_pattern("   ") is None
+
+
+def test_reserved_only_search_still_filters():
+    supabase = FakeSupabase()
+    InventoryService(supabase).get_inventory(uuid4(), search="%%")
+
+    assert supabase.query.or_filters == [
+        'displayed_name.ilike."*\\\\%\\\\%*",products.product_name.ilike."*\\\\%\\\\%*"'
+    ]
+
+
+def test_search_inner_joins_products():
+    supabase = FakeSupabase()
+    InventoryService(supabase).get_inventory(uuid4(), search="milk")
+
+    # On a left embed the products.product_name filter could not drop inventory rows
+    assert "products!inner(" in supabase.query.columns
+
+
+def test_blank_search_is_not_a_filter():
+    supabase = FakeSupabase()
+    InventoryService(supabase).get_inventory(uuid4(), search="  ")
+
+    assert supabase.query.or_filters == []
+    assert "products!inner(" not in supabase.query.columns
@@ -0,0 +1,149 @@
+"""
+Tests for PredictorService event processing (with an in-memory repository)
+"""
+import pytest
+
+import app.services.predictor_service as predictor_module
+from app.services.predictor_service import (
+    PredictorService,
+    SupabasePantryRepository,
+    invalidate_habits,
+    invalidate_product_category,
+)
+from ema_cycle_predictor import PredictorConfig
+
+
+class FakeRepo(SupabasePantryRepository):
+    """In-memory stand-in for SupabasePantryRepository"""
+
+    def __init__(self, logs, inventory):
+        self.sb = None
+        self.logs = logs
+        self.inventory = inventory
+        self.bundles = []
+
+    def get_inventory_log_rows(self, log_ids):
+        return {log_id: self.logs[log_id] for log_id in log_ids if log_id in self.logs}
+
+    def get_user_inventory_index(self, user_id):
+        return {pid: dict(item) for pid, item in self.inventory.items()}
+
+    def get_predictor_states_bulk(self, user_id, product_ids):
+        return {}
+
+    def get_predictor_state(self, user_id, product_id):
+        return None
+
+    def get_active_habits(self, user_id):
+        return []
+
+    def update_forecast_bundle(self, **kwargs):
+        self.bundles.append(kwargs)
+
+
+class FakeQuery:
+    """Chainable query that answers every execute() with the table's current rows"""
+
+    def __init__(self, supabase, name):
+        self.supabase = supabase
+        self.name = name
+
+    def __getattr__(self, attr):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        self.supabase.queries.append(self.name)
+        return type("Response", (), {"data": list(self.supabase.rows[self.name])})()
+
+
+class FakeSupabase:
+    def __init__(self, **rows):
+        self.rows = rows
+        self.queries = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+@pytest.fixture
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(predictor_module, "_no_habits_until", {})
+    monkeypatch.setattr(predictor_module, "_product_category_cache", {})
+
+
+def _service(repo):
+    service = PredictorService.__new__(PredictorService)
+    service.repo = repo
+    service._load_cfg_and_profile = lambda user_id: ("profile-1", PredictorConfig(category_priors={}))
+    return service
+
+
+def _purchase_log(log_id, occurred_at):
+    return {
+        "log_id": log_id,
+        "user_id": "user-1",
+        "product_id": "milk",
+        "action": "PURCHASE",
+        "delta_state": "FULL",
+        "action_confidence": 1.0,
+        "occurred_at": occurred_at,
+        "source": "RECEIPT",
+        "note": None,
+    }
+
+
+def test_repeated_product_in_a_batch_sees_the_state_written_by_the_first_log(monkeypatch):
+    seen_states = []
+    real_apply_purchase = predictor_module.apply_purchase
+
+    def recording_apply_purchase(state, ev, cfg, current_state=None):
+        seen_states.append(current_state.value if current_state else None)
+        return real_apply_purchase(state, ev, cfg, current_state)
+
+    monkeypatch.setattr(predictor_module, "apply_purchase", recording_apply_purchase)
+    repo = FakeRepo(
+        logs={
+            "log-1": _purchase_log("log-1", "2026-01-10T10:00:00+00:00"),
+            "log-2": _purchase_log("log-2", "2026-01-10T10:05:00+00:00"),
+        },
+        inventory={"milk": {"category_id": None, "state": "LOW", "estimated_qty": 1.0}},
+    )
+
+    _service(repo).process_inventory_logs(["log-1", "log-2"])
+
+    assert len(repo.bundles) == 2
+    # The second purchase sees the FULL state written by the first, not the stale LOW
+    assert seen_states == ["LOW", repo.bundles[0]["forecast"].predicted_state.value]
+    assert seen_states[1] == "FULL"
+
+
+def test_no_habits_answer_is_reused_until_invalidated(fresh_caches):
+    supabase = FakeSupabase(habits=[])
+    repo = SupabasePantryRepository(supabase)
+
+    assert repo.get_active_habits("user-1") == []
+    assert repo.get_active_habits("user-1") == []
+    assert supabase.queries == ["habits"]
+
+    supabase.rows["habits"] = [{"effects": {"multiplier": 1.5}}]
+    invalidate_habits("user-1")
+
+    assert repo.get_active_habits("user-1") == [{"multiplier": 1.5}]
+    # Users with habits are never cached
+    repo.get_active_habits("user-1")
+    assert supabase.queries == ["habits"] * 3
+
+
+def test_product_category_is_memoized_until_invalidated(fresh_caches):
+    supabase = FakeSupabase(products=[{"category_id": "dairy"}])
+    repo = SupabasePantryRepository(supabase)
+
+    assert repo.get_product_category("milk") == "dairy"
+    assert repo.get_product_category("milk") == "dairy"
+    assert supabase.queries == ["products"]
+
+    supabase.rows["products"] = [{"category_id": "drinks"}]
+    invalidate_product_category("milk")
+
+    assert repo.get_product_category("milk") == "drinks"
+    assert supabase.queries == ["products"] * 2
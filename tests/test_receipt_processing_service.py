@@ -0,0 +1,170 @@
+"""
+Tests for receipt product matching (no Supabase/OpenAI access needed)
+"""
+import random
+from difflib import SequenceMatcher
+
+from app.services.predictor_service import PredictorService
+from app.services.receipt_processing_service import ReceiptProcessingService
+from app.services.receipt_scanner_service import ReceiptItem, ReceiptScanResult
+
+
+class FakeProductService:
+    """Product lookups served from a list; search_products_by_names returns nothing"""
+
+    def __init__(self, products, candidates=None):
+        self.products = list(products)
+        self.candidates = candidates or []
+        self.full_reads = 0
+        self.created = []
+
+    def search_products_by_names(self, names):
+        return list(self.candidates)
+
+    def get_products(self):
+        self.full_reads += 1
+        return list(self.products)
+
+    def create_product(self, product_create):
+        product = {"product_id": f"new-{len(self.created)}", "product_name": product_create.product_name}
+        self.created.append(product)
+        self.products.append(product)
+        return product
+
+
+def _service(product_service):
+    service = ReceiptProcessingService.__new__(ReceiptProcessingService)
+    service.product_service = product_service
+    service._category_ids_by_name = {}
+    return service
+
+
+def test_typo_missed_by_prefilter_still_matches_existing_product():
+    milk = {"product_id": "p-milk", "product_name": "Milk"}
+    products = FakeProductService([milk])
+    service = _service(products)
+
+    matched = service._match_or_create_products(ReceiptScanResult(items=[ReceiptItem("Mlik")]))
+
+    assert matched[0]["product_id"] == "p-milk"
+    assert matched[0]["is_new_product"] is False
+    assert products.created == []
+
+
+def test_full_catalogue_is_read_at_most_once_per_receipt():
+    products = FakeProductService([{"product_id": "p-milk", "product_name": "Milk"}])
+    service = _service(products)
+
+    scan = ReceiptScanResult(items=[ReceiptItem("Olive oil"), ReceiptItem("Olive oil"), ReceiptItem("Mlik")])
+    matched = service._match_or_create_products(scan)
+
+    assert products.full_reads == 1
+    # The second "Olive oil" reuses the product created for the first one
+    assert [item["is_new_product"] for item in matched] == [True, False, False]
+    assert matched[0]["product_id"] == matched[1]["product_id"]
+    assert matched[2]["product_id"] == "p-milk"
+
+
+def test_candidates_that_match_skip_the_full_catalogue():
+    milk = {"product_id": "p-milk", "product_name": "Milk"}
+    products = FakeProductService([milk], candidates=[milk])
+    service = _service(products)
+
+    matched = service._match_or_create_products(ReceiptScanResult(items=[ReceiptItem("milk")]))
+
+    assert matched[0]["product_id"] == "p-milk"
+    assert products.full_reads == 0
+
+
+def _plain_best_match(scanned_name, products):
+    """Reference matcher: full ratio() for every product, with the substring floor"""
+    best_match, best_score = None, 0.0
+    scanned = scanned_name.lower().strip()
+    for product in products:
+        name = product["product_name"].lower().strip()
+        if not name:
+            continue
+        floor = 0.85 if scanned in name or name in scanned else 0.0
+        score = max(SequenceMatcher(None, scanned, name).ratio(), floor)
+        if score > best_score:
+            best_match, best_score = product, score
+    return best_match, best_score
+
+
+def test_quick_ratio_early_exit_finds_the_same_match_as_a_full_scan():
+    rng = random.Random(3)
+    words = ["milk", "mlik", "bread", "brown bread", "eggs", "egg", "olive oil", "oil", "rice", "cheese", "", "tomato"]
+    products = [
+        {"product_id": f"p-{i}", "product_name": " ".join(rng.sample(words, rng.randint(1, 2)))}
+        for i in range(60)
+    ]
+    service = _service(FakeProductService(products))
+    product_index = [service._product_index_entry(product) for product in products]
+
+    for _ in range(200):
+        scanned = " ".join(rng.sample(words, rng.randint(1, 3))).upper()
+        match, score = service._find_best_product_match(scanned, product_index)
+        expected_match, expected_score = _plain_best_match(scanned, products)
+        assert match is expected_match
+        assert score == expected_score
+
+
+class FakeTable:
+    """Records inserts/upserts; reads return no rows"""
+
+    def __init__(self, supabase, name):
+        self.supabase = supabase
+        self.name = name
+        self.rows = []
+
+    def insert(self, rows):
+        self.supabase.inserted[self.name] = rows
+        self.rows = [dict(row, log_id=f"log-{i}") for i, row in enumerate(rows)]
+        return self
+
+    def upsert(self, rows, **kwargs):
+        return self
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return type("Response", (), {"data": self.rows})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.inserted = {}
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+class RotatingReceiptService:
+    """Bulk receipt item insert that returns the created rows rotated by one"""
+
+    def create_receipt_items(self, receipt_id, items_data):
+        rows = [
+            {"receipt_item_id": f"ri-{index}", "product_id": item["product_id"]}
+            for index, item in enumerate(items_data)
+        ]
+        return rows[1:] + rows[:1]
+
+
+def test_logs_link_their_own_receipt_item_whatever_the_insert_order(monkeypatch):
+    monkeypatch.setattr(PredictorService, "process_inventory_log", lambda self, *args, **kwargs: None)
+    service = _service(FakeProductService([]))
+    service.supabase = FakeSupabase()
+    service.receipt_service = RotatingReceiptService()
+
+    service.confirm_and_add_to_inventory("user-1", "receipt-1", [
+        {"product_id": "p-milk", "quantity": 1.0},
+        {"product_id": "p-bread", "quantity": 2.0},
+        {"product_id": "p-milk", "quantity": 3.0},
+    ])
+
+    logs = service.supabase.inserted["inventory_log"]
+    # Each log links a receipt item of its own product, and no item is linked twice
+    receipt_item_products = {"ri-0": "p-milk", "ri-1": "p-bread", "ri-2": "p-milk"}
+    assert [receipt_item_products[log["receipt_item_id"]] for log in logs] == ["p-milk", "p-bread", "p-milk"]
+    assert len({log["receipt_item_id"] for log in logs}) == 3